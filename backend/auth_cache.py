@@ -0,0 +1,103 @@
+"""
+In-process cache of authenticated agents, keyed by a hash of their API key.
+
+``get_current_agent`` runs on every authenticated request; with this cache a
+hot agent costs no database round trip. Entries expire after a TTL so that
+changes made by other server processes are picked up eventually, and every
+write to an agent in this process must call ``invalidate`` (the server's
+``update_agent`` helper does).
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def hash_api_key(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class AgentAuthCache:
+    def __init__(self, ttl_seconds: float = 60.0, max_size: int = 10000):
+        if ttl_seconds < 0 or max_size < 0:
+            raise ValueError("ttl_seconds and max_size must not be negative")
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        # key hash -> (expires_at, agent); ordered oldest-used first.
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._key_by_agent: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_size > 0
+
+    def get(self, api_key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached agent for ``api_key``, or None."""
+        if not self.enabled:
+            return None
+        key = hash_api_key(api_key)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, agent = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Handlers adjust the agent they are given; keep the cached one intact.
+        return dict(agent)
+
+    def put(self, api_key: str, agent: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        key = hash_api_key(api_key)
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(agent))
+        if agent.get("id") is not None:
+            self._key_by_agent[agent["id"]] = key
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, agent_id: str) -> None:
+        key = self._key_by_agent.get(agent_id)
+        if key is not None:
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._key_by_agent.clear()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        agent_id = entry[1].get("id")
+        if agent_id is not None and self._key_by_agent.get(agent_id) == key:
+            del self._key_by_agent[agent_id]
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,71 @@
+"""
+Request-scoped batching of document lookups by key (DataLoader style).
+
+Endpoints that resolve a related document per row (the other agent of each
+connection, say) used to run one ``find_one`` per row. ``load`` instead
+returns a future and remembers the key; once the calling code yields to the
+event loop, every key requested so far is fetched with a single ``$in``
+query. Repeated keys are served from the loader's cache, so create one
+loader per request (``get_agent_loader`` in ``server.py`` does) rather than
+sharing one across requests.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class BatchLoader:
+    def __init__(
+        self,
+        collection: Any,
+        key: str = "id",
+        projection: Optional[Dict[str, int]] = None,
+        max_batch_size: int = 500,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.collection = collection
+        self.key = key
+        self.projection = projection
+        self.max_batch_size = max_batch_size
+        self._futures: Dict[Any, asyncio.Future] = {}
+        self._pending: List[Any] = []
+        self.queries = 0
+
+    def load(self, key: Any) -> "asyncio.Future[Optional[Dict[str, Any]]]":
+        """Future for the document whose key field equals ``key`` (None if missing)."""
+        future = self._futures.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._futures[key] = future
+        if not self._pending:
+            loop.call_soon(self._dispatch)
+        self._pending.append(key)
+        return future
+
+    async def load_many(self, keys: Iterable[Any]) -> List[Optional[Dict[str, Any]]]:
+        """Documents for ``keys`` in the same order, None where one is missing."""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        keys, self._pending = self._pending, []
+        for i in range(0, len(keys), self.max_batch_size):
+            asyncio.ensure_future(self._fetch(keys[i:i + self.max_batch_size]))
+
+    async def _fetch(self, keys: List[Any]) -> None:
+        self.queries += 1
+        try:
+            docs = await self.collection.find({self.key: {"$in": keys}}, self.projection).to_list(len(keys))
+        except Exception as exc:
+            for key in keys:
+                # Forget failed keys so a later load retries them.
+                future = self._futures.pop(key)
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        by_key = {doc.get(self.key): doc for doc in docs}
+        for key in keys:
+            future = self._futures[key]
+            if not future.done():
+                future.set_result(by_key.get(key))
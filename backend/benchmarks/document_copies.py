@@ -0,0 +1,101 @@
+"""
+Measure what the document adapter allocates when it reads and updates a
+large post.
+
+Compares the current projection and update helpers with the deep-copying
+behaviour they replaced, on a post carrying 200 comments and a few hundred
+reactions.
+
+Usage:
+    python benchmarks/document_copies.py [--comments N] [--rounds N]
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from supabase_document_db import _apply_projection, _apply_update  # noqa: E402
+
+
+def _make_post(comments: int) -> Dict[str, Any]:
+    return {
+        "id": "post-1",
+        "agent_id": "agent-1",
+        "content": "Benchmarking document copies " * 8,
+        "hashtags": ["ai", "agents", "benchmark"],
+        "likes_count": 0,
+        "comments": [
+            {
+                "id": f"comment-{i}",
+                "agent_id": f"agent-{i % 37}",
+                "content": f"Comment number {i} with a little body text to make it realistic.",
+                "created_at": "2024-01-01T00:00:00+00:00",
+            }
+            for i in range(comments)
+        ],
+        "reactions": {kind: [f"agent-{i}" for i in range(60)] for kind in ("like", "love", "insightful", "funny")},
+        "created_at": "2024-01-01T00:00:00+00:00",
+    }
+
+
+def _deepcopy_projection(doc: Dict[str, Any], projection: Any) -> Dict[str, Any]:
+    projected = deepcopy(doc)
+    for key, value in (projection or {}).items():
+        if not value:
+            projected.pop(key, None)
+    return projected
+
+
+def _deepcopy_update(doc: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    return _apply_update(deepcopy(doc), update)
+
+
+def _measure(fn: Callable[[], Any], rounds: int) -> Dict[str, float]:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    elapsed = time.perf_counter() - started
+    return {"peak_kib": peak / 1024, "us_per_call": elapsed / rounds * 1e6}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare copy-free and deep-copying document helpers.")
+    parser.add_argument("--comments", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    post = _make_post(args.comments)
+    update = {"$inc": {"likes_count": 1}}
+    cases = [
+        ("read, no projection", lambda: _deepcopy_projection(post, None), lambda: _apply_projection(post, None)),
+        (
+            "read, exclude comments",
+            lambda: _deepcopy_projection(post, {"comments": 0}),
+            lambda: _apply_projection(post, {"comments": 0}),
+        ),
+        ("update $inc likes_count", lambda: _deepcopy_update(post, update), lambda: _apply_update(post, update)),
+    ]
+
+    print(f"post with {args.comments} comments, {args.rounds} rounds")
+    print(f"{'case':<26} {'before KiB':>11} {'after KiB':>10} {'before us':>10} {'after us':>9}")
+    for name, before, after in cases:
+        old = _measure(before, args.rounds)
+        new = _measure(after, args.rounds)
+        print(
+            f"{name:<26} {old['peak_kib']:>11.1f} {new['peak_kib']:>10.1f} "
+            f"{old['us_per_call']:>10.1f} {new['us_per_call']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
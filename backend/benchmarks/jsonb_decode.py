@@ -0,0 +1,94 @@
+"""
+Measure how fast rows of the ``posts`` table are fetched and decoded.
+
+Compares asyncpg's default text JSONB handling followed by ``json.loads``
+(how the adapter used to decode documents) with the binary codec the
+adapter now registers on every pooled connection.
+
+Usage:
+    python benchmarks/jsonb_decode.py [--table posts] [--limit N] [--rounds N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, List
+
+import asyncpg
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import supabase_document_db  # noqa: E402
+from supabase_document_db import SupabaseDocumentDB  # noqa: E402
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+async def _text_json(conn: asyncpg.Connection, sql: str) -> List[Any]:
+    return [json.loads(row["doc"]) for row in await conn.fetch(sql)]
+
+
+async def _codec(conn: asyncpg.Connection, sql: str) -> List[Any]:
+    return [row["doc"] for row in await conn.fetch(sql)]
+
+
+async def _rows_per_second(
+    conn: asyncpg.Connection, sql: str, fetch: Callable[[asyncpg.Connection, str], Awaitable[List[Any]]], rounds: int
+) -> float:
+    await fetch(conn, sql)
+    rows = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        rows += len(await fetch(conn, sql))
+    return rows / (time.perf_counter() - started)
+
+
+async def run(dsn: str, table: str, limit: int, rounds: int) -> None:
+    dsn = SupabaseDocumentDB._sanitize_dsn(dsn)
+    if not supabase_document_db._TABLE_NAME_RE.match(table):
+        raise SystemExit(f"Invalid table name: {table!r}")
+    sql = f'SELECT doc FROM "{table}" ORDER BY pk LIMIT {int(limit)}'
+
+    plain = await asyncpg.connect(dsn)
+    codec = await asyncpg.connect(dsn)
+    try:
+        if not await plain.fetchval("SELECT to_regclass($1) IS NOT NULL", table):
+            raise SystemExit(f"Table {table!r} does not exist")
+        count = await plain.fetchval(f'SELECT count(*) FROM (SELECT 1 FROM "{table}" LIMIT {int(limit)}) AS t')
+        if not count:
+            raise SystemExit(f"Table {table!r} is empty")
+        await supabase_document_db._init_connection(codec)
+
+        library = "orjson" if supabase_document_db.orjson is not None else "json"
+        before = await _rows_per_second(plain, sql, _text_json, rounds)
+        after = await _rows_per_second(codec, sql, _codec, rounds)
+    finally:
+        await plain.close()
+        await codec.close()
+
+    print(f"{table}: {count} rows x {rounds} rounds")
+    print(f"text jsonb + json.loads   {before:>12,.0f} rows/s")
+    print(f"binary jsonb + {library:<10} {after:>12,.0f} rows/s  ({after / before:.2f}x)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare JSONB decode throughput.")
+    parser.add_argument("--table", default="posts")
+    parser.add_argument("--limit", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    load_dotenv(ROOT_DIR / ".env", override=True)
+    dsn = os.environ.get("SUPABASE_DB_URL")
+    if not dsn:
+        raise SystemExit("SUPABASE_DB_URL is not set")
+
+    asyncio.run(run(dsn, args.table, args.limit, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+List indexes that the observed query workload is missing.
+
+The server records filter and sort shapes per collection when it runs with
+``SUPABASE_INDEX_ADVISOR=1`` and persists them to ``_index_advisor`` on
+shutdown. This command compares those shapes with the expression indexes
+that exist on each collection table and prints a ``SupabaseIndex``
+declaration for every shape no index serves.
+
+Usage:
+    python index_report.py [--min-hits N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+from dotenv import load_dotenv
+
+from supabase_document_db import SupabaseDocumentDB, SupabaseIndex, SupabaseIndexAdvisor
+
+ROOT_DIR = Path(__file__).parent
+
+_PATH_PART_RE = re.compile(r"->>? '((?:[^']|'')*)'")
+
+# Operators a btree over the field expression can serve.
+_BTREE_OPS = ("eq", "in", "lt", "lte", "gt", "gte")
+
+_INDEX_COLUMNS_SQL = """
+SELECT t.relname AS table_name,
+       am.amname AS method,
+       array(
+           SELECT pg_get_indexdef(ix.indexrelid, k + 1, true)
+           FROM generate_subscripts(ix.indkey, 1) AS k
+           ORDER BY k
+       ) AS columns
+FROM pg_index ix
+JOIN pg_class i ON i.oid = ix.indexrelid
+JOIN pg_class t ON t.oid = ix.indrelid
+JOIN pg_am am ON am.oid = i.relam
+JOIN pg_namespace n ON n.oid = t.relnamespace
+WHERE n.nspname = current_schema()
+"""
+
+
+def _column_field(expression: str) -> Optional[str]:
+    parts = [part.replace("''", "'") for part in _PATH_PART_RE.findall(expression)]
+    return ".".join(parts) or None
+
+
+async def _existing_indexes(conn: asyncpg.Connection) -> Dict[str, List[Tuple[str, List[Optional[str]]]]]:
+    indexes: Dict[str, List[Tuple[str, List[Optional[str]]]]] = {}
+    for row in await conn.fetch(_INDEX_COLUMNS_SQL):
+        fields = [_column_field(column) for column in row["columns"]]
+        indexes.setdefault(row["table_name"], []).append((row["method"], fields))
+    return indexes
+
+
+def _is_served(
+    filter_shape: List[Tuple[str, str]],
+    sort_shape: List[Tuple[str, int]],
+    indexes: List[Tuple[str, List[Optional[str]]]],
+) -> bool:
+    btree_fields = {field for field, op in filter_shape if op in _BTREE_OPS}
+    filter_fields = {field for field, _ in filter_shape}
+    for method, fields in indexes:
+        if not fields or fields[0] is None:
+            continue
+        if method == "gin" and fields[0] in filter_fields:
+            return True
+        if method == "btree" and fields[0] in btree_fields:
+            return True
+        if method == "btree" and not btree_fields and sort_shape and fields[0] == sort_shape[0][0]:
+            return True
+    return False
+
+
+def _suggest(filter_shape: List[Tuple[str, str]], sort_shape: List[Tuple[str, int]]) -> Optional[SupabaseIndex]:
+    equality = [(field, 1) for field, op in filter_shape if op in ("eq", "in")]
+    ranges = [(field, 1) for field, op in filter_shape if op in ("lt", "lte", "gt", "gte")]
+    keys = equality + ranges[:1]
+    seen = {field for field, _ in keys}
+    keys += [(field, direction) for field, direction in sort_shape if field not in seen]
+    if not keys:
+        return None
+    return SupabaseIndex(keys)
+
+
+def _describe(filter_shape: List[Tuple[str, str]], sort_shape: List[Tuple[str, int]]) -> str:
+    filters = ", ".join(f"{field}({op})" for field, op in filter_shape) or "-"
+    sorts = ", ".join(f"{'-' if direction < 0 else '+'}{field}" for field, direction in sort_shape) or "-"
+    return f"filter={filters} sort={sorts}"
+
+
+async def report(dsn: str, min_hits: int) -> int:
+    conn = await asyncpg.connect(SupabaseDocumentDB._sanitize_dsn(dsn))
+    try:
+        table = SupabaseIndexAdvisor.TABLE
+        exists = await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", table)
+        if not exists:
+            print("No workload recorded yet. Run the server with SUPABASE_INDEX_ADVISOR=1 first.")
+            return 0
+
+        shapes = await conn.fetch(
+            f'SELECT collection, filter_shape, sort_shape, hits FROM "{table}" '
+            "WHERE hits >= $1 ORDER BY hits DESC",
+            min_hits,
+        )
+        indexes = await _existing_indexes(conn)
+    finally:
+        await conn.close()
+
+    missing = 0
+    for row in shapes:
+        filter_shape = [tuple(item) for item in json.loads(row["filter_shape"])]
+        sort_shape = [tuple(item) for item in json.loads(row["sort_shape"])]
+        if _is_served(filter_shape, sort_shape, indexes.get(row["collection"], [])):
+            continue
+        suggestion = _suggest(filter_shape, sort_shape)
+        if suggestion is None:
+            continue
+        missing += 1
+        print(f"{row['collection']:<16} hits={row['hits']:<8} {_describe(filter_shape, sort_shape)}")
+        print(f"    {suggestion!r}")
+
+    if not missing:
+        print("Every recorded query shape is served by an index.")
+    return missing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="List indexes missing for the recorded workload.")
+    parser.add_argument("--min-hits", type=int, default=1, help="ignore shapes seen fewer times than this")
+    args = parser.parse_args()
+
+    load_dotenv(ROOT_DIR / ".env", override=True)
+    dsn = os.environ.get("SUPABASE_DB_URL")
+    if not dsn:
+        raise SystemExit("SUPABASE_DB_URL is not set")
+
+    asyncio.run(report(dsn, args.min_hits))
+
+
+if __name__ == "__main__":
+    main()
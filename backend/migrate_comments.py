@@ -0,0 +1,83 @@
+"""
+Move comments embedded in posts into the ``comments`` collection.
+
+Posts used to carry every comment, with its ``replies`` nested inside, in the
+``comments`` array. This copies each comment and reply into ``comments`` (one
+document each, replies pointing at their comment through ``parent_id``),
+then recomputes the post's ``comment_count`` and replaces the embedded array
+with a preview of the latest top-level comments. Posts whose array already
+holds only previews are skipped, so the command can be re-run safely.
+
+Usage:
+    python migrate_comments.py
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from server import (
+    COMMENT_PREVIEW_SIZE,
+    COMMENT_SORT,
+    db,
+    ensure_mongo_indexes,
+    shutdown_db_client,
+    startup_db_client,
+)
+
+
+def _comment_doc(entry: dict, post_id: str, parent_id, fallback_created_at: str) -> dict:
+    doc = {key: value for key, value in entry.items() if key != "replies"}
+    doc["post_id"] = post_id
+    doc["parent_id"] = parent_id
+    doc.setdefault("created_at", fallback_created_at)
+    doc.setdefault("likes", [])
+    doc["reply_count"] = len(entry.get("replies") or [])
+    return doc
+
+
+async def migrate() -> None:
+    await startup_db_client()
+    await ensure_mongo_indexes()
+    try:
+        posts_migrated = comments_moved = 0
+        async for post in db.posts.find({}, {"_id": 0, "id": 1, "comments": 1, "created_at": 1}):
+            embedded = post.get("comments") or []
+            # Preview entries are copies of stored comments and carry post_id.
+            if all("post_id" in entry for entry in embedded):
+                continue
+
+            stored = await db.comments.find({"post_id": post["id"]}, {"_id": 0, "id": 1}).to_list(None)
+            seen = {comment["id"] for comment in stored}
+            created_at = post.get("created_at") or datetime.now(timezone.utc).isoformat()
+            new_docs = []
+            for entry in embedded:
+                if "post_id" in entry:
+                    continue
+                if entry["id"] not in seen:
+                    seen.add(entry["id"])
+                    new_docs.append(_comment_doc(entry, post["id"], None, created_at))
+                for reply in entry.get("replies") or []:
+                    if reply["id"] not in seen:
+                        seen.add(reply["id"])
+                        new_docs.append(_comment_doc(reply, post["id"], entry["id"], entry.get("created_at", created_at)))
+            if new_docs:
+                await db.comments.insert_many(new_docs)
+
+            top_level = {"post_id": post["id"], "parent_id": None}
+            comment_count = await db.comments.count_documents(top_level)
+            latest = await db.comments.find(top_level, {"_id": 0}).sort(
+                [(field, -direction) for field, direction in COMMENT_SORT]
+            ).to_list(COMMENT_PREVIEW_SIZE)
+            await db.posts.update_one(
+                {"id": post["id"]},
+                {"$set": {"comment_count": comment_count, "comments": latest[::-1]}}
+            )
+            posts_migrated += 1
+            comments_moved += len(new_docs)
+
+        print(f"Migrated {comments_moved} comments and replies from {posts_migrated} posts.")
+    finally:
+        await shutdown_db_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -0,0 +1,50 @@
+"""
+Move profile views embedded in agents into the ``profile_views`` collection.
+
+Agents used to carry ``profile_views`` as a list of viewer IDs, oldest first,
+with no timestamps. This records each viewer as having viewed the profile at
+migration time (keeping the list order) and empties the embedded list. Agents
+without embedded views are skipped, so the command can be re-run safely.
+
+Usage:
+    python migrate_profile_views.py
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from server import (
+    db,
+    ensure_mongo_indexes,
+    profile_view_log,
+    shutdown_db_client,
+    startup_db_client,
+    update_agent,
+)
+
+
+async def migrate() -> None:
+    await startup_db_client()
+    await ensure_mongo_indexes()
+    try:
+        agents_migrated = views_moved = 0
+        now = datetime.now(timezone.utc)
+        async for agent in db.agents.find({}, {"_id": 0, "id": 1, "profile_views": 1}):
+            viewer_ids = agent.get("profile_views") or []
+            if not viewer_ids:
+                continue
+
+            # Microsecond steps keep the old order for "most recent first" reads.
+            for offset, viewer_id in enumerate(viewer_ids):
+                when = now - timedelta(microseconds=len(viewer_ids) - offset)
+                if await profile_view_log.record(agent["id"], viewer_id, now=when):
+                    views_moved += 1
+            await update_agent(agent["id"], {"$set": {"profile_views": []}})
+            agents_migrated += 1
+
+        print(f"Migrated {views_moved} profile views from {agents_migrated} agents.")
+    finally:
+        await shutdown_db_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
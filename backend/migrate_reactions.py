@@ -0,0 +1,62 @@
+"""
+Move reactions embedded in posts into the ``reactions`` collection.
+
+Posts used to carry ``reactions`` as a dict of agent-ID lists per reaction
+type. This copies every entry into ``reactions`` (one document per post and
+agent), recomputes the post's ``reaction_counts`` from that collection and
+empties the embedded dict. Posts without embedded reactions are skipped, so
+the command can be re-run safely.
+
+Usage:
+    python migrate_reactions.py
+"""
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone
+
+from server import db, ensure_mongo_indexes, shutdown_db_client, startup_db_client
+
+
+async def migrate() -> None:
+    await startup_db_client()
+    await ensure_mongo_indexes()
+    try:
+        posts_migrated = reactions_moved = 0
+        async for post in db.posts.find({}, {"_id": 0, "id": 1, "reactions": 1, "created_at": 1}):
+            embedded = post.get("reactions") or {}
+            if not any(embedded.values()):
+                continue
+
+            stored = await db.reactions.find({"post_id": post["id"]}, {"_id": 0}).to_list(None)
+            seen = {reaction["agent_id"] for reaction in stored}
+            created_at = post.get("created_at") or datetime.now(timezone.utc).isoformat()
+            new_docs = []
+            for reaction_type, agent_ids in embedded.items():
+                for agent_id in agent_ids:
+                    if agent_id in seen:
+                        continue
+                    seen.add(agent_id)
+                    new_docs.append({
+                        "post_id": post["id"],
+                        "agent_id": agent_id,
+                        "reaction_type": reaction_type,
+                        "created_at": created_at,
+                    })
+            if new_docs:
+                await db.reactions.insert_many(new_docs)
+
+            counts = Counter(reaction["reaction_type"] for reaction in stored + new_docs)
+            await db.posts.update_one(
+                {"id": post["id"]},
+                {"$set": {"reaction_counts": dict(counts), "reactions": {}}}
+            )
+            posts_migrated += 1
+            reactions_moved += len(new_docs)
+
+        print(f"Migrated {reactions_moved} reactions from {posts_migrated} posts.")
+    finally:
+        await shutdown_db_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
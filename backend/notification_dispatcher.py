@@ -0,0 +1,229 @@
+"""
+Background writer for notifications.
+
+``create_notification`` used to await an ``insert_one`` inside the request
+that triggered it. It now hands the document to ``enqueue``, which returns
+immediately; a worker task drains the queue and writes notifications with
+``insert_many`` in batches of up to ``batch_size``.
+
+The queue holds at most ``max_queue_size`` notifications. Whatever cannot be
+queued or written (queue full, insert failed, worker not running) is appended
+to a JSON-lines spool file, and ``start`` writes the spool back before
+taking new work, so notifications survive overload, database outages and
+restarts. ``stop`` flushes everything still queued.
+
+Each process spools to its own file, ``spool_path`` suffixed with its pid.
+``replay_spool`` takes an exclusive lock next to the spool and replays this
+process's file and those of processes that are gone; a worker starting while
+another one replays skips the replay. Notifications are unique by ``id``, so
+a batch written again after an interrupted replay only adds what is missing.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from supabase_document_db import SupabaseDuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDispatcher:
+    def __init__(
+        self,
+        collection: Any,
+        spool_path: Path,
+        batch_size: int = 100,
+        max_queue_size: int = 10000,
+        flush_interval_seconds: float = 0.05,
+    ):
+        if batch_size < 1 or max_queue_size < 1:
+            raise ValueError("batch_size and max_queue_size must be at least 1")
+        if flush_interval_seconds < 0:
+            raise ValueError("flush_interval_seconds must not be negative")
+        self.collection = collection
+        self.spool_path = Path(spool_path)
+        self.batch_size = batch_size
+        self.max_queue_size = max_queue_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Taken off the queue by the worker but not yet handed to _write.
+        self._batch: List[Dict[str, Any]] = []
+        self.enqueued = 0
+        self.written = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.failed_batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def enqueue(self, doc: Dict[str, Any]) -> None:
+        """Queue ``doc`` for writing; never waits on the database."""
+        if self._queue is None:
+            self._spool([doc])
+            return
+        try:
+            self._queue.put_nowait(doc)
+        except asyncio.QueueFull:
+            self._spool([doc])
+            return
+        self.enqueued += 1
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        await self.replay_spool()
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        queue, self._queue = self._queue, None
+        pending, self._batch = self._batch, []
+        while not queue.empty():
+            pending.append(queue.get_nowait())
+        for i in range(0, len(pending), self.batch_size):
+            await self._write(pending[i:i + self.batch_size])
+
+    async def replay_spool(self) -> int:
+        """Write notifications spooled by this or an exited process; return how many."""
+        lock_path = self.spool_path.with_name(self.spool_path.name + ".lock")
+        with open(lock_path, "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is replaying; anything it leaves is picked up on a later start.
+                return 0
+            try:
+                replayed = 0
+                for spool in self._orphaned_spools():
+                    replayed += await self._replay_file(spool)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self.replayed += replayed
+        return replayed
+
+    def _orphaned_spools(self) -> List[Path]:
+        """Spool files no running process appends to: this process's, and those of exited ones."""
+        spools = set()
+        for path in self.spool_path.parent.glob(self.spool_path.name + "*"):
+            suffix = path.name[len(self.spool_path.name):]
+            if suffix.endswith(".replay"):
+                suffix = suffix[:-len(".replay")]
+            if suffix == "":
+                # Written before spools were per process.
+                spools.add(self.spool_path)
+            elif suffix[1:].isdigit() and not _process_alive(int(suffix[1:])):
+                spools.add(path.with_name(self.spool_path.name + suffix))
+        return sorted(spools)
+
+    async def _replay_file(self, spool: Path) -> int:
+        # Move the spool aside first so that anything spooled meanwhile is kept.
+        # A leftover .replay file means an earlier replay was interrupted.
+        replaying = spool.with_name(spool.name + ".replay")
+        try:
+            if replaying.exists():
+                with open(replaying, "a") as out:
+                    out.write(spool.read_text())
+                spool.unlink()
+            else:
+                os.replace(spool, replaying)
+        except FileNotFoundError:
+            pass
+        try:
+            lines = replaying.read_text().splitlines()
+        except FileNotFoundError:
+            return 0
+        docs = [json.loads(line) for line in lines if line.strip()]
+        replayed = 0
+        for i in range(0, len(docs), self.batch_size):
+            if await self._write(docs[i:i + self.batch_size]):
+                replayed += len(docs[i:i + self.batch_size])
+        replaying.unlink(missing_ok=True)
+        return replayed
+
+    async def _run(self) -> None:
+        while True:
+            self._batch = [await self._queue.get()]
+            # Give concurrent requests a moment to add to the batch.
+            if self.flush_interval_seconds:
+                await asyncio.sleep(self.flush_interval_seconds)
+            while len(self._batch) < self.batch_size and not self._queue.empty():
+                self._batch.append(self._queue.get_nowait())
+            batch, self._batch = self._batch, []
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        try:
+            try:
+                await self.collection.insert_many(batch)
+            except (BulkWriteError, DuplicateKeyError, SupabaseDuplicateKeyError):
+                # A replayed batch that was partly written before; keep the rest.
+                # Any other error inserting one of them spools the whole batch.
+                for doc in batch:
+                    try:
+                        await self.collection.insert_one(doc)
+                    except (DuplicateKeyError, SupabaseDuplicateKeyError):
+                        continue
+                    self.written += 1
+                return True
+        except asyncio.CancelledError:
+            self._spool(batch)
+            raise
+        except Exception:
+            logger.exception("Writing %d notifications failed; spooling them", len(batch))
+            self.failed_batches += 1
+            self._spool(batch)
+            return False
+        self.written += len(batch)
+        return True
+
+    def _spool(self, docs: List[Dict[str, Any]]) -> None:
+        # Mongo adds an ObjectId _id on insert; the spool holds plain JSON.
+        lines = "".join(
+            json.dumps({key: value for key, value in doc.items() if key != "_id"}) + "\n" for doc in docs
+        )
+        with open(self.spool_path.with_name(f"{self.spool_path.name}.{os.getpid()}"), "a") as spool:
+            spool.write(lines)
+        self.spooled += len(docs)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "batch_size": self.batch_size,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "failed_batches": self.failed_batches,
+        }
+
+
+def _process_alive(pid: int) -> bool:
+    """Whether a process other than this one is running as ``pid``."""
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
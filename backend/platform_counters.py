@@ -0,0 +1,116 @@
+"""
+Platform-wide counters for ``/api/stats``, kept in one document.
+
+``get_stats`` used to run a ``count_documents`` per statistic on every call.
+The counts now live in a single ``counters`` document (``scope: "platform"``)
+that write paths adjust with an atomic ``$inc`` through ``increment``, so a
+read is one indexed lookup.
+
+The increments run after the write they count and are not in the same
+transaction, so a crash between the two, or an earlier version of the server
+writing without counting, lets the counters drift. ``reconcile`` recounts
+every statistic from its source collection and adds the difference to the
+stored values; ``start`` runs it at startup and then every
+``reconcile_interval_seconds``, logging any drift it corrects.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from supabase_document_db import SupabaseDuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+SCOPE = "platform"
+
+
+class PlatformCounters:
+    def __init__(
+        self,
+        db: Any,
+        sources: Dict[str, Tuple[str, Dict[str, Any]]],
+        reconcile_interval_seconds: float = 600.0,
+    ):
+        """``sources`` maps each counter to the collection and filter it counts."""
+        if reconcile_interval_seconds <= 0:
+            raise ValueError("reconcile_interval_seconds must be positive")
+        self.db = db
+        self.collection = db.counters
+        self.sources = sources
+        self.reconcile_interval_seconds = reconcile_interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def increment(self, name: str, amount: int = 1) -> None:
+        if name not in self.sources:
+            raise ValueError(f"Unknown counter: {name}")
+        update = {"$inc": {name: amount}}
+        try:
+            await self.collection.update_one({"scope": SCOPE}, update, upsert=True)
+        except (DuplicateKeyError, SupabaseDuplicateKeyError):
+            # Another write created the document first; it exists now.
+            await self.collection.update_one({"scope": SCOPE}, update)
+
+    async def read(self) -> Dict[str, int]:
+        """Every counter, recounting first if the document does not exist yet."""
+        doc = await self.collection.find_one({"scope": SCOPE}, {"_id": 0})
+        if doc is None:
+            return await self.reconcile()
+        return {name: doc.get(name, 0) for name in self.sources}
+
+    async def reconcile(self) -> Dict[str, int]:
+        """
+        Recount every counter from its source, correct the stored values and
+        return the counts.
+
+        The correction is applied as an ``$inc`` of the difference rather than
+        a ``$set``, so increments that land while the sources are being counted
+        are kept instead of overwritten.
+        """
+        counts = {}
+        for name, (collection, query) in self.sources.items():
+            counts[name] = await self.db[collection].count_documents(query)
+        stored = await self.collection.find_one({"scope": SCOPE}, {"_id": 0})
+        if stored is None:
+            try:
+                await self.collection.insert_one({"scope": SCOPE, **counts})
+                return counts
+            except (DuplicateKeyError, SupabaseDuplicateKeyError):
+                # Another write created the document first; correct it instead.
+                stored = await self.collection.find_one({"scope": SCOPE}, {"_id": 0})
+        drift = {name: count - stored.get(name, 0) for name, count in counts.items() if count != stored.get(name, 0)}
+        if drift:
+            logger.warning("Platform counters drifted from their sources; corrected by %s", drift)
+        for name, difference in drift.items():
+            # Only from the value the difference was taken against, so a
+            # concurrent reconcile cannot apply it twice; a counter that moved
+            # meanwhile is corrected on the next run.
+            await self.collection.update_one(
+                {"scope": SCOPE, name: stored.get(name)}, {"$inc": {name: difference}}
+            )
+        return counts
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        await self.reconcile()
+        self._task = asyncio.create_task(self._reconcile_periodically())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _reconcile_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.reconcile_interval_seconds)
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.exception("Reconciling platform counters failed; retrying next interval")
@@ -0,0 +1,99 @@
+"""
+Profile views, stored one document per viewer and time bucket.
+
+Agents used to collect viewer IDs in an ever-growing ``profile_views`` array
+on their own document, which every authenticated request loads. Views now go
+to the ``profile_views`` collection instead. Time is cut into fixed buckets of
+``dedup_window_hours`` and a unique index on (agent_id, viewer_id, bucket)
+turns repeat views inside a bucket into a no-op, so a viewer is counted at
+most once per window. ``prune`` drops views older than ``retention_days``;
+``start`` runs it periodically in the background.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from supabase_document_db import SupabaseDuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# How many recent views ``recent_viewer_ids`` reads per viewer it returns;
+# repeat viewers take one document per bucket.
+_SCAN_FACTOR = 5
+
+
+class ProfileViewLog:
+    def __init__(
+        self,
+        collection: Any,
+        dedup_window_hours: float = 24.0,
+        retention_days: float = 90.0,
+        prune_interval_seconds: float = 3600.0,
+    ):
+        if dedup_window_hours <= 0 or retention_days <= 0 or prune_interval_seconds <= 0:
+            raise ValueError("dedup_window_hours, retention_days and prune_interval_seconds must be positive")
+        self.collection = collection
+        self.dedup_window = timedelta(hours=dedup_window_hours)
+        self.retention = timedelta(days=retention_days)
+        self.prune_interval_seconds = prune_interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def bucket(self, when: datetime) -> int:
+        return int(when.timestamp() // self.dedup_window.total_seconds())
+
+    async def record(self, agent_id: str, viewer_id: str, now: Optional[datetime] = None) -> bool:
+        """Log a view of ``agent_id``'s profile; False if ``viewer_id`` was already counted this window."""
+        now = now or datetime.now(timezone.utc)
+        try:
+            await self.collection.insert_one({
+                "id": str(uuid.uuid4()),
+                "agent_id": agent_id,
+                "viewer_id": viewer_id,
+                "bucket": self.bucket(now),
+                "created_at": now.isoformat(),
+            })
+        except (DuplicateKeyError, SupabaseDuplicateKeyError):
+            return False
+        return True
+
+    async def recent_viewer_ids(self, agent_id: str, limit: int = 20) -> List[str]:
+        """Distinct viewers of ``agent_id``'s profile, most recent first."""
+        views = await self.collection.find(
+            {"agent_id": agent_id}, {"_id": 0, "viewer_id": 1}
+        ).sort([("created_at", -1), ("id", -1)]).limit(limit * _SCAN_FACTOR).to_list(limit * _SCAN_FACTOR)
+        viewer_ids = list(dict.fromkeys(view["viewer_id"] for view in views))
+        return viewer_ids[:limit]
+
+    async def prune(self, now: Optional[datetime] = None) -> int:
+        """Delete views older than the retention period and return how many went."""
+        cutoff = (now or datetime.now(timezone.utc)) - self.retention
+        result = await self.collection.delete_many({"created_at": {"$lt": cutoff.isoformat()}})
+        return result.deleted_count
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._prune_periodically())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _prune_periodically(self) -> None:
+        while True:
+            try:
+                deleted = await self.prune()
+                if deleted:
+                    logger.info("Pruned %d expired profile views", deleted)
+            except Exception:
+                logger.exception("Pruning profile views failed")
+            await asyncio.sleep(self.prune_interval_seconds)
@@ -1,8 +1,12 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
+import base64
+import binascii
+import json
 import logging
+import re
 import secrets
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
@@ -12,16 +16,106 @@ from datetime import datetime, timezone
 import inspect
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from supabase_document_db import SupabaseDocumentDB
+from pymongo import TEXT
+from pymongo.errors import DuplicateKeyError
+from supabase_document_db import SupabaseDocumentDB, SupabaseDuplicateKeyError, SupabaseIndex, SupabasePoolConfig
+from auth_cache import AgentAuthCache
+from batch_loader import BatchLoader
+from notification_dispatcher import NotificationDispatcher
+from platform_counters import PlatformCounters
+from profile_views import ProfileViewLog
+from social_graph import SocialGraph
+from suggestions import SuggestionEngine
+from timelines import TimelineStore
+from trending import TrendingHashtags
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env', override=True)
 
+# Indexes for the hot filters. Both backends build them at startup; fields in a
+# plain (non-multikey) index must never hold arrays.
+COLLECTION_INDEXES: Dict[str, List[SupabaseIndex]] = {
+    "agents": [
+        SupabaseIndex([("api_key", 1)]),
+        SupabaseIndex([("capabilities", 1)], multikey=True),
+        SupabaseIndex([("name", 1), ("headline", 1), ("capabilities", 1), ("description", 1)], text=True),
+    ],
+    "posts": [SupabaseIndex([("agent_id", 1), ("created_at", -1), ("id", -1)])],
+    "follows": [
+        SupabaseIndex([("follower_id", 1), ("following_id", 1)]),
+        SupabaseIndex([("following_id", 1)]),
+    ],
+    "connections": [
+        SupabaseIndex([("requester_id", 1), ("status", 1)]),
+        SupabaseIndex([("target_id", 1), ("status", 1)]),
+    ],
+    "messages": [
+        SupabaseIndex([("sender_id", 1), ("created_at", -1)]),
+        SupabaseIndex([("receiver_id", 1), ("created_at", -1)]),
+    ],
+    "notifications": [
+        SupabaseIndex([("agent_id", 1), ("created_at", -1), ("id", -1)]),
+        # Replaying the notification spool skips what is already written by
+        # relying on duplicate ids failing. Supabase tables get this index
+        # built in under the same name; Mongo needs it declared.
+        SupabaseIndex([("id", 1)], unique=True, name="uq_notifications_doc_id"),
+    ],
+    "hashtag_buckets": [SupabaseIndex([("tag", 1), ("bucket", 1)], unique=True), SupabaseIndex([("bucket", 1)])],
+    "jobs": [
+        SupabaseIndex([("is_active", 1), ("created_at", -1), ("id", -1)]),
+        SupabaseIndex([("title", 1), ("company_name", 1), ("description", 1)], text=True),
+    ],
+    "companies": [SupabaseIndex([("name", 1), ("description", 1)], text=True)],
+    "groups": [SupabaseIndex([("name", 1), ("description", 1)], text=True)],
+    "reactions": [SupabaseIndex([("post_id", 1), ("agent_id", 1)], unique=True)],
+    "comments": [SupabaseIndex([("post_id", 1), ("parent_id", 1), ("created_at", 1), ("id", 1)])],
+    "timeline_entries": [
+        SupabaseIndex([("owner_id", 1), ("created_at", -1), ("post_id", -1)]),
+        SupabaseIndex([("owner_id", 1), ("agent_id", 1)]),
+    ],
+    "counters": [SupabaseIndex([("scope", 1)], unique=True)],
+    "profile_views": [
+        SupabaseIndex([("agent_id", 1), ("viewer_id", 1), ("bucket", 1)], unique=True),
+        SupabaseIndex([("agent_id", 1), ("created_at", -1), ("id", -1)]),
+    ],
+}
+
+DUPLICATE_KEY_ERRORS = (DuplicateKeyError, SupabaseDuplicateKeyError)
+
+# Sort for text_search queries, best match first; results are not paginated.
+TEXT_SCORE_SORT = [("score", {"$meta": "textScore"})]
+
+# Listings page newest-first on (created_at, id); see keyset_query below. The
+# Supabase adapter indexes this pair on every table, Mongo gets it at startup.
+KEYSET_SORT = [("created_at", -1), ("id", -1)]
+# profile_views and timeline_entries: for the created_at range their prune deletes.
+KEYSET_COLLECTIONS = ("agents", "posts", "profile_views", "timeline_entries")
+# Comment threads read oldest first; posts keep only a preview of the latest few.
+COMMENT_SORT = [("created_at", 1), ("id", 1)]
+COMMENT_PREVIEW_SIZE = 3
+
+# What each /api/stats counter counts: (collection, filter). Write paths keep
+# the stored counters current; PlatformCounters.reconcile recounts from these.
+STATS_SOURCES = {
+    "total_agents": ("agents", {}),
+    "total_posts": ("posts", {}),
+    "total_connections": ("connections", {"status": "accepted"}),
+    "online_agents": ("agents", {"is_online": True}),
+    "total_jobs": ("jobs", {"is_active": True}),
+    "total_companies": ("companies", {}),
+    "total_groups": ("groups", {}),
+}
+
 # Database connection
 supabase_db_url = os.environ.get("SUPABASE_DB_URL")
 
 if supabase_db_url:
-    client = SupabaseDocumentDB(supabase_db_url)
+    client = SupabaseDocumentDB(
+        supabase_db_url,
+        indexes=COLLECTION_INDEXES,
+        index_advisor=os.environ.get("SUPABASE_INDEX_ADVISOR", "").lower() in ("1", "true", "yes"),
+        pool_config=SupabasePoolConfig.from_env(),
+    )
     db = client
 else:
     mongo_url = os.environ.get("MONGO_URL")
@@ -34,6 +128,65 @@ else:
     client = AsyncIOMotorClient(mongo_url)
     db = client[db_name]
 
+# Authenticated agents, keyed by API key hash. Writes to an agent go through
+# update_agent so this process never serves a stale copy; the TTL bounds how
+# long changes made by other workers can take to show up.
+auth_cache = AgentAuthCache(
+    ttl_seconds=float(os.environ.get("AUTH_CACHE_TTL_SECONDS", "60")),
+    max_size=int(os.environ.get("AUTH_CACHE_MAX_SIZE", "10000")),
+)
+
+profile_view_log = ProfileViewLog(
+    db.profile_views,
+    dedup_window_hours=float(os.environ.get("PROFILE_VIEW_DEDUP_HOURS", "24")),
+    retention_days=float(os.environ.get("PROFILE_VIEW_RETENTION_DAYS", "90")),
+)
+
+notification_dispatcher = NotificationDispatcher(
+    db.notifications,
+    spool_path=Path(os.environ.get("NOTIFICATION_SPOOL_PATH", str(ROOT_DIR / "notification_spool.jsonl"))),
+    batch_size=int(os.environ.get("NOTIFICATION_BATCH_SIZE", "100")),
+    max_queue_size=int(os.environ.get("NOTIFICATION_QUEUE_SIZE", "10000")),
+)
+
+trending_hashtags = TrendingHashtags(
+    db.hashtag_buckets,
+    bucket_seconds=int(os.environ.get("TRENDING_BUCKET_SECONDS", "3600")),
+    window_buckets=int(os.environ.get("TRENDING_WINDOW_BUCKETS", "24")),
+    half_life_buckets=float(os.environ.get("TRENDING_HALF_LIFE_BUCKETS", "6")),
+)
+
+# Connections and follows, indexed in memory for membership checks, follower
+# lists, degrees and mutual connections. Misses that would reject an action are
+# confirmed in storage. Write paths call its hooks; see social_graph.py.
+social_graph = SocialGraph(
+    db,
+    reload_interval_seconds=float(os.environ.get("SOCIAL_GRAPH_RELOAD_SECONDS", "3600")),
+)
+
+timelines = TimelineStore(
+    db,
+    social_graph,
+    retention_days=float(os.environ.get("TIMELINE_RETENTION_DAYS", "30")),
+    max_entries=int(os.environ.get("TIMELINE_MAX_ENTRIES", "500")),
+    fanout_follower_limit=int(os.environ.get("TIMELINE_FANOUT_FOLLOWER_LIMIT", "1000")),
+    refresh_interval_seconds=float(os.environ.get("TIMELINE_REFRESH_SECONDS", "300")),
+)
+
+suggestion_engine = SuggestionEngine(
+    db,
+    social_graph,
+    top_n=int(os.environ.get("SUGGESTIONS_TOP_N", "20")),
+    refresh_interval_seconds=float(os.environ.get("SUGGESTIONS_REFRESH_SECONDS", "30")),
+    reload_interval_seconds=float(os.environ.get("SUGGESTIONS_RELOAD_SECONDS", "3600")),
+)
+
+platform_counters = PlatformCounters(
+    db,
+    STATS_SOURCES,
+    reconcile_interval_seconds=float(os.environ.get("STATS_RECONCILE_SECONDS", "600")),
+)
+
 # Create the main app without a prefix
 app = FastAPI(title="AI Connections - LinkedIn for AI Agents")
 
@@ -98,7 +251,6 @@ class Agent(BaseModel):
     follower_count: int = 0
     following_count: int = 0
     post_count: int = 0
-    profile_views: List[str] = []  # List of agent IDs who viewed
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_online: bool = True
 
@@ -126,13 +278,15 @@ class AgentPublic(BaseModel):
 
 class Comment(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    post_id: str
+    parent_id: Optional[str] = None  # Comment this replies to; None for top-level comments
     agent_id: str
     agent_name: str
     agent_avatar: Optional[str] = None
     agent_headline: Optional[str] = None
     content: str
     likes: List[str] = []
-    replies: List[dict] = []
+    reply_count: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class PostCreate(BaseModel):
@@ -153,8 +307,10 @@ class Post(BaseModel):
     hashtags: List[str] = []
     media_url: Optional[str] = None
     media_type: Optional[str] = None
-    reactions: Dict[str, List[str]] = {}  # {reaction_type: [agent_ids]}
-    comments: List[dict] = []
+    reaction_counts: Dict[str, int] = {}  # {reaction_type: count}, see the reactions collection
+    my_reaction: Optional[str] = None  # Viewer's reaction type; filled per request, never stored
+    comments: List[dict] = []  # Preview of the latest top-level comments, see the comments collection
+    comment_count: int = 0
     shares: List[str] = []  # Agent IDs who shared
     share_count: int = 0
     is_repost: bool = False
@@ -263,14 +419,34 @@ class MCPAuthResponse(BaseModel):
 
 # ============== HELPERS ==============
 
+async def agent_for_api_key(api_key: str):
+    agent = auth_cache.get(api_key)
+    if agent is None:
+        agent = await db.agents.find_one({"api_key": api_key}, {"_id": 0})
+        if agent:
+            auth_cache.put(api_key, agent)
+    return agent
+
 async def get_current_agent(x_api_key: str = Header(None)):
     if not x_api_key:
         raise HTTPException(status_code=401, detail="API key required")
-    agent = await db.agents.find_one({"api_key": x_api_key}, {"_id": 0})
+    agent = await agent_for_api_key(x_api_key)
     if not agent:
         raise HTTPException(status_code=401, detail="Invalid API key")
     return agent
 
+async def update_agent(agent_id: str, update: dict, query: Optional[dict] = None):
+    """Apply ``update`` to one agent (if it also matches ``query``) and drop it from the auth cache."""
+    result = await db.agents.update_one({"id": agent_id, **(query or {})}, update)
+    auth_cache.invalidate(agent_id)
+    return result
+
+async def set_presence(agent_id: str, online: bool):
+    """Mark an agent online or offline, counting the change in the platform stats."""
+    result = await update_agent(agent_id, {"$set": {"is_online": online}}, query={"is_online": {"$nin": [online]}})
+    if result.modified_count:
+        await platform_counters.increment("online_agents", 1 if online else -1)
+
 def serialize_datetime(obj):
     if isinstance(obj, datetime):
         return obj.isoformat()
@@ -286,6 +462,109 @@ def serialize_doc(doc):
             doc[key] = serialize_doc(value)
     return doc
 
+def encode_cursor(doc: dict) -> str:
+    """Opaque page token for the (created_at, id) position of ``doc``."""
+    raw = json.dumps([doc.get("created_at"), doc.get("id")], default=serialize_datetime)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, item_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(item_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return created_at, item_id
+
+def text_search(query: dict, search: str) -> dict:
+    """Add a relevance-ranked search over the collection's text index to ``query``."""
+    return {**query, "$text": {"$search": search}}
+
+def keyset_query(query: dict, after: Optional[str], direction: int = -1) -> dict:
+    """Restrict ``query`` to documents that sort after the ``after`` cursor."""
+    if not after:
+        return query
+    created_at, item_id = decode_cursor(after)
+    inclusive, strict = ("$lte", "$lt") if direction < 0 else ("$gte", "$gt")
+    # The inclusive bound is what both backends turn into an index range scan;
+    # the $or only breaks ties within a single created_at.
+    keyset = {
+        "created_at": {inclusive: created_at},
+        "$or": [{"created_at": {strict: created_at}}, {"id": {strict: item_id}}],
+    }
+    return {"$and": [query, keyset]} if query else keyset
+
+async def fetch_page(
+    collection, query: dict, projection: dict, limit: int, after: Optional[str], direction: int = -1
+):
+    """Return ``(docs, next_cursor)`` for one page of ``collection``, newest first unless ``direction`` is 1."""
+    sort = KEYSET_SORT if direction < 0 else COMMENT_SORT
+    docs = await collection.find(keyset_query(query, after, direction), projection).sort(sort).to_list(limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+def get_agent_loader() -> BatchLoader:
+    """Per-request loader that resolves public agent documents in batches."""
+    return BatchLoader(db.agents, projection={"_id": 0, "api_key": 0})
+
+async def viewer_for_api_key(x_api_key: Optional[str]):
+    """The requesting agent on endpoints where authentication is optional."""
+    return await agent_for_api_key(x_api_key) if x_api_key else None
+
+async def toggle_reaction(post_id: str, agent_id: str, reaction_type: str) -> Optional[str]:
+    """
+    Add, switch or remove ``agent_id``'s reaction on a post; return the one it now has.
+
+    The reaction lives in its own document keyed by (post_id, agent_id). Each
+    transition is a conditional write on the previous type and the post's
+    reaction_counts are only adjusted when that write took effect, so
+    concurrent clicks cannot double-count.
+    """
+    key = {"post_id": post_id, "agent_id": agent_id}
+    existing = await db.reactions.find_one(key, {"_id": 0, "reaction_type": 1})
+    if existing is None:
+        doc = {**key, "reaction_type": reaction_type, "created_at": datetime.now(timezone.utc).isoformat()}
+        try:
+            await db.reactions.insert_one(doc)
+        except DUPLICATE_KEY_ERRORS:
+            # A concurrent click won; report what is stored now.
+            current = await db.reactions.find_one(key, {"_id": 0, "reaction_type": 1})
+            return current["reaction_type"] if current else None
+        await db.posts.update_one({"id": post_id}, {"$inc": {f"reaction_counts.{reaction_type}": 1}})
+        return reaction_type
+    
+    previous = existing["reaction_type"]
+    if previous == reaction_type:
+        result = await db.reactions.delete_one({**key, "reaction_type": previous})
+        if result.deleted_count:
+            await db.posts.update_one({"id": post_id}, {"$inc": {f"reaction_counts.{previous}": -1}})
+        return None
+    
+    result = await db.reactions.update_one(
+        {**key, "reaction_type": previous},
+        {"$set": {"reaction_type": reaction_type}}
+    )
+    if result.modified_count:
+        await db.posts.update_one(
+            {"id": post_id},
+            {"$inc": {f"reaction_counts.{previous}": -1, f"reaction_counts.{reaction_type}": 1}}
+        )
+    return reaction_type
+
+async def attach_my_reactions(posts: List[dict], viewer: Optional[dict]) -> None:
+    """Set ``my_reaction`` on each post for ``viewer`` with a single query."""
+    if not viewer or not posts:
+        return
+    post_ids = [post["id"] for post in posts]
+    mine = await db.reactions.find(
+        {"agent_id": viewer["id"], "post_id": {"$in": post_ids}},
+        {"_id": 0, "post_id": 1, "reaction_type": 1}
+    ).to_list(len(post_ids))
+    by_post = {reaction["post_id"]: reaction["reaction_type"] for reaction in mine}
+    for post in posts:
+        post["my_reaction"] = by_post.get(post["id"])
+
 async def create_notification(agent_id: str, type: str, actor_id: str, actor_name: str, actor_avatar: str, message: str, link: str = None):
     notification = Notification(
         agent_id=agent_id,
@@ -298,7 +577,8 @@ async def create_notification(agent_id: str, type: str, actor_id: str, actor_nam
     )
     doc = notification.model_dump()
     doc = serialize_doc(doc)
-    await db.notifications.insert_one(doc)
+    # Written in the background, see notification_dispatcher.py
+    notification_dispatcher.enqueue(doc)
     return notification
 
 # ============== MCP ENDPOINTS ==============
@@ -306,11 +586,11 @@ async def create_notification(agent_id: str, type: str, actor_id: str, actor_nam
 @api_router.post("/mcp/auth", response_model=MCPAuthResponse)
 async def mcp_authenticate(request: MCPAuthRequest):
     """MCP Authentication endpoint for AI agents"""
-    agent = await db.agents.find_one({"api_key": request.api_key}, {"_id": 0})
+    agent = await agent_for_api_key(request.api_key)
     if not agent:
         return MCPAuthResponse(success=False, agent=None, message="Invalid API key")
     
-    await db.agents.update_one({"id": agent["id"]}, {"$set": {"is_online": True}})
+    await set_presence(agent["id"], True)
     
     if isinstance(agent.get('created_at'), str):
         agent['created_at'] = datetime.fromisoformat(agent['created_at'])
@@ -321,7 +601,7 @@ async def mcp_authenticate(request: MCPAuthRequest):
 @api_router.post("/mcp/disconnect")
 async def mcp_disconnect(agent: dict = Depends(get_current_agent)):
     """MCP Disconnect endpoint"""
-    await db.agents.update_one({"id": agent["id"]}, {"$set": {"is_online": False}})
+    await set_presence(agent["id"], False)
     return {"success": True, "message": "Disconnected successfully"}
 
 # ============== AGENT ENDPOINTS ==============
@@ -333,23 +613,36 @@ async def create_agent(agent_data: AgentCreate):
     doc = agent.model_dump()
     doc = serialize_doc(doc)
     await db.agents.insert_one(doc)
+    await platform_counters.increment("total_agents")
+    if agent.is_online:
+        await platform_counters.increment("online_agents")
+    suggestion_engine.agent_added(agent.id, agent.agent_type, agent.capabilities)
     return agent
 
 @api_router.get("/agents", response_model=List[AgentPublic])
-async def get_agents(search: Optional[str] = None, agent_type: Optional[str] = None, limit: int = 50):
-    """Get all agents with optional filters"""
+async def get_agents(
+    response: Response,
+    search: Optional[str] = None,
+    agent_type: Optional[str] = None,
+    limit: int = Query(50, ge=1),
+    after: Optional[str] = None,
+):
+    """
+    Get all agents with optional filters, newest first. Pass X-Next-Cursor back as `after` for the next page.
+    With `search`, returns the best `limit` matches instead, unpaginated.
+    """
     query = {}
-    if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-            {"headline": {"$regex": search, "$options": "i"}},
-            {"capabilities": {"$regex": search, "$options": "i"}}
-        ]
     if agent_type:
         query["agent_type"] = agent_type
     
-    agents = await db.agents.find(query, {"_id": 0, "api_key": 0}).limit(limit).to_list(limit)
+    if search:
+        agents = await db.agents.find(
+            text_search(query, search), {"_id": 0, "api_key": 0}
+        ).sort(TEXT_SCORE_SORT).to_list(limit)
+    else:
+        agents, next_cursor = await fetch_page(db.agents, query, {"_id": 0, "api_key": 0}, limit, after)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
     for agent in agents:
         if isinstance(agent.get('created_at'), str):
             agent['created_at'] = datetime.fromisoformat(agent['created_at'])
@@ -358,7 +651,21 @@ async def get_agents(search: Optional[str] = None, agent_type: Optional[str] = N
 @api_router.get("/agents/suggestions", response_model=List[AgentPublic])
 async def get_agent_suggestions(agent: dict = Depends(get_current_agent)):
     """Get 'People you may know' suggestions"""
-    # Get agents with similar capabilities or type, excluding self and connections
+    ranked_ids = suggestion_engine.suggestions(agent["id"], limit=10)
+    if ranked_ids is not None:
+        found = await db.agents.find(
+            {"id": {"$in": ranked_ids}}, {"_id": 0, "api_key": 0}
+        ).to_list(len(ranked_ids))
+        by_id = {s["id"]: s for s in found}
+        suggestions = [by_id[agent_id] for agent_id in ranked_ids if agent_id in by_id]
+        for s in suggestions:
+            if isinstance(s.get('created_at'), str):
+                s['created_at'] = datetime.fromisoformat(s['created_at'])
+        return suggestions
+
+    # The engine has not loaded the graph yet (or this agent was created by
+    # another worker since): fall back to agents with similar capabilities or
+    # type, excluding self and connections
     connections = await db.connections.find({
         "$or": [
             {"requester_id": agent["id"], "status": "accepted"},
@@ -394,14 +701,10 @@ async def get_agent(agent_id: str, x_api_key: str = Header(None)):
     
     # Track profile view if authenticated and not viewing own profile
     if x_api_key:
-        viewer = await db.agents.find_one({"api_key": x_api_key}, {"_id": 0})
+        viewer = await agent_for_api_key(x_api_key)
         if viewer and viewer["id"] != agent_id:
-            # Add to profile views if not already viewed recently
-            if viewer["id"] not in agent.get("profile_views", []):
-                await db.agents.update_one(
-                    {"id": agent_id},
-                    {"$push": {"profile_views": viewer["id"]}}
-                )
+            # Counted once per viewer per dedup window, see profile_views.py
+            if await profile_view_log.record(agent_id, viewer["id"]):
                 # Create notification
                 await create_notification(
                     agent_id=agent_id,
@@ -418,20 +721,17 @@ async def get_agent(agent_id: str, x_api_key: str = Header(None)):
     return agent
 
 @api_router.get("/agents/{agent_id}/profile-views")
-async def get_profile_views(agent_id: str, agent: dict = Depends(get_current_agent)):
+async def get_profile_views(
+    agent_id: str,
+    agent: dict = Depends(get_current_agent),
+    agents: BatchLoader = Depends(get_agent_loader),
+):
     """Get who viewed your profile"""
     if agent["id"] != agent_id:
         raise HTTPException(status_code=403, detail="Can only view your own profile views")
     
-    target_agent = await db.agents.find_one({"id": agent_id}, {"_id": 0})
-    if not target_agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    
-    viewer_ids = target_agent.get("profile_views", [])[-20:]  # Last 20 viewers
-    viewers = await db.agents.find(
-        {"id": {"$in": viewer_ids}},
-        {"_id": 0, "api_key": 0}
-    ).to_list(20)
+    viewer_ids = await profile_view_log.recent_viewer_ids(agent_id, limit=20)  # Last 20 viewers
+    viewers = [v for v in await agents.load_many(viewer_ids) if v]
     
     for v in viewers:
         if isinstance(v.get('created_at'), str):
@@ -452,7 +752,9 @@ async def update_my_profile(updates: dict, agent: dict = Depends(get_current_age
     update_data = {k: v for k, v in updates.items() if k in allowed_fields}
     
     if update_data:
-        await db.agents.update_one({"id": agent["id"]}, {"$set": update_data})
+        await update_agent(agent["id"], {"$set": update_data})
+        if "capabilities" in update_data:
+            suggestion_engine.capabilities_changed(agent["id"], update_data["capabilities"])
     
     updated = await db.agents.find_one({"id": agent["id"]}, {"_id": 0, "api_key": 0})
     return updated
@@ -461,19 +763,13 @@ async def update_my_profile(updates: dict, agent: dict = Depends(get_current_age
 async def add_experience(exp: Experience, agent: dict = Depends(get_current_agent)):
     """Add experience to profile"""
     exp_dict = exp.model_dump()
-    await db.agents.update_one(
-        {"id": agent["id"]},
-        {"$push": {"experience": exp_dict}}
-    )
+    await update_agent(agent["id"], {"$push": {"experience": exp_dict}})
     return exp_dict
 
 @api_router.delete("/agents/me/experience/{exp_id}")
 async def delete_experience(exp_id: str, agent: dict = Depends(get_current_agent)):
     """Delete experience from profile"""
-    await db.agents.update_one(
-        {"id": agent["id"]},
-        {"$pull": {"experience": {"id": exp_id}}}
-    )
+    await update_agent(agent["id"], {"$pull": {"experience": {"id": exp_id}}})
     return {"success": True}
 
 @api_router.post("/agents/{agent_id}/skills/{skill_name}/endorse")
@@ -496,7 +792,7 @@ async def endorse_skill(agent_id: str, skill_name: str, agent: dict = Depends(ge
         # Create skill if doesn't exist
         skills.append({"name": skill_name, "endorsements": [agent["id"]]})
     
-    await db.agents.update_one({"id": agent_id}, {"$set": {"skills": skills}})
+    await update_agent(agent_id, {"$set": {"skills": skills}})
     
     # Create notification
     await create_notification(
@@ -525,10 +821,7 @@ async def add_recommendation(agent_id: str, content: str, agent: dict = Depends(
         content=content
     )
     
-    await db.agents.update_one(
-        {"id": agent_id},
-        {"$push": {"recommendations": recommendation.model_dump()}}
-    )
+    await update_agent(agent_id, {"$push": {"recommendations": recommendation.model_dump()}})
     
     # Create notification
     await create_notification(
@@ -563,34 +856,59 @@ async def create_post(post_data: PostCreate, agent: dict = Depends(get_current_a
         content=post_data.content,
         hashtags=hashtags,
         media_url=post_data.media_url,
-        media_type=post_data.media_type,
-        reactions={rt: [] for rt in REACTION_TYPES}
+        media_type=post_data.media_type
     )
     doc = post.model_dump()
     doc = serialize_doc(doc)
     await db.posts.insert_one(doc)
+    await platform_counters.increment("total_posts")
+    await timelines.publish(doc, social_graph.follower_count(agent["id"]))
     
     # Update post count
-    await db.agents.update_one({"id": agent["id"]}, {"$inc": {"post_count": 1}})
-    
-    # Update hashtag trends
-    for tag in hashtags:
-        await db.hashtags.update_one(
-            {"tag": tag.lower()},
-            {"$inc": {"count": 1}, "$set": {"last_used": datetime.now(timezone.utc).isoformat()}},
-            upsert=True
-        )
+    await update_agent(agent["id"], {"$inc": {"post_count": 1}})
+    
+    # Update hashtag trends (in memory; written in the background, see trending.py)
+    trending_hashtags.record(hashtags)
     
     return post
 
 @api_router.get("/posts", response_model=List[Post])
-async def get_posts(limit: int = 50, hashtag: Optional[str] = None):
-    """Get feed posts"""
+async def get_posts(
+    response: Response,
+    limit: int = Query(50, ge=1),
+    hashtag: Optional[str] = None,
+    after: Optional[str] = None,
+    x_api_key: str = Header(None),
+):
+    """Get feed posts. Pass X-Next-Cursor back as `after` for the next page."""
     query = {}
     if hashtag:
-        query["hashtags"] = {"$regex": hashtag, "$options": "i"}
+        # A literal (case-insensitive, substring) match, never a user-supplied pattern.
+        query["hashtags"] = {"$regex": re.escape(hashtag), "$options": "i"}
     
-    posts = await db.posts.find(query, {"_id": 0}).sort("created_at", -1).to_list(limit)
+    posts, next_cursor = await fetch_page(db.posts, query, {"_id": 0}, limit, after)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    await attach_my_reactions(posts, await viewer_for_api_key(x_api_key))
+    for post in posts:
+        if isinstance(post.get('created_at'), str):
+            post['created_at'] = datetime.fromisoformat(post['created_at'])
+    return posts
+
+@api_router.get("/feed", response_model=List[Post])
+async def get_home_feed(
+    response: Response,
+    limit: int = Query(20, ge=1),
+    after: Optional[str] = None,
+    agent: dict = Depends(get_current_agent),
+):
+    """Get the current agent's home timeline. Pass X-Next-Cursor back as `after` for the next page."""
+    entries, has_more = await timelines.read_page(agent["id"], limit, decode_cursor(after) if after else None)
+    if has_more:
+        response.headers["X-Next-Cursor"] = encode_cursor(entries[-1])
+    posts_loader = BatchLoader(db.posts, projection={"_id": 0})
+    posts = [post for post in await posts_loader.load_many(entry["id"] for entry in entries) if post]
+    await attach_my_reactions(posts, agent)
     for post in posts:
         if isinstance(post.get('created_at'), str):
             post['created_at'] = datetime.fromisoformat(post['created_at'])
@@ -599,13 +917,21 @@ async def get_posts(limit: int = 50, hashtag: Optional[str] = None):
 @api_router.get("/posts/hashtags/trending")
 async def get_trending_hashtags():
     """Get trending hashtags"""
-    hashtags = await db.hashtags.find({}, {"_id": 0}).sort("count", -1).limit(10).to_list(10)
-    return hashtags
+    return trending_hashtags.top(10)
 
 @api_router.get("/posts/agent/{agent_id}", response_model=List[Post])
-async def get_agent_posts(agent_id: str):
-    """Get posts by a specific agent"""
-    posts = await db.posts.find({"agent_id": agent_id}, {"_id": 0}).sort("created_at", -1).to_list(100)
+async def get_agent_posts(
+    agent_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1),
+    after: Optional[str] = None,
+    x_api_key: str = Header(None),
+):
+    """Get posts by a specific agent. Pass X-Next-Cursor back as `after` for the next page."""
+    posts, next_cursor = await fetch_page(db.posts, {"agent_id": agent_id}, {"_id": 0}, limit, after)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    await attach_my_reactions(posts, await viewer_for_api_key(x_api_key))
     for post in posts:
         if isinstance(post.get('created_at'), str):
             post['created_at'] = datetime.fromisoformat(post['created_at'])
@@ -613,54 +939,46 @@ async def get_agent_posts(agent_id: str):
 
 @api_router.post("/posts/{post_id}/react")
 async def react_to_post(post_id: str, reaction_type: str, agent: dict = Depends(get_current_agent)):
-    """React to a post (like, celebrate, support, insightful, curious, love)"""
+    """React to a post (like, celebrate, support, insightful, curious, love); reacting again with the same type removes it"""
     if reaction_type not in REACTION_TYPES:
         raise HTTPException(status_code=400, detail=f"Invalid reaction type. Must be one of: {REACTION_TYPES}")
     
-    post = await db.posts.find_one({"id": post_id})
+    post = await db.posts.find_one({"id": post_id}, {"_id": 0, "agent_id": 1})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
-    reactions = post.get("reactions", {rt: [] for rt in REACTION_TYPES})
+    my_reaction = await toggle_reaction(post_id, agent["id"], reaction_type)
+    reacted = my_reaction == reaction_type
     
-    # Remove from all other reactions first
-    for rt in REACTION_TYPES:
-        if rt in reactions and agent["id"] in reactions[rt]:
-            reactions[rt].remove(agent["id"])
+    # Create notification if reacted
+    if reacted and post["agent_id"] != agent["id"]:
+        await create_notification(
+            agent_id=post["agent_id"],
+            type="reaction",
+            actor_id=agent["id"],
+            actor_name=agent["name"],
+            actor_avatar=agent.get("avatar_url"),
+            message=f"{agent['name']} reacted {reaction_type} to your post",
+            link=f"/post/{post_id}"
+        )
     
-    # Toggle reaction
-    if agent["id"] in reactions.get(reaction_type, []):
-        reactions[reaction_type].remove(agent["id"])
-        reacted = False
-    else:
-        if reaction_type not in reactions:
-            reactions[reaction_type] = []
-        reactions[reaction_type].append(agent["id"])
-        reacted = True
-        
-        # Create notification if reacted
-        if post["agent_id"] != agent["id"]:
-            await create_notification(
-                agent_id=post["agent_id"],
-                type="reaction",
-                actor_id=agent["id"],
-                actor_name=agent["name"],
-                actor_avatar=agent.get("avatar_url"),
-                message=f"{agent['name']} reacted {reaction_type} to your post",
-                link=f"/post/{post_id}"
-            )
-    
-    await db.posts.update_one({"id": post_id}, {"$set": {"reactions": reactions}})
-    return {"reacted": reacted, "reaction_type": reaction_type, "reactions": reactions}
+    counts = await db.posts.find_one({"id": post_id}, {"_id": 0, "reaction_counts": 1})
+    return {
+        "reacted": reacted,
+        "reaction_type": reaction_type,
+        "my_reaction": my_reaction,
+        "reaction_counts": (counts or {}).get("reaction_counts", {}),
+    }
 
 @api_router.post("/posts/{post_id}/comment")
 async def comment_on_post(post_id: str, content: str = Query(...), agent: dict = Depends(get_current_agent)):
     """Comment on a post"""
-    post = await db.posts.find_one({"id": post_id})
+    post = await db.posts.find_one({"id": post_id}, {"_id": 0, "agent_id": 1})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
     comment = Comment(
+        post_id=post_id,
         agent_id=agent["id"],
         agent_name=agent["name"],
         agent_avatar=agent.get("avatar_url"),
@@ -671,7 +989,15 @@ async def comment_on_post(post_id: str, content: str = Query(...), agent: dict =
     comment_dict = comment.model_dump()
     comment_dict["created_at"] = comment_dict["created_at"].isoformat()
     
-    await db.posts.update_one({"id": post_id}, {"$push": {"comments": comment_dict}})
+    # insert_one adds _id to the document it is given; keep comment_dict clean.
+    await db.comments.insert_one(dict(comment_dict))
+    await db.posts.update_one(
+        {"id": post_id},
+        {
+            "$inc": {"comment_count": 1},
+            "$push": {"comments": {"$each": [comment_dict], "$slice": -COMMENT_PREVIEW_SIZE}},
+        }
+    )
     
     # Create notification
     if post["agent_id"] != agent["id"]:
@@ -687,32 +1013,60 @@ async def comment_on_post(post_id: str, content: str = Query(...), agent: dict =
     
     return comment_dict
 
+@api_router.get("/posts/{post_id}/comments", response_model=List[Comment])
+async def get_post_comments(
+    post_id: str,
+    response: Response,
+    limit: int = Query(20, ge=1),
+    after: Optional[str] = None,
+):
+    """Get top-level comments on a post, oldest first. Pass X-Next-Cursor back as `after` for the next page."""
+    comments, next_cursor = await fetch_page(
+        db.comments, {"post_id": post_id, "parent_id": None}, {"_id": 0}, limit, after, direction=1
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return comments
+
 @api_router.post("/posts/{post_id}/comments/{comment_id}/reply")
 async def reply_to_comment(post_id: str, comment_id: str, content: str = Query(...), agent: dict = Depends(get_current_agent)):
     """Reply to a comment"""
-    post = await db.posts.find_one({"id": post_id})
-    if not post:
-        raise HTTPException(status_code=404, detail="Post not found")
+    parent = await db.comments.find_one({"id": comment_id, "post_id": post_id}, {"_id": 0, "id": 1})
+    if not parent:
+        raise HTTPException(status_code=404, detail="Comment not found")
     
-    reply = {
-        "id": str(uuid.uuid4()),
-        "agent_id": agent["id"],
-        "agent_name": agent["name"],
-        "agent_avatar": agent.get("avatar_url"),
-        "content": content,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
+    reply = Comment(
+        post_id=post_id,
+        parent_id=comment_id,
+        agent_id=agent["id"],
+        agent_name=agent["name"],
+        agent_avatar=agent.get("avatar_url"),
+        agent_headline=agent.get("headline"),
+        content=content
+    )
     
-    comments = post.get("comments", [])
-    for comment in comments:
-        if comment["id"] == comment_id:
-            if "replies" not in comment:
-                comment["replies"] = []
-            comment["replies"].append(reply)
-            break
+    reply_dict = reply.model_dump()
+    reply_dict["created_at"] = reply_dict["created_at"].isoformat()
     
-    await db.posts.update_one({"id": post_id}, {"$set": {"comments": comments}})
-    return reply
+    await db.comments.insert_one(dict(reply_dict))
+    await db.comments.update_one({"id": comment_id}, {"$inc": {"reply_count": 1}})
+    return reply_dict
+
+@api_router.get("/posts/{post_id}/comments/{comment_id}/replies", response_model=List[Comment])
+async def get_comment_replies(
+    post_id: str,
+    comment_id: str,
+    response: Response,
+    limit: int = Query(20, ge=1),
+    after: Optional[str] = None,
+):
+    """Get replies to a comment, oldest first. Pass X-Next-Cursor back as `after` for the next page."""
+    replies, next_cursor = await fetch_page(
+        db.comments, {"post_id": post_id, "parent_id": comment_id}, {"_id": 0}, limit, after, direction=1
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return replies
 
 @api_router.post("/posts/{post_id}/share")
 async def share_post(post_id: str, content: Optional[str] = None, agent: dict = Depends(get_current_agent)):
@@ -732,13 +1086,14 @@ async def share_post(post_id: str, content: Optional[str] = None, agent: dict =
         is_repost=True,
         original_post_id=post_id,
         original_agent_id=original_post["agent_id"],
-        original_agent_name=original_post["agent_name"],
-        reactions={rt: [] for rt in REACTION_TYPES}
+        original_agent_name=original_post["agent_name"]
     )
     
     doc = repost.model_dump()
     doc = serialize_doc(doc)
     await db.posts.insert_one(doc)
+    await platform_counters.increment("total_posts")
+    await timelines.publish(doc, social_graph.follower_count(agent["id"]))
     
     # Update share count on original
     await db.posts.update_one(
@@ -761,11 +1116,12 @@ async def share_post(post_id: str, content: Optional[str] = None, agent: dict =
     return repost
 
 @api_router.get("/posts/{post_id}")
-async def get_post(post_id: str):
+async def get_post(post_id: str, x_api_key: str = Header(None)):
     """Get a single post with all details"""
     post = await db.posts.find_one({"id": post_id}, {"_id": 0})
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
+    await attach_my_reactions([post], await viewer_for_api_key(x_api_key))
     
     if isinstance(post.get('created_at'), str):
         post['created_at'] = datetime.fromisoformat(post['created_at'])
@@ -787,55 +1143,75 @@ async def follow_agent(agent_id: str, agent: dict = Depends(get_current_agent)):
     if not target:
         raise HTTPException(status_code=404, detail="Agent not found")
     
-    existing = await db.follows.find_one({
+    # The graph can miss follows made by other workers since its last reload,
+    # so a miss is confirmed in storage.
+    following = social_graph.is_following(agent["id"], agent_id) or await db.follows.find_one({
         "follower_id": agent["id"],
         "following_id": agent_id
-    })
+    }) is not None
     
-    if existing:
+    if following:
         # Unfollow
-        await db.follows.delete_one({"id": existing["id"]})
-        await db.agents.update_one({"id": agent["id"]}, {"$inc": {"following_count": -1}})
-        await db.agents.update_one({"id": agent_id}, {"$inc": {"follower_count": -1}})
-        return {"following": False}
-    else:
-        # Follow
-        follow = Follow(follower_id=agent["id"], following_id=agent_id)
-        doc = follow.model_dump()
-        doc = serialize_doc(doc)
-        await db.follows.insert_one(doc)
-        await db.agents.update_one({"id": agent["id"]}, {"$inc": {"following_count": 1}})
-        await db.agents.update_one({"id": agent_id}, {"$inc": {"follower_count": 1}})
-        
-        # Create notification
-        await create_notification(
-            agent_id=agent_id,
-            type="follow",
-            actor_id=agent["id"],
-            actor_name=agent["name"],
-            actor_avatar=agent.get("avatar_url"),
-            message=f"{agent['name']} started following you",
-            link=f"/profile/{agent['id']}"
-        )
-        
-        return {"following": True}
+        result = await db.follows.delete_one({"follower_id": agent["id"], "following_id": agent_id})
+        social_graph.follow_removed(agent["id"], agent_id)
+        if result.deleted_count:
+            suggestion_engine.follow_changed(agent["id"], agent_id)
+            await update_agent(agent["id"], {"$inc": {"following_count": -1}})
+            await update_agent(agent_id, {"$inc": {"follower_count": -1}})
+            await timelines.audience_left(agent["id"], agent_id)
+            return {"following": False}
+        # A stale graph hit: another worker already removed the follow, so
+        # toggle to following, as a lookup in storage would have.
+    
+    # Follow
+    follow = Follow(follower_id=agent["id"], following_id=agent_id)
+    doc = follow.model_dump()
+    doc = serialize_doc(doc)
+    await db.follows.insert_one(doc)
+    await update_agent(agent["id"], {"$inc": {"following_count": 1}})
+    await update_agent(agent_id, {"$inc": {"follower_count": 1}})
+    social_graph.follow_added(agent["id"], agent_id)
+    suggestion_engine.follow_changed(agent["id"], agent_id)
+    
+    # Create notification
+    await create_notification(
+        agent_id=agent_id,
+        type="follow",
+        actor_id=agent["id"],
+        actor_name=agent["name"],
+        actor_avatar=agent.get("avatar_url"),
+        message=f"{agent['name']} started following you",
+        link=f"/profile/{agent['id']}"
+    )
+    
+    return {"following": True}
 
 @api_router.get("/agents/{agent_id}/followers")
 async def get_followers(agent_id: str):
     """Get followers of an agent"""
-    follows = await db.follows.find({"following_id": agent_id}, {"_id": 0}).to_list(100)
-    follower_ids = [f["follower_id"] for f in follows]
+    follower_ids = social_graph.follower_ids(agent_id)[:100]
     followers = await db.agents.find({"id": {"$in": follower_ids}}, {"_id": 0, "api_key": 0}).to_list(100)
     return followers
 
 @api_router.get("/agents/{agent_id}/following")
 async def get_following(agent_id: str):
     """Get agents that this agent follows"""
-    follows = await db.follows.find({"follower_id": agent_id}, {"_id": 0}).to_list(100)
-    following_ids = [f["following_id"] for f in follows]
+    following_ids = social_graph.following_ids(agent_id)[:100]
     following = await db.agents.find({"id": {"$in": following_ids}}, {"_id": 0, "api_key": 0}).to_list(100)
     return following
 
+@api_router.get("/agents/{agent_id}/mutual-connections")
+async def get_mutual_connections(
+    agent_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    agent: dict = Depends(get_current_agent),
+    agents: BatchLoader = Depends(get_agent_loader),
+):
+    """Get connections the current agent shares with another agent"""
+    mutual_ids = social_graph.mutual_connection_ids(agent["id"], agent_id)
+    mutual = [a for a in await agents.load_many(mutual_ids[:limit]) if a]
+    return {"count": len(mutual_ids), "agents": mutual}
+
 # ============== CONNECTION ENDPOINTS ==============
 
 @api_router.post("/connections", response_model=Connection)
@@ -845,12 +1221,13 @@ async def request_connection(request: ConnectionRequest, agent: dict = Depends(g
     if not target:
         raise HTTPException(status_code=404, detail="Target agent not found")
     
-    existing = await db.connections.find_one({
+    # A miss may be a request another worker stored since the graph's last reload.
+    existing = social_graph.has_connection(agent["id"], request.target_agent_id) or await db.connections.find_one({
         "$or": [
             {"requester_id": agent["id"], "target_id": request.target_agent_id},
             {"requester_id": request.target_agent_id, "target_id": agent["id"]}
         ]
-    })
+    }) is not None
     if existing:
         raise HTTPException(status_code=400, detail="Connection already exists")
     
@@ -862,6 +1239,7 @@ async def request_connection(request: ConnectionRequest, agent: dict = Depends(g
     doc = connection.model_dump()
     doc = serialize_doc(doc)
     await db.connections.insert_one(doc)
+    social_graph.connection_requested(agent["id"], request.target_agent_id)
     
     # Create notification
     await create_notification(
@@ -877,7 +1255,7 @@ async def request_connection(request: ConnectionRequest, agent: dict = Depends(g
     return connection
 
 @api_router.get("/connections", response_model=List[dict])
-async def get_connections(agent: dict = Depends(get_current_agent)):
+async def get_connections(agent: dict = Depends(get_current_agent), agents: BatchLoader = Depends(get_agent_loader)):
     """Get all connections for current agent"""
     connections = await db.connections.find({
         "$or": [
@@ -886,10 +1264,9 @@ async def get_connections(agent: dict = Depends(get_current_agent)):
         ]
     }, {"_id": 0}).to_list(100)
     
+    other_ids = [conn["target_id"] if conn["requester_id"] == agent["id"] else conn["requester_id"] for conn in connections]
     result = []
-    for conn in connections:
-        other_id = conn["target_id"] if conn["requester_id"] == agent["id"] else conn["requester_id"]
-        other_agent = await db.agents.find_one({"id": other_id}, {"_id": 0, "api_key": 0})
+    for conn, other_agent in zip(connections, await agents.load_many(other_ids)):
         if other_agent:
             if isinstance(other_agent.get('created_at'), str):
                 other_agent['created_at'] = datetime.fromisoformat(other_agent['created_at'])
@@ -897,16 +1274,16 @@ async def get_connections(agent: dict = Depends(get_current_agent)):
     return result
 
 @api_router.get("/connections/pending", response_model=List[dict])
-async def get_pending_connections(agent: dict = Depends(get_current_agent)):
+async def get_pending_connections(agent: dict = Depends(get_current_agent), agents: BatchLoader = Depends(get_agent_loader)):
     """Get pending connection requests"""
     connections = await db.connections.find({
         "target_id": agent["id"],
         "status": "pending"
     }, {"_id": 0}).to_list(100)
     
+    requesters = await agents.load_many(conn["requester_id"] for conn in connections)
     result = []
-    for conn in connections:
-        requester = await db.agents.find_one({"id": conn["requester_id"]}, {"_id": 0, "api_key": 0})
+    for conn, requester in zip(connections, requesters):
         if requester:
             if isinstance(requester.get('created_at'), str):
                 requester['created_at'] = datetime.fromisoformat(requester['created_at'])
@@ -914,16 +1291,16 @@ async def get_pending_connections(agent: dict = Depends(get_current_agent)):
     return result
 
 @api_router.get("/connections/sent", response_model=List[dict])
-async def get_sent_connections(agent: dict = Depends(get_current_agent)):
+async def get_sent_connections(agent: dict = Depends(get_current_agent), agents: BatchLoader = Depends(get_agent_loader)):
     """Get pending connection requests sent by current agent"""
     connections = await db.connections.find({
         "requester_id": agent["id"],
         "status": "pending"
     }, {"_id": 0}).to_list(100)
 
+    targets = await agents.load_many(conn["target_id"] for conn in connections)
     result = []
-    for conn in connections:
-        target = await db.agents.find_one({"id": conn["target_id"]}, {"_id": 0, "api_key": 0})
+    for conn, target in zip(connections, targets):
         if target:
             if isinstance(target.get('created_at'), str):
                 target['created_at'] = datetime.fromisoformat(target['created_at'])
@@ -938,11 +1315,24 @@ async def respond_connection(connection_id: str, accept: bool, agent: dict = Dep
         raise HTTPException(status_code=404, detail="Connection request not found")
     
     status = "accepted" if accept else "rejected"
-    await db.connections.update_one({"id": connection_id}, {"$set": {"status": status}})
+    result = await db.connections.update_one(
+        {"id": connection_id, "status": {"$nin": [status]}}, {"$set": {"status": status}}
+    )
+    # Counted on the status change, so answering the same request twice counts once.
+    if result.modified_count and accept:
+        await platform_counters.increment("total_connections")
+    elif result.modified_count and connection.get("status") == "accepted":
+        await platform_counters.increment("total_connections", -1)
+        social_graph.connection_removed(connection["requester_id"], agent["id"])
+        suggestion_engine.connection_changed(agent["id"], connection["requester_id"])
+        await timelines.audience_left(agent["id"], connection["requester_id"])
+        await timelines.audience_left(connection["requester_id"], agent["id"])
     
     if accept:
-        await db.agents.update_one({"id": agent["id"]}, {"$inc": {"connection_count": 1}})
-        await db.agents.update_one({"id": connection["requester_id"]}, {"$inc": {"connection_count": 1}})
+        await update_agent(agent["id"], {"$inc": {"connection_count": 1}})
+        await update_agent(connection["requester_id"], {"$inc": {"connection_count": 1}})
+        social_graph.connection_accepted(connection["requester_id"], agent["id"])
+        suggestion_engine.connection_changed(agent["id"], connection["requester_id"])
         
         # Create notification
         await create_notification(
@@ -962,14 +1352,17 @@ async def respond_connection(connection_id: str, accept: bool, agent: dict = Dep
 @api_router.post("/messages", response_model=Message)
 async def send_message(msg_data: MessageCreate, agent: dict = Depends(get_current_agent)):
     """Send a message to another agent"""
-    connection = await db.connections.find_one({
-        "$or": [
-            {"requester_id": agent["id"], "target_id": msg_data.receiver_id, "status": "accepted"},
-            {"requester_id": msg_data.receiver_id, "target_id": agent["id"], "status": "accepted"}
-        ]
-    })
-    if not connection:
-        raise HTTPException(status_code=403, detail="Must be connected to send messages")
+    if not social_graph.are_connected(agent["id"], msg_data.receiver_id):
+        # Accepted by another worker since the graph's last reload, or not connected.
+        connection = await db.connections.find_one({
+            "$or": [
+                {"requester_id": agent["id"], "target_id": msg_data.receiver_id, "status": "accepted"},
+                {"requester_id": msg_data.receiver_id, "target_id": agent["id"], "status": "accepted"}
+            ]
+        })
+        if not connection:
+            raise HTTPException(status_code=403, detail="Must be connected to send messages")
+        social_graph.connection_accepted(connection["requester_id"], connection["target_id"])
     
     message = Message(
         sender_id=agent["id"],
@@ -999,7 +1392,7 @@ async def get_conversation(agent_id: str, agent: dict = Depends(get_current_agen
     return messages
 
 @api_router.get("/messages", response_model=List[dict])
-async def get_all_conversations(agent: dict = Depends(get_current_agent)):
+async def get_all_conversations(agent: dict = Depends(get_current_agent), agents: BatchLoader = Depends(get_agent_loader)):
     """Get all conversations"""
     pipeline = [
         {"$match": {"$or": [{"sender_id": agent["id"]}, {"receiver_id": agent["id"]}]}},
@@ -1012,10 +1405,9 @@ async def get_all_conversations(agent: dict = Depends(get_current_agent)):
     
     conversations = await db.messages.aggregate(pipeline).to_list(100)
     
+    others = await agents.load_many(conv["_id"] for conv in conversations)
     result = []
-    for conv in conversations:
-        other_id = conv["_id"]
-        other_agent = await db.agents.find_one({"id": other_id}, {"_id": 0, "api_key": 0})
+    for conv, other_agent in zip(conversations, others):
         if other_agent:
             if isinstance(other_agent.get('created_at'), str):
                 other_agent['created_at'] = datetime.fromisoformat(other_agent['created_at'])
@@ -1028,19 +1420,22 @@ async def get_all_conversations(agent: dict = Depends(get_current_agent)):
 # ============== NOTIFICATION ENDPOINTS ==============
 
 @api_router.get("/notifications")
-async def get_notifications(agent: dict = Depends(get_current_agent), limit: int = 50):
-    """Get notifications for current agent"""
-    notifications = await db.notifications.find(
-        {"agent_id": agent["id"]},
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(limit)
+async def get_notifications(
+    agent: dict = Depends(get_current_agent),
+    limit: int = Query(50, ge=1),
+    after: Optional[str] = None,
+):
+    """Get notifications for current agent. Pass next_cursor back as `after` for the next page."""
+    notifications, next_cursor = await fetch_page(
+        db.notifications, {"agent_id": agent["id"]}, {"_id": 0}, limit, after
+    )
     
     unread_count = await db.notifications.count_documents({
         "agent_id": agent["id"],
         "read": False
     })
     
-    return {"notifications": notifications, "unread_count": unread_count}
+    return {"notifications": notifications, "unread_count": unread_count, "next_cursor": next_cursor}
 
 @api_router.put("/notifications/read")
 async def mark_notifications_read(agent: dict = Depends(get_current_agent)):
@@ -1088,22 +1483,31 @@ async def create_job(
     doc = job.model_dump()
     doc = serialize_doc(doc)
     await db.jobs.insert_one(doc)
+    if job.is_active:
+        await platform_counters.increment("total_jobs")
     return job
 
 @api_router.get("/jobs")
-async def get_jobs(search: Optional[str] = None, job_type: Optional[str] = None, limit: int = 50):
-    """Get job listings"""
+async def get_jobs(
+    response: Response,
+    search: Optional[str] = None,
+    job_type: Optional[str] = None,
+    limit: int = Query(50, ge=1),
+    after: Optional[str] = None,
+):
+    """
+    Get job listings. Pass X-Next-Cursor back as `after` for the next page.
+    With `search`, returns the best `limit` matches instead, unpaginated.
+    """
     query = {"is_active": True}
-    if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"company_name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
     if job_type:
         query["job_type"] = job_type
     
-    jobs = await db.jobs.find(query, {"_id": 0}).sort("created_at", -1).to_list(limit)
+    if search:
+        return await db.jobs.find(text_search(query, search), {"_id": 0}).sort(TEXT_SCORE_SORT).to_list(limit)
+    jobs, next_cursor = await fetch_page(db.jobs, query, {"_id": 0}, limit, after)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return jobs
 
 @api_router.post("/jobs/{job_id}/apply")
@@ -1158,19 +1562,15 @@ async def create_company(
     doc = company.model_dump()
     doc = serialize_doc(doc)
     await db.companies.insert_one(doc)
+    await platform_counters.increment("total_companies")
     return company
 
 @api_router.get("/companies")
 async def get_companies(search: Optional[str] = None, limit: int = 50):
-    """Get companies"""
-    query = {}
+    """Get companies, best matches first when searching"""
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
-    
-    companies = await db.companies.find(query, {"_id": 0}).to_list(limit)
+        return await db.companies.find(text_search({}, search), {"_id": 0}).sort(TEXT_SCORE_SORT).to_list(limit)
+    companies = await db.companies.find({}, {"_id": 0}).to_list(limit)
     return companies
 
 @api_router.get("/companies/{company_id}")
@@ -1213,18 +1613,15 @@ async def create_group(
     doc = group.model_dump()
     doc = serialize_doc(doc)
     await db.groups.insert_one(doc)
+    await platform_counters.increment("total_groups")
     return group
 
 @api_router.get("/groups")
 async def get_groups(search: Optional[str] = None, limit: int = 50):
-    """Get groups"""
+    """Get groups, best matches first when searching"""
     query = {"is_private": False}
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
-    
+        return await db.groups.find(text_search(query, search), {"_id": 0}).sort(TEXT_SCORE_SORT).to_list(limit)
     groups = await db.groups.find(query, {"_id": 0}).to_list(limit)
     return groups
 
@@ -1260,23 +1657,17 @@ async def leave_group(group_id: str, agent: dict = Depends(get_current_agent)):
 @api_router.get("/stats")
 async def get_stats():
     """Get platform statistics"""
-    agent_count = await db.agents.count_documents({})
-    post_count = await db.posts.count_documents({})
-    connection_count = await db.connections.count_documents({"status": "accepted"})
-    online_count = await db.agents.count_documents({"is_online": True})
-    job_count = await db.jobs.count_documents({"is_active": True})
-    company_count = await db.companies.count_documents({})
-    group_count = await db.groups.count_documents({})
-    
-    return {
-        "total_agents": agent_count,
-        "total_posts": post_count,
-        "total_connections": connection_count,
-        "online_agents": online_count,
-        "total_jobs": job_count,
-        "total_companies": company_count,
-        "total_groups": group_count
-    }
+    return await platform_counters.read()
+
+@api_router.get("/stats/auth-cache")
+async def get_auth_cache_stats():
+    """Hit/miss counters for the API-key auth cache of this process"""
+    return auth_cache.metrics()
+
+@api_router.get("/stats/notifications")
+async def get_notification_dispatcher_stats():
+    """Queue and write counters for the notification dispatcher of this process"""
+    return notification_dispatcher.metrics()
 
 # ============== ROOT ==============
 
@@ -1293,6 +1684,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Configure logging
@@ -1312,6 +1704,44 @@ async def startup_db_client():
     if inspect.isawaitable(result):
         await result
 
+@app.on_event("startup")
+async def ensure_mongo_indexes():
+    # The Supabase adapter builds COLLECTION_INDEXES itself when it connects.
+    if isinstance(client, SupabaseDocumentDB):
+        return
+    for collection, indexes in COLLECTION_INDEXES.items():
+        for index in indexes:
+            if index.text:
+                await db[collection].create_index(
+                    [(field, TEXT) for field in index.text_fields],
+                    # Same ordering as the A-D weights ts_rank applies on Supabase.
+                    weights={field: (10, 4, 2, 1)[min(i, 3)] for i, field in enumerate(index.text_fields)},
+                )
+            else:
+                await db[collection].create_index(index.keys, unique=index.unique)
+    for collection in KEYSET_COLLECTIONS:
+        await db[collection].create_index(KEYSET_SORT)
+
+@app.on_event("startup")
+async def start_background_tasks():
+    profile_view_log.start()
+    await notification_dispatcher.start()
+    await trending_hashtags.start()
+    await social_graph.start()
+    await timelines.start()
+    await platform_counters.start()
+    await suggestion_engine.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    await profile_view_log.stop()
+    await notification_dispatcher.stop()
+    await trending_hashtags.stop()
+    await timelines.stop()
+    await suggestion_engine.stop()
+    await social_graph.stop()
+    await platform_counters.stop()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     maybe_close = getattr(client, "close", None)
@@ -0,0 +1,322 @@
+"""
+Process-local index of the connection and follow graph.
+
+Agent IDs are interned to dense ints. Each relation is a 0/1 adjacency
+matrix in compressed sparse row form: ``load`` builds ``indptr``/``indices``
+arrays from storage, and rows changed since are kept as their own sorted
+arrays until the next load. Membership is a binary search over one row,
+degrees are row lengths and mutual connections intersect two sorted rows, so
+every answer takes microseconds and no database round trip.
+
+Write paths keep the index current by calling ``connection_requested``,
+``connection_accepted``, ``connection_removed``, ``follow_added`` and
+``follow_removed`` after their write. Those only see this process's writes,
+so ``start`` also reloads from storage every ``reload_interval_seconds``.
+Until then an edge another worker wrote can be missing and one it removed can
+linger for up to that interval. Callers trust a hit and confirm a miss in
+storage wherever acting on a stale miss would be wrong (rejecting a message
+or a follow toggle); lists, degrees and mutual connections are served as is.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+
+class Adjacency:
+    """Sorted neighbour rows of a 0/1 matrix: a CSR base plus rows changed since."""
+
+    def __init__(self, indptr: Optional[np.ndarray] = None, indices: Optional[np.ndarray] = None):
+        self.indptr = np.zeros(1, dtype=np.int64) if indptr is None else indptr
+        self.indices = _EMPTY if indices is None else indices
+        self._changed: Dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_edges(cls, rows: np.ndarray, cols: np.ndarray, n_rows: int) -> "Adjacency":
+        """Build from parallel arrays of (row, column) pairs; repeated pairs count once."""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        order = np.lexsort((cols, rows))
+        rows, cols = rows[order], cols[order]
+        if len(rows):
+            keep = np.ones(len(rows), dtype=bool)
+            keep[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+            rows, cols = rows[keep], cols[keep]
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+        return cls(indptr, cols.astype(np.int32))
+
+    @property
+    def n_rows(self) -> int:
+        return max(len(self.indptr) - 1, max(self._changed, default=-1) + 1)
+
+    def row(self, i: int) -> np.ndarray:
+        changed = self._changed.get(i)
+        if changed is not None:
+            return changed
+        if i + 1 < len(self.indptr):
+            return self.indices[self.indptr[i]:self.indptr[i + 1]]
+        return _EMPTY
+
+    def contains(self, i: int, j: int) -> bool:
+        row = self.row(i)
+        k = int(np.searchsorted(row, j))
+        return k < len(row) and bool(row[k] == j)
+
+    def degree(self, i: int) -> int:
+        return len(self.row(i))
+
+    def add(self, i: int, j: int) -> bool:
+        row = self.row(i)
+        k = int(np.searchsorted(row, j))
+        if k < len(row) and row[k] == j:
+            return False
+        self._changed[i] = np.insert(row, k, j)
+        return True
+
+    def remove(self, i: int, j: int) -> bool:
+        row = self.row(i)
+        k = int(np.searchsorted(row, j))
+        if k == len(row) or row[k] != j:
+            return False
+        self._changed[i] = np.delete(row, k)
+        return True
+
+    def compacted(self, n_rows: int) -> "Adjacency":
+        """A copy with ``n_rows`` rows and changed rows folded into the CSR arrays."""
+        base_rows = len(self.indptr) - 1
+        row_of = np.repeat(np.arange(base_rows, dtype=np.int64), np.diff(self.indptr))
+        changed = np.fromiter(self._changed, dtype=np.int64, count=len(self._changed))
+        keep = ~np.isin(row_of, changed)
+        rows = np.concatenate([row_of[keep]] + [
+            np.full(len(self._changed[i]), i, dtype=np.int64) for i in changed.tolist()
+        ])
+        cols = np.concatenate([self.indices[keep]] + [self._changed[i] for i in changed.tolist()])
+        return Adjacency.from_edges(rows, cols, max(n_rows, self.n_rows))
+
+    def gather(self, rows: np.ndarray) -> np.ndarray:
+        """Column indices of all of ``rows``, concatenated with repeats kept."""
+        if self._changed:
+            return np.concatenate([_EMPTY] + [self.row(int(i)) for i in rows])
+        rows = rows[rows + 1 < len(self.indptr)]
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return _EMPTY
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+        return self.indices[offsets]
+
+
+class SocialGraph:
+    def __init__(self, db: Any, reload_interval_seconds: float = 3600.0):
+        if reload_interval_seconds <= 0:
+            raise ValueError("reload_interval_seconds must be positive")
+        self.db = db
+        self.reload_interval_seconds = reload_interval_seconds
+        self._ids: List[str] = []
+        self._index: Dict[str, int] = {}
+        self.connections = Adjacency()  # accepted, both directions
+        self.requests = Adjacency()  # any connection document, both directions
+        self.follows = Adjacency()  # follower -> followed
+        self.followers = Adjacency()  # followed -> follower
+        # Bumped on every change, so snapshots know when to rebuild.
+        self.version = 0
+        self._snapshot: Optional[Tuple[int, Tuple[Adjacency, Adjacency, Adjacency]]] = None
+        # Changes made while load is reading storage, replayed on top of it.
+        self._journal: Optional[List[Tuple[str, str, str]]] = None
+        self._loaded = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def size(self) -> int:
+        return len(self._ids)
+
+    def intern(self, agent_id: str) -> int:
+        """The dense index of ``agent_id``, assigned on first use and never reused."""
+        i = self._index.get(agent_id)
+        if i is None:
+            i = self._index[agent_id] = len(self._ids)
+            self._ids.append(agent_id)
+            self.version += 1
+        return i
+
+    def index_of(self, agent_id: str) -> Optional[int]:
+        return self._index.get(agent_id)
+
+    def agent_id(self, i: int) -> str:
+        return self._ids[i]
+
+    def _ids_of(self, indices: np.ndarray) -> List[str]:
+        return [self._ids[i] for i in indices.tolist()]
+
+    def _pair(self, agent_id: str, other_id: str) -> Optional[Tuple[int, int]]:
+        a, b = self._index.get(agent_id), self._index.get(other_id)
+        return None if a is None or b is None else (a, b)
+
+    # Queries. Unknown agents have no edges; looking them up does not intern them.
+
+    def are_connected(self, agent_id: str, other_id: str) -> bool:
+        pair = self._pair(agent_id, other_id)
+        return pair is not None and self.connections.contains(*pair)
+
+    def has_connection(self, agent_id: str, other_id: str) -> bool:
+        """Whether either agent has sent the other a request, whatever its status."""
+        pair = self._pair(agent_id, other_id)
+        return pair is not None and self.requests.contains(*pair)
+
+    def is_following(self, follower_id: str, following_id: str) -> bool:
+        pair = self._pair(follower_id, following_id)
+        return pair is not None and self.follows.contains(*pair)
+
+    def _degree(self, adjacency: Adjacency, agent_id: str) -> int:
+        i = self._index.get(agent_id)
+        return 0 if i is None else adjacency.degree(i)
+
+    def connection_count(self, agent_id: str) -> int:
+        return self._degree(self.connections, agent_id)
+
+    def follower_count(self, agent_id: str) -> int:
+        return self._degree(self.followers, agent_id)
+
+    def following_count(self, agent_id: str) -> int:
+        return self._degree(self.follows, agent_id)
+
+    def _neighbours(self, adjacency: Adjacency, agent_id: str) -> List[str]:
+        i = self._index.get(agent_id)
+        return [] if i is None else self._ids_of(adjacency.row(i))
+
+    def connected_ids(self, agent_id: str) -> List[str]:
+        return self._neighbours(self.connections, agent_id)
+
+    def follower_ids(self, agent_id: str) -> List[str]:
+        return self._neighbours(self.followers, agent_id)
+
+    def following_ids(self, agent_id: str) -> List[str]:
+        return self._neighbours(self.follows, agent_id)
+
+    def mutual_connection_ids(self, agent_id: str, other_id: str) -> List[str]:
+        pair = self._pair(agent_id, other_id)
+        if pair is None:
+            return []
+        a, b = pair
+        return self._ids_of(np.intersect1d(self.connections.row(a), self.connections.row(b), assume_unique=True))
+
+    # Write hooks, called after the corresponding write to storage.
+
+    def connection_requested(self, requester_id: str, target_id: str) -> None:
+        self._apply("request", requester_id, target_id)
+
+    def connection_accepted(self, requester_id: str, target_id: str) -> None:
+        self._apply("accept", requester_id, target_id)
+
+    def connection_removed(self, requester_id: str, target_id: str) -> None:
+        """The connection is no longer accepted; the request itself still exists."""
+        self._apply("disconnect", requester_id, target_id)
+
+    def follow_added(self, follower_id: str, following_id: str) -> None:
+        self._apply("follow", follower_id, following_id)
+
+    def follow_removed(self, follower_id: str, following_id: str) -> None:
+        self._apply("unfollow", follower_id, following_id)
+
+    def _apply(self, change: str, agent_id: str, other_id: str) -> None:
+        if self._journal is not None:
+            self._journal.append((change, agent_id, other_id))
+        a, b = self.intern(agent_id), self.intern(other_id)
+        if change in ("request", "accept"):
+            self.requests.add(a, b)
+            self.requests.add(b, a)
+        if change == "accept":
+            self.connections.add(a, b)
+            self.connections.add(b, a)
+        elif change == "disconnect":
+            self.connections.remove(a, b)
+            self.connections.remove(b, a)
+        elif change == "follow":
+            self.follows.add(a, b)
+            self.followers.add(b, a)
+        elif change == "unfollow":
+            self.follows.remove(a, b)
+            self.followers.remove(b, a)
+        self.version += 1
+
+    def snapshot(self) -> Tuple[Adjacency, Adjacency, Adjacency]:
+        """
+        Compacted copies of (connections, follows, followers), each with
+        ``size`` rows. They are never modified, so they can be read from
+        another thread; repeated calls reuse them until the graph changes.
+        """
+        if self._snapshot is None or self._snapshot[0] != self.version:
+            n = self.size
+            self._snapshot = (self.version, (
+                self.connections.compacted(n), self.follows.compacted(n), self.followers.compacted(n)
+            ))
+        return self._snapshot[1]
+
+    async def load(self) -> None:
+        """Rebuild every relation from storage, keeping the interned IDs."""
+        self._journal = []
+        try:
+            connections = await self.db.connections.find(
+                {}, {"_id": 0, "requester_id": 1, "target_id": 1, "status": 1}
+            ).to_list(None)
+            follows = await self.db.follows.find(
+                {}, {"_id": 0, "follower_id": 1, "following_id": 1}
+            ).to_list(None)
+        except BaseException:
+            self._journal = None
+            raise
+        journal, self._journal = self._journal, None
+
+        requesters = [self.intern(conn["requester_id"]) for conn in connections]
+        targets = [self.intern(conn["target_id"]) for conn in connections]
+        accepted = np.array([conn.get("status") == "accepted" for conn in connections], dtype=bool)
+        followers = [self.intern(follow["follower_id"]) for follow in follows]
+        followed = [self.intern(follow["following_id"]) for follow in follows]
+        n = self.size
+        a, b = np.array(requesters, dtype=np.int64), np.array(targets, dtype=np.int64)
+        both_rows, both_cols = np.concatenate([a, b]), np.concatenate([b, a])
+        both_accepted = np.concatenate([accepted, accepted])
+        self.requests = Adjacency.from_edges(both_rows, both_cols, n)
+        self.connections = Adjacency.from_edges(both_rows[both_accepted], both_cols[both_accepted], n)
+        self.follows = Adjacency.from_edges(np.array(followers), np.array(followed), n)
+        self.followers = Adjacency.from_edges(np.array(followed), np.array(followers), n)
+        self.version += 1
+        # Writes that finished while storage was read may not be in what it returned.
+        for change, agent_id, other_id in journal:
+            self._apply(change, agent_id, other_id)
+        self._loaded = True
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        await self.load()
+        self._task = asyncio.create_task(self._reload_periodically())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _reload_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval_seconds)
+            try:
+                await self.load()
+            except Exception:
+                logger.exception("Reloading the social graph failed; retrying next interval")
@@ -0,0 +1,244 @@
+"""
+Precomputed "People you may know" suggestions.
+
+Connections and follows come from the shared ``SocialGraph`` index; the
+engine adds each agent's type and capabilities. A candidate's score for an
+agent is
+
+    mutual_weight     * connections the two have in common
+  + follow_weight     * agents both of them follow
+  + capability_weight * capabilities both of them list
+  + type_weight       * (1 if they share an agent_type)
+
+Candidates are the agents with a nonzero count in one of the first three
+terms; sharing a type only ranks those. The counts are rows of the sparse
+products C·C, F·Fᵀ and K·Kᵀ (C the connection adjacency, F the follow matrix,
+K agents by capabilities). They are computed with NumPy over compressed
+sparse row arrays: the rows of the second factor selected by agent i's row
+are gathered in one indexing operation and ``np.unique`` sums them per
+candidate, so a row costs time in the number of paths from i rather than
+in the number of agents.
+
+Each agent's ranked candidate IDs are cached, so ``suggestions`` is a dict
+lookup that never computes anything. Graph and profile changes seen by this
+process (``connection_changed``, ``follow_changed`` ...) mark the agents whose
+scores they move as dirty, and the background task recomputes only those
+rows every ``refresh_interval_seconds``, off the event loop; until then the
+cached ranking is served. Every ``reload_interval_seconds`` profiles are
+reloaded from storage and all rows recomputed, which picks up changes made by
+other server processes; the graph reloads itself on its own schedule. The
+first load also runs in the background, so startup does not wait for it.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from social_graph import Adjacency, SocialGraph
+
+logger = logging.getLogger(__name__)
+
+
+class _Matrices(NamedTuple):
+    connections: Adjacency
+    follows: Adjacency
+    followers: Adjacency
+    capabilities: Adjacency
+    capability_holders: Adjacency
+    types: np.ndarray
+
+
+class SuggestionEngine:
+    def __init__(
+        self,
+        db: Any,
+        graph: SocialGraph,
+        top_n: int = 20,
+        refresh_interval_seconds: float = 30.0,
+        reload_interval_seconds: float = 3600.0,
+        mutual_weight: float = 3.0,
+        follow_weight: float = 1.0,
+        capability_weight: float = 1.0,
+        type_weight: float = 0.5,
+    ):
+        if top_n < 1:
+            raise ValueError("top_n must be at least 1")
+        if refresh_interval_seconds <= 0 or reload_interval_seconds <= 0:
+            raise ValueError("refresh_interval_seconds and reload_interval_seconds must be positive")
+        self.db = db
+        self.graph = graph
+        self.top_n = top_n
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.reload_interval_seconds = reload_interval_seconds
+        self.weights = (mutual_weight, follow_weight, capability_weight, type_weight)
+        # Profiles keyed by the graph's agent index.
+        self._types: Dict[int, int] = {}
+        self._type_codes: Dict[str, int] = {}
+        self._capabilities: Dict[int, Set[int]] = {}
+        self._capability_codes: Dict[str, int] = {}
+        self._profiles_version = 0
+        # Rebuilt by the next refresh once the graph or a profile changes.
+        self._matrices: Optional[Tuple[Tuple[int, int], _Matrices]] = None
+        self._cache: Dict[str, List[str]] = {}
+        self._dirty: Set[int] = set()
+        self._loaded = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded and self.graph.loaded
+
+    def _set_profile(self, agent_id: str, agent_type: Optional[str], capabilities: Iterable[str]) -> int:
+        i = self.graph.intern(agent_id)
+        if agent_type is not None:
+            self._types[i] = self._type_codes.setdefault(agent_type, len(self._type_codes))
+        self._capabilities[i] = {
+            self._capability_codes.setdefault(capability, len(self._capability_codes))
+            for capability in capabilities
+        }
+        self._profiles_version += 1
+        return i
+
+    # Changes. Connection and follow hooks run after the matching SocialGraph
+    # hook and only mark the agents whose scores the change moves.
+
+    def agent_added(self, agent_id: str, agent_type: Optional[str], capabilities: Iterable[str]) -> None:
+        self._dirty.add(self._set_profile(agent_id, agent_type, capabilities))
+
+    def capabilities_changed(self, agent_id: str, capabilities: Iterable[str]) -> None:
+        """Only the agent's own row is recomputed; others catch up on the next reload."""
+        self._dirty.add(self._set_profile(agent_id, None, capabilities))
+
+    def connection_changed(self, agent_id: str, other_id: str) -> None:
+        a, b = self.graph.intern(agent_id), self.graph.intern(other_id)
+        # Both sides, and everyone connected to either, gain or lose a mutual connection.
+        self._dirty |= {a, b}
+        self._dirty.update(self.graph.connections.row(a).tolist(), self.graph.connections.row(b).tolist())
+
+    def follow_changed(self, follower_id: str, following_id: str) -> None:
+        a, b = self.graph.intern(follower_id), self.graph.intern(following_id)
+        # The follower's shared-follow count with every other follower of b moved.
+        self._dirty.add(a)
+        self._dirty.update(self.graph.followers.row(b).tolist())
+
+    # Reads
+
+    def suggestions(self, agent_id: str, limit: int = 10) -> Optional[List[str]]:
+        """
+        IDs of the best candidates for ``agent_id``, best first, as of the
+        last refresh. None until loaded, when the agent is unknown to this
+        process, or when its row has not been computed yet; the next refresh
+        computes it.
+        """
+        i = self.graph.index_of(agent_id)
+        if not self.loaded or i is None or i not in self._capabilities:
+            return None
+        ranked = self._cache.get(agent_id)
+        if ranked is None:
+            self._dirty.add(i)
+            return None
+        return ranked[:limit]
+
+    # Computation
+
+    def _build(self) -> _Matrices:
+        version = (self.graph.version, self._profiles_version)
+        if self._matrices is None or self._matrices[0] != version:
+            connections, follows, followers = self.graph.snapshot()
+            n = connections.n_rows
+            types = np.full(n, -1, dtype=np.int64)
+            for i, code in self._types.items():
+                types[i] = code
+            rows = np.fromiter((i for i, codes in self._capabilities.items() for _ in codes), dtype=np.int64)
+            cols = np.fromiter((c for codes in self._capabilities.values() for c in codes), dtype=np.int64)
+            self._matrices = (version, _Matrices(
+                connections,
+                follows,
+                followers,
+                Adjacency.from_edges(rows, cols, n),
+                Adjacency.from_edges(cols, rows, len(self._capability_codes)),
+                types,
+            ))
+        return self._matrices[1]
+
+    def _top_for_rows(self, matrices: _Matrices, rows: Iterable[int]) -> Dict[str, List[str]]:
+        """Ranked candidate IDs for each row; runs off the event loop."""
+        mutual_weight, follow_weight, capability_weight, type_weight = self.weights
+        agent_id = self.graph.agent_id
+        results: Dict[str, List[str]] = {}
+        for i in rows:
+            connected = matrices.connections.row(i)
+            paths = [
+                (matrices.connections.gather(connected), mutual_weight),
+                (matrices.followers.gather(matrices.follows.row(i)), follow_weight),
+                (matrices.capability_holders.gather(matrices.capabilities.row(i)), capability_weight),
+            ]
+            gathered = np.concatenate([ends for ends, _ in paths])
+            weights = np.concatenate([np.full(len(ends), weight, dtype=np.float64) for ends, weight in paths])
+            candidates, inverse = np.unique(gathered, return_inverse=True)
+            scores = np.bincount(inverse.ravel(), weights=weights, minlength=len(candidates))
+            if matrices.types[i] >= 0:
+                scores = scores + type_weight * (matrices.types[candidates] == matrices.types[i])
+            keep = (scores > 0) & (candidates != i) & ~np.isin(candidates, connected)
+            candidates, scores = candidates[keep], scores[keep]
+            if len(candidates) > self.top_n:
+                best = np.argpartition(-scores, self.top_n - 1)[:self.top_n]
+                candidates, scores = candidates[best], scores[best]
+            # Highest score first; ties broken by position for a stable order.
+            order = np.lexsort((candidates, -scores))
+            results[agent_id(i)] = [agent_id(j) for j in candidates[order].tolist()]
+        return results
+
+    async def load(self) -> None:
+        """Reload every agent's type and capabilities and recompute every row."""
+        agents = await self.db.agents.find(
+            {}, {"_id": 0, "id": 1, "agent_type": 1, "capabilities": 1}
+        ).to_list(None)
+        self._types, self._type_codes = {}, {}
+        self._capabilities, self._capability_codes = {}, {}
+        for agent in agents:
+            self._set_profile(agent["id"], agent.get("agent_type"), agent.get("capabilities") or [])
+        self._dirty = set(self._capabilities)
+        await self.refresh()
+        self._loaded = True
+
+    async def refresh(self) -> int:
+        """Recompute the rows marked dirty; return how many."""
+        if not self._dirty:
+            return 0
+        rows, self._dirty = sorted(self._dirty), set()
+        matrices = self._build()
+        # The matrices are never modified, so changes meanwhile are safe; they
+        # mark rows dirty again for the next refresh.
+        results = await asyncio.to_thread(self._top_for_rows, matrices, rows)
+        self._cache.update(results)
+        return len(rows)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _refresh_periodically(self) -> None:
+        reloaded: Optional[float] = None
+        while True:
+            try:
+                if reloaded is None or time.monotonic() - reloaded >= self.reload_interval_seconds:
+                    await self.load()
+                    reloaded = time.monotonic()
+                else:
+                    await self.refresh()
+            except Exception:
+                logger.exception("Refreshing agent suggestions failed; retrying next interval")
+            await asyncio.sleep(self.refresh_interval_seconds)
@@ -1,14 +1,69 @@
+import hashlib
 import json
+import logging
+import operator
+import os
 import re
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
 from copy import deepcopy
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
 from urllib.parse import quote, unquote, urlsplit, urlunsplit
 
 import asyncpg
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pymongo
+except ImportError:
+    pymongo = None
+
+
+logger = logging.getLogger(__name__)
 
 _TABLE_NAME_RE = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
 
+# First byte of every JSONB value in Postgres' binary wire format.
+_JSONB_BINARY_VERSION = b"\x01"
+
+
+if orjson is not None:
+    def _json_dumps(value: Any) -> bytes:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+    def _decode_jsonb(data: bytes) -> Any:
+        return orjson.loads(memoryview(data)[1:])
+else:
+    def _json_dumps(value: Any) -> bytes:
+        return json.dumps(value, separators=(",", ":")).encode()
+
+    def _decode_jsonb(data: bytes) -> Any:
+        return json.loads(data[1:])
+
+
+def _encode_jsonb(value: Any) -> bytes:
+    return _JSONB_BINARY_VERSION + _json_dumps(value)
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """
+    Exchange JSONB with Postgres in binary form, encoded and decoded by orjson
+    when it is installed, so documents never pass through an intermediate
+    Python string. Parameters cast to ``::jsonb`` therefore take plain
+    Python values.
+    """
+    await conn.set_type_codec(
+        "jsonb",
+        schema="pg_catalog",
+        encoder=_encode_jsonb,
+        decoder=_decode_jsonb,
+        format="binary",
+    )
+
 
 def _is_operator_dict(value: Any) -> bool:
     return isinstance(value, dict) and any(str(k).startswith("$") for k in value.keys())
@@ -34,80 +89,756 @@ def _set_field(doc: Dict[str, Any], path: str, value: Any) -> None:
 
 
 def _apply_projection(doc: Dict[str, Any], projection: Optional[Dict[str, int]]) -> Dict[str, Any]:
+    """
+    Project ``doc`` without copying it.
+
+    The result shares nested values with ``doc``; callers hand out freshly
+    decoded rows they own, so nothing else holds a reference to them.
+    """
     if not projection:
-        return deepcopy(doc)
+        return doc
 
     include_fields = [k for k, v in projection.items() if v and k != "_id"]
-    exclude_fields = [k for k, v in projection.items() if not v and k != "_id"]
+    exclude_fields = {k for k, v in projection.items() if not v and k != "_id"}
 
     if include_fields:
         projected: Dict[str, Any] = {}
         for key in include_fields:
             value = _get_field(doc, key)
             if value is not None:
-                _set_field(projected, key, deepcopy(value))
+                _set_field(projected, key, value)
         return projected
 
-    projected = deepcopy(doc)
-    for key in exclude_fields:
-        projected.pop(key, None)
-    return projected
+    return {key: value for key, value in doc.items() if key not in exclude_fields}
+
+
+Matcher = Callable[[Any], bool]
+# A compiled query shape: matches a document against the query's operands,
+# already prepared by the slot preparers (see _Slots).
+ShapeMatcher = Callable[[Any, Sequence[Any]], bool]
+
+_MATCHER_CACHE_SIZE = 256
+_matcher_cache: "OrderedDict[Any, Tuple[ShapeMatcher, List[Callable[[Any], Any]]]]" = OrderedDict()
+
+
+class _Slots:
+    """
+    Operand slots of a query shape. Compiling allocates one per operand, in
+    the order ``_query_shape`` collects the operands of any query with that
+    shape, together with the function that prepares the operand for matching
+    (a frozenset for ``$in``, a compiled regex, ...).
+    """
+
+    def __init__(self) -> None:
+        self.preparers: List[Callable[[Any], Any]] = []
+
+    def add(self, prepare: Callable[[Any], Any]) -> int:
+        self.preparers.append(prepare)
+        return len(self.preparers) - 1
+
+
+def _cached_shape(
+    key: Any, spec: Any, compile_fn: Callable[[Any, _Slots], ShapeMatcher]
+) -> Tuple[ShapeMatcher, List[Callable[[Any], Any]]]:
+    compiled = _matcher_cache.get(key)
+    if compiled is not None:
+        _matcher_cache.move_to_end(key)
+        return compiled
+    slots = _Slots()
+    compiled = (compile_fn(spec, slots), slots.preparers)
+    _matcher_cache[key] = compiled
+    if len(_matcher_cache) > _MATCHER_CACHE_SIZE:
+        _matcher_cache.popitem(last=False)
+    return compiled
+
+
+def _bind(compiled: Tuple[ShapeMatcher, List[Callable[[Any], Any]]], operands: List[Any]) -> Matcher:
+    check, preparers = compiled
+    values = [prepare(operand) for prepare, operand in zip(preparers, operands)]
+    return lambda doc: check(doc, values)
+
+
+def _never(_: Any) -> bool:
+    return False
+
+
+def _always(_: Any) -> bool:
+    return True
+
+
+def _same_value(actual: Any, expected: Any) -> bool:
+    """
+    ``actual == expected``, except that booleans only equal booleans. JSONB
+    keeps ``true`` and ``1`` apart, so this is the equality the compiled SQL
+    applies, while Python's ``==`` has ``True == 1``.
+    """
+    return actual == expected and (type(actual) is bool) == (type(expected) is bool)
+
+
+def _compile_in(value: Any) -> Matcher:
+    operands = list(value)
+    # Booleans are held apart from the rest, since True would otherwise be
+    # found in a set holding 1.
+    booleans = frozenset(operand for operand in operands if type(operand) is bool)
+    try:
+        members: Any = frozenset(operand for operand in operands if type(operand) is not bool)
+    except TypeError:
+        members = None
+
+    def contains(item: Any) -> bool:
+        if type(item) is bool:
+            return item in booleans
+        if members is not None:
+            try:
+                return item in members
+            except TypeError:
+                pass
+        return any(_same_value(item, operand) for operand in operands)
+
+    def match(actual: Any) -> bool:
+        if isinstance(actual, list):
+            return any(contains(item) for item in actual)
+        return contains(actual)
+
+    return match
+
+
+def _compile_nin(value: Any) -> Matcher:
+    matches_in = _compile_in(value)
+    return lambda actual: not matches_in(actual)
+
+
+# Range operators with their Python comparison and SQL/jsonpath spelling.
+_RANGE_OPERATORS = {
+    "$lt": (operator.lt, "<"),
+    "$lte": (operator.le, "<="),
+    "$gt": (operator.gt, ">"),
+    "$gte": (operator.ge, ">="),
+}
+
+
+def _range_kind(value: Any) -> Optional[str]:
+    # Like Mongo, range operators only compare strings with strings and
+    # numbers with numbers.
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return "number"
+    return None
+
+
+def _compile_range(op: str, value: Any) -> Matcher:
+    compare = _RANGE_OPERATORS[op][0]
+    kind = _range_kind(value)
+    if kind is None:
+        return _never
+
+    def check(item: Any) -> bool:
+        return _range_kind(item) == kind and compare(item, value)
+
+    def match(actual: Any) -> bool:
+        if isinstance(actual, list):
+            return any(check(item) for item in actual)
+        return check(actual)
+
+    return match
+
+
+def _compile_regex(value: Any, options: Any) -> Matcher:
+    flags = re.IGNORECASE if "i" in str(options or "") else 0
+    try:
+        search = re.compile(str(value), flags).search
+    except re.error:
+        return _never
+
+    # Like Mongo (and jsonpath's like_regex), only strings are matched, and
+    # arrays match when any element does.
+    def check(item: Any) -> bool:
+        return isinstance(item, str) and search(item) is not None
+
+    def match(actual: Any) -> bool:
+        if isinstance(actual, list):
+            return any(check(item) for item in actual)
+        return check(actual)
+
+    return match
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _operand_preparer(op: str, expected: Dict[str, Any]) -> Optional[Callable[[Any], Matcher]]:
+    """How to turn the operand of ``op`` into a matcher, or None for unsupported operators."""
+    if op == "$in":
+        return _compile_in
+    if op == "$nin":
+        return _compile_nin
+    if op == "$regex":
+        options = expected.get("$options")
+        return lambda value: _compile_regex(value, options)
+    if op in _RANGE_OPERATORS:
+        return lambda value: _compile_range(op, value)
+    return None
+
+
+def _operator_shape(expected: Dict[str, Any], operands: List[Any]) -> Any:
+    # $options changes how the $regex operand is prepared, so it is part of
+    # the shape; every other operand goes to a slot.
+    shape = []
+    for op, value in expected.items():
+        if op == "$options":
+            shape.append((op, str(value)))
+        else:
+            if _operand_preparer(op, expected) is not None:
+                operands.append(value)
+            shape.append(op)
+    return ("ops", tuple(shape))
+
+
+def _query_shape(query: Dict[str, Any], operands: List[Any]) -> Any:
+    """
+    The structure of ``query`` (fields, operators, nesting) as a hashable key,
+    appending its operands to ``operands`` in slot order. Queries that only
+    differ in their values, like ``{"id": x}`` for every ``x``, share a shape.
+    """
+    shape = []
+    for key, expected in query.items():
+        if key in ("$or", "$and"):
+            shape.append((key, tuple(_query_shape(sub_query, operands) if sub_query else None for sub_query in expected)))
+        elif key == "$text":
+            shape.append((key,))
+        elif _is_operator_dict(expected):
+            shape.append((key, _operator_shape(expected, operands)))
+        else:
+            operands.append(expected)
+            shape.append((key, "eq"))
+    return tuple(shape)
+
+
+def _compile_operator_matcher(expected: Dict[str, Any], slots: _Slots) -> ShapeMatcher:
+    used: List[int] = []
+    supported = True
+    for op in expected:
+        if op == "$options":
+            continue
+        prepare = _operand_preparer(op, expected)
+        if prepare is None:
+            # Keep going: later operands still take their slots.
+            supported = False
+            continue
+        used.append(slots.add(prepare))
+    if not supported:
+        return lambda actual, values: False
+    if len(used) == 1:
+        slot = used[0]
+        return lambda actual, values: values[slot](actual)
+    return lambda actual, values: all(values[slot](actual) for slot in used)
+
+
+def _compile_field_matcher(path: str, expected: Any, slots: _Slots) -> ShapeMatcher:
+    parts = path.split(".")
+    if len(parts) == 1:
+        def get(doc: Dict[str, Any]) -> Any:
+            return doc.get(path) if isinstance(doc, dict) else None
+    else:
+        def get(doc: Dict[str, Any]) -> Any:
+            return _get_field(doc, path)
+
+    if _is_operator_dict(expected):
+        check = _compile_operator_matcher(expected, slots)
+        return lambda doc, values: check(get(doc), values)
+
+    slot = slots.add(_identity)
+
+    def equals(doc: Dict[str, Any], values: Sequence[Any]) -> bool:
+        actual = get(doc)
+        expected = values[slot]
+        if isinstance(actual, list):
+            return any(_same_value(item, expected) for item in actual)
+        return _same_value(actual, expected)
+
+    return equals
+
+
+def _compile_matcher(query: Dict[str, Any], slots: _Slots) -> ShapeMatcher:
+    checks: List[ShapeMatcher] = []
+    for key, expected in query.items():
+        if key == "$or":
+            branches = [
+                _compile_matcher(sub_query, slots) if sub_query else (lambda doc, values: True)
+                for sub_query in expected
+            ]
+            checks.append(lambda doc, values, branches=branches: any(branch(doc, values) for branch in branches))
+            continue
+        if key == "$and":
+            checks.extend(_compile_matcher(sub_query, slots) for sub_query in expected if sub_query)
+            continue
+        if key == "$text":
+            # Needs the collection's text index, so it is always applied in SQL.
+            continue
+        checks.append(_compile_field_matcher(key, expected, slots))
+    if len(checks) == 1:
+        return checks[0]
+    return lambda doc, values: all(check(doc, values) for check in checks)
+
+
+def _query_matcher(query: Optional[Dict[str, Any]]) -> Matcher:
+    """
+    Return a predicate equivalent to ``_matches_query(doc, query)``.
+
+    The query's shape is compiled once into closures and kept in a small LRU;
+    queries that differ only in their values reuse it. Binding the values
+    prepares each operand once per query (regexes compiled, ``$in`` operands
+    held in frozensets), not once per document.
+    """
+    if not query:
+        return _always
+    operands: List[Any] = []
+    key = ("query", _query_shape(query, operands))
+    return _bind(_cached_shape(key, query, _compile_matcher), operands)
 
 
 def _matches_operator(actual: Any, expected: Dict[str, Any]) -> bool:
+    operands: List[Any] = []
+    key = ("operator", _operator_shape(expected, operands))
+    return _bind(_cached_shape(key, expected, _compile_operator_matcher), operands)(actual)
+
+
+def _matches_query(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    return _query_matcher(query)(doc)
+
+
+class _SqlParams:
+    """Positional parameters collected while compiling a SQL statement."""
+
+    def __init__(self) -> None:
+        self.values: List[Any] = []
+
+    def add(self, value: Any) -> str:
+        self.values.append(value)
+        return f"${len(self.values)}"
+
+    def mark(self) -> int:
+        return len(self.values)
+
+    def rollback(self, mark: int) -> None:
+        del self.values[mark:]
+
+
+def _sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _doc_path_sql(path: str) -> str:
+    expr = "doc"
+    for part in path.split("."):
+        expr += f" -> {_sql_literal(part)}"
+    return f"({expr})"
+
+
+def _is_json_scalar(value: Any) -> bool:
+    if isinstance(value, float):
+        return value == value and value not in (float("inf"), float("-inf"))
+    return isinstance(value, (str, int, bool))
+
+
+def _jsonb_param(value: Any, params: _SqlParams) -> str:
+    # asyncpg sends None as SQL NULL, which is not the JSON null literal.
+    if value is None:
+        return "'null'::jsonb"
+    return f"{params.add(value)}::jsonb"
+
+
+def _jsonpath_literal(value: Any) -> str:
+    if value is None:
+        return "null"
+    return json.dumps(value)
+
+
+def _compile_equals(
+    path: str, expected: Any, params: _SqlParams, scalar_fields: FrozenSet[str] = frozenset()
+) -> Optional[str]:
+    if path in scalar_fields:
+        # Fields declared scalar by an index compare on the indexed expression.
+        if expected is None:
+            return f"{_sort_expr(path)} IS NULL"
+        if not _is_json_scalar(expected):
+            return None
+        return f"{_sort_expr(path)} = {_jsonb_param(expected, params)}"
+
+    # ``@>`` against a scalar matches the value itself or an array holding it,
+    # which is the same rule ``_matches_query`` applies.
+    field = _doc_path_sql(path)
+    if expected is None:
+        return f"({field} IS NULL OR {field} @> 'null'::jsonb)"
+    if not _is_json_scalar(expected):
+        return None
+    return f"{field} @> {_jsonb_param(expected, params)}"
+
+
+def _compile_in_sql(
+    path: str, value: Any, params: _SqlParams, scalar_fields: FrozenSet[str] = frozenset()
+) -> Optional[str]:
+    if not isinstance(value, (list, tuple, set)):
+        return None
+    values = list(value)
+    if not values:
+        return "FALSE"
+    if not all(item is None or _is_json_scalar(item) for item in values):
+        return None
+    if path in scalar_fields:
+        present = [item for item in values if item is not None]
+        clause = f"{_sort_expr(path)} = ANY({params.add(present)}::jsonb[])"
+        if None in values:
+            clause = f"({_sort_expr(path)} IS NULL OR {clause})"
+        return clause
+    # jsonpath runs in lax mode, so arrays are unwrapped and any
+    # element may satisfy the filter.
+    field = _doc_path_sql(path)
+    condition = " || ".join(f"@ == {_jsonpath_literal(item)}" for item in values)
+    clause = f"{field} @? {params.add(f'$ ? ({condition})')}::jsonpath"
+    if None in values:
+        clause = f"({field} IS NULL OR {clause})"
+    return clause
+
+
+_REGEX_QUANTIFIER = re.compile(r"\{(\d{1,3})(,(\d{1,3})?)?\}")
+# Postgres' regex engine rejects larger repetition counts.
+_REGEX_MAX_REPEAT = 255
+
+
+def _regex_escapable(char: str) -> bool:
+    return char.isascii() and not char.isalnum() and (char == " " or char.isprintable())
+
+
+def _bracket_end(pattern: str, start: int) -> Optional[int]:
+    """Index just past a plain ``[...]`` class starting at ``start``, or None."""
+    i = start + 1
+    members = 0
+    while i < len(pattern) and pattern[i] != "]":
+        char = pattern[i]
+        if char in "[]\\^-":
+            return None
+        if i + 2 < len(pattern) and pattern[i + 1] == "-" and pattern[i + 2] != "]":
+            low, high = char, pattern[i + 2]
+            same_class = any(test(low) and test(high) for test in (str.isdigit, str.islower, str.isupper))
+            if not (low.isascii() and high.isascii() and same_class and low <= high):
+                return None
+            i += 3
+        else:
+            i += 1
+        members += 1
+    if i == len(pattern) or not members:
+        return None
+    return i + 1
+
+
+def _like_regex_pattern(pattern: str) -> Optional[str]:
+    """
+    ``pattern`` rewritten for jsonpath's ``like_regex``, or None when it uses
+    syntax outside the subset that Python's ``re`` and Postgres' regex engine
+    agree on: literals, escaped punctuation, ``.``, ``^``, a trailing ``$``,
+    groups, ``|``, non-negated classes of literals and ASCII ranges, and the
+    ``* + ? {m} {m,} {m,n}`` quantifiers (optionally lazy). Anything else
+    (character-class escapes, lookarounds, inline flags, backreferences,
+    negated classes, possessive quantifiers ...) can match differently or
+    fail in Postgres, so it is left to the Python matcher.
+    """
+    out: List[str] = []
+    quantifiable = False
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            if i + 1 == len(pattern) or not _regex_escapable(pattern[i + 1]):
+                return None
+            out.append(pattern[i:i + 2])
+            i += 2
+            quantifiable = True
+        elif char == "[":
+            end = _bracket_end(pattern, i)
+            if end is None:
+                return None
+            out.append(pattern[i:end])
+            i = end
+            quantifiable = True
+        elif char in "*+?{":
+            if char == "{":
+                found = _REGEX_QUANTIFIER.match(pattern, i)
+                if found is None or any(
+                    int(count) > _REGEX_MAX_REPEAT for count in (found.group(1), found.group(3)) if count
+                ):
+                    return None
+                end = found.end()
+            else:
+                end = i + 1
+            if not quantifiable:
+                return None
+            if pattern[end:end + 1] == "?":
+                end += 1
+            out.append(pattern[i:end])
+            i = end
+            quantifiable = False
+        elif char == "(":
+            if pattern[i + 1:i + 2] == "?":
+                return None
+            out.append(char)
+            i += 1
+            quantifiable = False
+        elif char == "$":
+            if i != len(pattern) - 1:
+                return None
+            # Python's $ also matches before a final newline.
+            out.append("\\n?$")
+            i += 1
+        elif char in "}]":
+            return None
+        else:
+            # Literals, ".", "^", "|" and ")" mean the same in both engines.
+            out.append(char)
+            i += 1
+            quantifiable = char not in "^|"
+    return "".join(out)
+
+
+def _compile_operator(
+    path: str, expected: Dict[str, Any], params: _SqlParams, scalar_fields: FrozenSet[str] = frozenset()
+) -> Optional[str]:
+    field = _doc_path_sql(path)
+    clauses: List[str] = []
+
     for op, value in expected.items():
         if op == "$options":
             continue
 
-        if op == "$in":
-            if isinstance(actual, list):
-                if not any(item in value for item in actual):
-                    return False
-            elif actual not in value:
-                return False
+        if op in ("$in", "$nin"):
+            clause = _compile_in_sql(path, value, params, scalar_fields)
+            if clause is None:
+                return None
+            # $nin is exactly the rows $in rejects, including those where the
+            # $in test is NULL.
+            clauses.append(clause if op == "$in" else f"({clause}) IS NOT TRUE")
+            continue
+
+        if op in _RANGE_OPERATORS:
+            kind = _range_kind(value)
+            if kind is None or not _is_json_scalar(value):
+                return None
+            sql_op = _RANGE_OPERATORS[op][1]
+            if path in scalar_fields:
+                # Stays a plain comparison on the indexed expression so a
+                # btree range scan can serve it.
+                expr = _sort_expr(path)
+                clauses.append(f"jsonb_typeof({expr}) = '{kind}' AND {expr} {sql_op} {_jsonb_param(value, params)}")
+            else:
+                jsonpath = f"$ ? (@ {sql_op} {_jsonpath_literal(value)})"
+                clauses.append(f"{field} @? {params.add(jsonpath)}::jsonpath")
             continue
 
         if op == "$regex":
-            flags = re.IGNORECASE if "i" in str(expected.get("$options", "")) else 0
+            options = str(expected.get("$options", ""))
+            if any(flag not in "i" for flag in options):
+                return None
+            pattern = str(value)
             try:
-                pattern = re.compile(str(value), flags)
+                re.compile(pattern)
             except re.error:
-                return False
-            if not pattern.search(str(actual or "")):
-                return False
+                clauses.append("FALSE")
+                continue
+            translated = _like_regex_pattern(pattern)
+            if translated is None:
+                # Outside the subset both engines agree on; the Python matcher decides.
+                return None
+            flag = ' flag "i"' if "i" in options else ""
+            jsonpath = f"$ ? (@ like_regex {json.dumps(translated)}{flag})"
+            clauses.append(f"{field} @? {params.add(jsonpath)}::jsonpath")
             continue
 
-        return False
+        return None
 
-    return True
+    if not clauses:
+        return "TRUE"
+    return " AND ".join(clauses)
 
 
-def _matches_query(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
-    if not query:
-        return True
+def _compile_filter(
+    query: Optional[Dict[str, Any]],
+    params: _SqlParams,
+    scalar_fields: FrozenSet[str] = frozenset(),
+    text_search: Optional["_TextSearch"] = None,
+) -> Tuple[str, bool]:
+    """
+    Translate a Mongo-style filter into a SQL predicate over the ``doc`` column.
+
+    Returns ``(predicate, exact)``. Clauses that cannot be expressed in SQL are
+    left out, so the predicate may only narrow the candidate rows; when
+    ``exact`` is False the caller must re-check each row with ``_matches_query``.
+    Fields in ``scalar_fields`` are known to never hold arrays, which lets
+    equality use the btree-indexed expression instead of containment.
+    ``$text`` needs ``text_search``, built from the collection's text index.
+    """
+    clauses: List[str] = []
+    exact = True
+
+    for key, expected in (query or {}).items():
+        mark = params.mark()
+        clause: Optional[str]
 
-    for key, expected in query.items():
         if key == "$or":
-            if not any(_matches_query(doc, sub_query) for sub_query in expected):
-                return False
+            branches: List[str] = []
+            clause = None
+            for sub_query in expected:
+                branch, branch_exact = _compile_filter(sub_query, params, scalar_fields, text_search)
+                if not branch_exact:
+                    break
+                branches.append(f"({branch})")
+            else:
+                clause = " OR ".join(branches) if branches else "FALSE"
+        elif key == "$and":
+            # A partly compiled branch still narrows the rows, so keep it and
+            # only mark the filter inexact.
+            parts: List[str] = []
+            for sub_query in expected:
+                part, part_exact = _compile_filter(sub_query, params, scalar_fields, text_search)
+                exact = exact and part_exact
+                parts.append(f"({part})")
+            clause = " AND ".join(parts) if parts else "TRUE"
+        elif key == "$text":
+            clause = _compile_text(expected, text_search, params)
+        elif key.startswith("$"):
+            clause = None
+        elif _is_operator_dict(expected):
+            clause = _compile_operator(key, expected, params, scalar_fields)
+        else:
+            clause = _compile_equals(key, expected, params, scalar_fields)
+
+        if clause is None:
+            params.rollback(mark)
+            exact = False
             continue
+        clauses.append(f"({clause})")
 
-        actual = _get_field(doc, key)
+    if not clauses:
+        return "TRUE", exact
+    return " AND ".join(clauses), exact
 
-        if _is_operator_dict(expected):
-            if not _matches_operator(actual, expected):
-                return False
-            continue
 
-        if isinstance(actual, list):
-            if expected not in actual:
-                return False
+def _sort_expr(field: str) -> str:
+    return f"NULLIF({_doc_path_sql(field)}, 'null'::jsonb)"
+
+
+def _text_field_sql(field: str) -> str:
+    parts = field.split(".")
+    expr = "doc" + "".join(f" -> {_sql_literal(part)}" for part in parts[:-1])
+    return f"COALESCE({expr} ->> {_sql_literal(parts[-1])}, '')"
+
+
+def _text_search_sql(fields: Sequence[str]) -> str:
+    """Lower-cased concatenation of ``fields``, what substring matches run on."""
+    return "lower(" + " || ' ' || ".join(_text_field_sql(field) for field in fields) + ")"
+
+
+def _text_vector_sql(fields: Sequence[str]) -> str:
+    # Earlier fields weigh more: A, B, C, then D for the rest.
+    return " || ".join(
+        f"setweight(to_tsvector('simple', {_text_field_sql(field)}), '{'ABCD'[min(i, 3)]}')"
+        for i, field in enumerate(fields)
+    )
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _text_terms(expected: Any) -> Tuple[str, str]:
+    """``(tsquery, like_pattern)`` for a ``$text`` operand; the tsquery may be empty."""
+    if not isinstance(expected, dict) or set(expected) - {"$search"}:
+        raise NotImplementedError(f"Unsupported $text options: {expected!r}")
+    search = str(expected.get("$search", "")).strip().lower()
+    # Only word characters reach to_tsquery, so user input cannot inject
+    # tsquery syntax; each word also matches as a prefix.
+    tsquery = " | ".join(f"{word}:*" for word in re.findall(r"[^\W_]+", search))
+    return tsquery, f"%{_escape_like(search)}%"
+
+
+class _TextSearch(NamedTuple):
+    fields: Sequence[str]
+    # Whether the trigram index exists to serve substring matches.
+    substring: bool
+
+
+def _compile_text(expected: Any, text_search: Optional[_TextSearch], params: _SqlParams) -> str:
+    """
+    Match documents containing any word of ``$search`` (by prefix) in the text
+    index's fields, served by the tsvector GIN index. With the trigram index
+    in place, the whole search string also matches as a substring.
+    """
+    if text_search is None:
+        raise ValueError("$text queries need a text index on the collection")
+    tsquery, pattern = _text_terms(expected)
+    clauses = []
+    if tsquery:
+        clauses.append(f"({_text_vector_sql(text_search.fields)}) @@ to_tsquery('simple', {params.add(tsquery)})")
+    if text_search.substring:
+        clauses.append(f"{_text_search_sql(text_search.fields)} LIKE {params.add(pattern)}")
+    return " OR ".join(clauses) or "FALSE"
+
+
+def _compile_text_rank(expected: Any, text_search: Optional[_TextSearch], params: _SqlParams) -> str:
+    """Relevance for ``{"$meta": "textScore"}`` sorts: ts_rank plus 1 for a substring match."""
+    if text_search is None:
+        raise ValueError("textScore sorts need a $text query and a text index")
+    tsquery, pattern = _text_terms(expected)
+    substring = f"CASE WHEN {_text_search_sql(text_search.fields)} LIKE {params.add(pattern)} THEN 1 ELSE 0 END"
+    if not tsquery:
+        return substring
+    vector = _text_vector_sql(text_search.fields)
+    return f"ts_rank({vector}, to_tsquery('simple', {params.add(tsquery)})) + {substring}"
+
+
+def _is_text_score(direction: Any) -> bool:
+    return isinstance(direction, dict) and direction.get("$meta") == "textScore"
+
+
+def _compile_sort(sorts: List[Tuple[str, Any]], text_rank: Optional[str] = None) -> str:
+    # Matches the Python sort: ascending puts missing/null values last,
+    # descending puts them first, and ties keep insertion (pk) order.
+    terms: List[str] = []
+    for field, direction in sorts:
+        if _is_text_score(direction):
+            if text_rank is None:
+                raise ValueError("textScore sorts need a $text query")
+            terms.append(f"{text_rank} DESC")
             continue
+        expr = _sort_expr(field)
+        terms.append(f"{expr} DESC NULLS FIRST" if direction < 0 else f"{expr} ASC NULLS LAST")
+    # ``id`` is unique (see ``_BUILTIN_INDEXES``), so a sort ending on it needs
+    # no tie-break and can be read straight off a (..., id) index.
+    if not sorts or sorts[-1][0] != "id":
+        terms.append("pk")
+    return ", ".join(terms)
 
-        if actual != expected:
-            return False
 
-    return True
+def _compile_projection(projection: Optional[Dict[str, int]], params: _SqlParams) -> Optional[str]:
+    if not projection:
+        return "doc"
+
+    include_fields = [k for k, v in projection.items() if v and k != "_id"]
+    exclude_fields = [k for k, v in projection.items() if not v and k != "_id"]
+
+    if include_fields:
+        if any("." in key for key in include_fields):
+            return None
+        return (
+            "COALESCE((SELECT jsonb_object_agg(e.key, e.value) FROM jsonb_each(doc) AS e "
+            f"WHERE e.key = ANY({params.add(include_fields)}::text[]) AND e.value <> 'null'::jsonb), "
+            "'{}'::jsonb)"
+        )
+
+    if not exclude_fields:
+        return "doc"
+    return f"(doc - {params.add(exclude_fields)}::text[])"
 
 
 def _sort_key(value: Any) -> Tuple[bool, Any]:
@@ -116,42 +847,211 @@ def _sort_key(value: Any) -> Tuple[bool, Any]:
     return (False, str(value))
 
 
+def _pull_matches(item: Any, condition: Any) -> bool:
+    # Like Mongo, a document condition pulls the elements it matches rather
+    # than only elements that are exactly equal to it.
+    if _is_operator_dict(condition):
+        return _matches_operator(item, condition)
+    if isinstance(condition, dict):
+        return isinstance(item, dict) and _matches_query(item, condition)
+    return _same_value(item, condition)
+
+
+def _push_modifiers(value: Any) -> Tuple[List[Any], Optional[int]]:
+    """Split a ``$push`` value into the items to append and the ``$slice`` bound."""
+    if not (isinstance(value, dict) and "$each" in value):
+        return [value], None
+    unknown = set(value) - {"$each", "$slice"}
+    if unknown:
+        raise NotImplementedError(f"Unsupported $push modifiers: {sorted(unknown)}")
+    slice_ = value.get("$slice")
+    if slice_ is not None and (isinstance(slice_, bool) or not isinstance(slice_, int)):
+        raise ValueError("$slice must be an integer")
+    return list(value["$each"]), slice_
+
+
+def _writable_parent(root: Dict[str, Any], path: str, copied: Dict[int, Dict[str, Any]]) -> Tuple[Dict[str, Any], str]:
+    """
+    Return the dict holding the last part of ``path`` and that part's key.
+
+    Dicts on the way down are shallow-copied the first time an update touches
+    them (``copied`` remembers which ones), so the original document and
+    every untouched subtree stay shared.
+    """
+    parts = path.split(".")
+    current = root
+    for part in parts[:-1]:
+        child = current.get(part)
+        if not isinstance(child, dict):
+            child = {}
+        elif id(child) not in copied:
+            child = dict(child)
+        copied[id(child)] = child
+        current[part] = child
+        current = child
+    return current, parts[-1]
+
+
 def _apply_update(doc: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
-    next_doc = deepcopy(doc)
+    """
+    Return ``doc`` with ``update`` applied, leaving ``doc`` untouched.
+
+    Only the dicts along each updated path are copied and arrays are
+    rebuilt rather than mutated, so a post's comment list is not copied when
+    an update changes its like count.
+    """
+    next_doc = dict(doc)
+    copied: Dict[int, Dict[str, Any]] = {id(next_doc): next_doc}
 
     for op, payload in (update or {}).items():
         if op == "$set":
             for field, value in payload.items():
-                _set_field(next_doc, field, value)
+                parent, key = _writable_parent(next_doc, field, copied)
+                parent[key] = value
             continue
 
         if op == "$inc":
             for field, value in payload.items():
-                current = _get_field(next_doc, field) or 0
-                _set_field(next_doc, field, current + value)
+                parent, key = _writable_parent(next_doc, field, copied)
+                parent[key] = (parent.get(key) or 0) + value
             continue
 
         if op == "$push":
             for field, value in payload.items():
-                current = _get_field(next_doc, field)
-                if not isinstance(current, list):
-                    current = []
-                current.append(value)
-                _set_field(next_doc, field, current)
+                parent, key = _writable_parent(next_doc, field, copied)
+                current = parent.get(key)
+                items, slice_ = _push_modifiers(value)
+                pushed = (current if isinstance(current, list) else []) + items
+                if slice_ is not None:
+                    pushed = pushed[slice_:] if slice_ < 0 else pushed[:slice_]
+                parent[key] = pushed
             continue
 
         if op == "$pull":
             for field, value in payload.items():
-                current = _get_field(next_doc, field)
+                parent, key = _writable_parent(next_doc, field, copied)
+                current = parent.get(key)
                 if not isinstance(current, list):
                     current = []
-                current = [item for item in current if item != value]
-                _set_field(next_doc, field, current)
+                parent[key] = [item for item in current if not _pull_matches(item, value)]
             continue
 
     return next_doc
 
 
+DEFAULT_BATCH_SIZE = 500
+
+_UPDATE_OPERATORS = ("$set", "$inc", "$push", "$pull")
+_WRITE_BATCH_SIZE = 500
+# insert_many switches from executemany to COPY at this many documents.
+_COPY_THRESHOLD = 100
+_JSONB_BUILD_MAX_PAIRS = 50
+
+
+def _array_or_empty_sql(field_sql: str) -> str:
+    return f"(CASE WHEN jsonb_typeof({field_sql}) = 'array' THEN {field_sql} ELSE '[]'::jsonb END)"
+
+
+def _compile_update(update: Dict[str, Any], params: _SqlParams) -> Optional[str]:
+    """
+    Compile update operators into an expression for the new ``doc`` value.
+
+    Each field is computed from the row being updated, so concurrent ``$inc``
+    and ``$push`` calls do not overwrite each other. Dotted paths merge into
+    their parent objects, creating them as ``_apply_update`` does. Returns
+    None when the update touches a field twice (or a field and its parent) or
+    uses an operator the compiler does not know; those run as a
+    read-modify-write instead.
+    """
+    tree: Dict[str, Any] = {}
+
+    for op, payload in (update or {}).items():
+        if op not in _UPDATE_OPERATORS or not isinstance(payload, dict):
+            return None
+
+        for field, value in payload.items():
+            parts = field.split(".")
+            node = tree
+            for part in parts[:-1]:
+                node = node.setdefault(part, {})
+                if not isinstance(node, dict):
+                    return None
+            if parts[-1] in node:
+                return None
+            current = _doc_path_sql(field)
+
+            if op == "$set":
+                value_sql = _jsonb_param(value, params)
+            elif op == "$inc":
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    return None
+                value_sql = (
+                    f"to_jsonb(COALESCE(NULLIF({current}, 'null'::jsonb)::numeric, 0) "
+                    f"+ {params.add(value)}::numeric)"
+                )
+            elif op == "$push":
+                items, slice_ = _push_modifiers(value)
+                value_sql = f"({_array_or_empty_sql(current)} || {params.add(items)}::jsonb)"
+                if slice_ is not None:
+                    value_sql = _slice_array_sql(value_sql, slice_)
+            else:
+                condition = _compile_pull_condition(value, params)
+                if condition is None:
+                    return None
+                # The element alias shadows the table's ``doc`` column, so a
+                # compiled document filter applies to each array element.
+                value_sql = (
+                    "COALESCE((SELECT jsonb_agg(x.doc ORDER BY x.ord) "
+                    f"FROM jsonb_array_elements({_array_or_empty_sql(current)}) WITH ORDINALITY AS x(doc, ord) "
+                    f"WHERE NOT ({condition})), '[]'::jsonb)"
+                )
+
+            node[parts[-1]] = value_sql
+
+    if not tree:
+        return "doc"
+    return f"(doc || {_merge_objects_sql(tree, [])})"
+
+
+def _slice_array_sql(array_sql: str, slice_: int) -> str:
+    """Keep the first ``slice_`` elements, or the last ``-slice_`` when negative."""
+    if slice_ >= 0:
+        keep = f"x.ord <= {int(slice_)}"
+    else:
+        keep = f"x.ord > jsonb_array_length({array_sql}) - {int(-slice_)}"
+    return (
+        "COALESCE((SELECT jsonb_agg(x.value ORDER BY x.ord) "
+        f"FROM jsonb_array_elements({array_sql}) WITH ORDINALITY AS x(value, ord) "
+        f"WHERE {keep}), '[]'::jsonb)"
+    )
+
+
+def _merge_objects_sql(tree: Dict[str, Any], parents: List[str]) -> str:
+    pairs: List[str] = []
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            parent = _doc_path_sql(".".join(parents + [key]))
+            base = f"(CASE WHEN jsonb_typeof({parent}) = 'object' THEN {parent} ELSE '{{}}'::jsonb END)"
+            value = f"({base} || {_merge_objects_sql(value, parents + [key])})"
+        pairs.append(f"{_sql_literal(key)}, {value}")
+    chunks = [
+        ", ".join(pairs[i:i + _JSONB_BUILD_MAX_PAIRS])
+        for i in range(0, len(pairs), _JSONB_BUILD_MAX_PAIRS)
+    ]
+    return " || ".join(f"jsonb_build_object({chunk})" for chunk in chunks)
+
+
+def _compile_pull_condition(condition: Any, params: _SqlParams) -> Optional[str]:
+    if _is_operator_dict(condition):
+        return None
+    if isinstance(condition, dict):
+        where, exact = _compile_filter(condition, params)
+        if not exact:
+            return None
+        return f"jsonb_typeof(doc) = 'object' AND {where}"
+    return f"doc = {_jsonb_param(condition, params)}"
+
+
 def _extract_upsert_base(query: Dict[str, Any]) -> Dict[str, Any]:
     base: Dict[str, Any] = {}
     for key, value in (query or {}).items():
@@ -189,14 +1089,467 @@ def _eval_condition(cond: Any, doc: Dict[str, Any]) -> bool:
     return bool(_eval_expr(cond, doc))
 
 
+_SUPPORTED_STAGES = ("$match", "$sort", "$group")
+
+
+def _validate_pipeline(pipeline: List[Dict[str, Any]]) -> None:
+    for stage in pipeline:
+        if len(stage) != 1 or next(iter(stage)) not in _SUPPORTED_STAGES:
+            raise NotImplementedError(
+                f"Unsupported aggregation stage: {list(stage.keys())}. "
+                f"Supported stages are {', '.join(_SUPPORTED_STAGES)}."
+            )
+        if "$group" in stage:
+            group_spec = stage["$group"]
+            if "_id" not in group_spec:
+                raise NotImplementedError("$group stage requires an _id expression")
+            for out_field, accumulator in group_spec.items():
+                if out_field == "_id":
+                    continue
+                if not isinstance(accumulator, dict) or list(accumulator.keys()) != ["$first"]:
+                    raise NotImplementedError(
+                        f"Unsupported $group accumulator for '{out_field}': {accumulator!r}. "
+                        "Only $first is supported."
+                    )
+
+
+def _compile_expr(expr: Any, params: _SqlParams) -> Optional[str]:
+    """Compile an aggregation expression into a JSONB-valued SQL expression."""
+    if isinstance(expr, str):
+        if expr == "$$ROOT":
+            return "doc"
+        if expr.startswith("$"):
+            return _sort_expr(expr[1:])
+        return _jsonb_param(expr, params)
+
+    if isinstance(expr, dict) and _is_operator_dict(expr):
+        if "$cond" in expr:
+            if not isinstance(expr["$cond"], list) or len(expr["$cond"]) != 3:
+                return None
+            cond_expr, true_expr, false_expr = expr["$cond"]
+            cond_sql = _compile_condition(cond_expr, params)
+            true_sql = _compile_expr(true_expr, params)
+            false_sql = _compile_expr(false_expr, params)
+            if cond_sql is None or true_sql is None or false_sql is None:
+                return None
+            return f"(CASE WHEN {cond_sql} THEN {true_sql} ELSE {false_sql} END)"
+        if "$eq" in expr:
+            cond_sql = _compile_condition(expr, params)
+            return None if cond_sql is None else f"to_jsonb({cond_sql})"
+        return None
+
+    if expr is None:
+        return "NULL::jsonb"
+    try:
+        _json_dumps(expr)
+    except (TypeError, ValueError):
+        return None
+    return _jsonb_param(expr, params)
+
+
+def _compile_condition(cond: Any, params: _SqlParams) -> Optional[str]:
+    if not (isinstance(cond, dict) and "$eq" in cond):
+        return None
+    lhs, rhs = cond["$eq"]
+    lhs_sql = _compile_expr(lhs, params)
+    rhs_sql = _compile_expr(rhs, params)
+    if lhs_sql is None or rhs_sql is None:
+        return None
+    return f"({lhs_sql} IS NOT DISTINCT FROM {rhs_sql})"
+
+
+class SupabaseIndex:
+    """
+    Declarative expression index on a document collection.
+
+    ``keys`` are ``(field, direction)`` pairs, as in Motor's ``create_index``.
+    By default this is a btree over the same expressions used for sorting,
+    and its fields are treated as scalar: equality and ``$in`` on them compile
+    to plain comparisons the index can serve. Only declare fields that never
+    hold arrays that way; array-valued fields need ``multikey=True``, which
+    builds a GIN index for membership, ``$in`` and ``$regex`` filters.
+    ``text=True`` declares the collection's ``$text`` index over its fields,
+    earlier fields ranking higher: a tsvector GIN index plus, when the
+    pg_trgm extension is available, a trigram index for substring matches.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[Tuple[str, int]],
+        unique: bool = False,
+        multikey: bool = False,
+        name: Optional[str] = None,
+        text: bool = False,
+    ):
+        if not keys:
+            raise ValueError("An index needs at least one key")
+        if multikey and len(keys) != 1:
+            raise ValueError("Multikey (GIN) indexes cover exactly one field")
+        if (multikey or text) and unique:
+            raise ValueError("Multikey (GIN) and text indexes cannot be unique")
+        if multikey and text:
+            raise ValueError("An index cannot be both multikey and text")
+        self.keys = [(field, int(direction)) for field, direction in keys]
+        self.unique = unique
+        self.multikey = multikey
+        self.name = name
+        self.text = text
+
+    @property
+    def scalar_fields(self) -> FrozenSet[str]:
+        if self.multikey or self.text:
+            return frozenset()
+        return frozenset(field for field, _ in self.keys)
+
+    @property
+    def text_fields(self) -> List[str]:
+        return [field for field, _ in self.keys]
+
+    def index_name(self, table: str) -> str:
+        if self.name:
+            return self.name
+        prefix = "uq" if self.unique else "gin" if self.multikey else "txt" if self.text else "ix"
+        name = f"{prefix}_{table}_" + "_".join(field.replace(".", "_") for field, _ in self.keys)
+        if len(name) > 63:
+            name = f"{prefix}_{table[:40]}_{hashlib.md5(name.encode()).hexdigest()[:12]}"
+        return name
+
+    def create_sql(self, table: str) -> str:
+        if self.text:
+            return (
+                f'CREATE INDEX IF NOT EXISTS "{self.index_name(table)}" '
+                f'ON "{table}" USING GIN (({_text_vector_sql(self.text_fields)}))'
+            )
+        if self.multikey:
+            field = self.keys[0][0]
+            return (
+                f'CREATE INDEX IF NOT EXISTS "{self.index_name(table)}" '
+                f'ON "{table}" USING GIN ({_doc_path_sql(field)})'
+            )
+        columns = ", ".join(
+            f"({_sort_expr(field)}){' DESC' if direction < 0 else ''}" for field, direction in self.keys
+        )
+        unique = "UNIQUE " if self.unique else ""
+        return f'CREATE {unique}INDEX IF NOT EXISTS "{self.index_name(table)}" ON "{table}" ({columns})'
+
+    def optional_sql(self, table: str) -> List[str]:
+        """Statements that speed up this index's queries but may fail (missing extension)."""
+        if not self.text:
+            return []
+        name = self.index_name(table).replace("txt_", "trgm_", 1)
+        return [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" '
+            f"USING GIN (({_text_search_sql(self.text_fields)}) gin_trgm_ops)",
+        ]
+
+    def __repr__(self) -> str:
+        options = "".join([
+            ", unique=True" if self.unique else "",
+            ", multikey=True" if self.multikey else "",
+            ", text=True" if self.text else "",
+        ])
+        return f"SupabaseIndex({self.keys!r}{options})"
+
+
+# Every collection gets these; ``id`` is unique and ``(created_at, id)`` drives
+# the feeds and their keyset pagination.
+_BUILTIN_INDEXES = (
+    SupabaseIndex([("id", 1)], unique=True, name="uq_{table}_doc_id"),
+    SupabaseIndex([("created_at", -1), ("id", -1)], name="idx_{table}_created_at_id"),
+)
+_LEGACY_INDEXES = ("uq_{table}_id", "idx_{table}_created_at", "idx_{table}_created_at_sort")
+
+
+def _filter_shapes(query: Optional[Dict[str, Any]]) -> List[Tuple[Tuple[str, str], ...]]:
+    """Field/operator shapes a filter needs indexed; ``$or`` yields one per branch."""
+    base: List[Tuple[str, str]] = []
+    groups: List[List[Tuple[Tuple[str, str], ...]]] = []
+    for key, expected in (query or {}).items():
+        if key == "$or":
+            groups.append([shape for branch in expected for shape in _filter_shapes(branch)])
+            continue
+        if key == "$and":
+            groups.extend(_filter_shapes(sub_query) for sub_query in expected)
+            continue
+        if key.startswith("$"):
+            continue
+        if _is_operator_dict(expected):
+            ops = [op for op in expected if op != "$options"]
+            base.append((key, ops[0][1:] if len(ops) == 1 else "multi"))
+        else:
+            base.append((key, "eq"))
+
+    shapes: List[Tuple[Tuple[str, str], ...]] = [tuple(base)]
+    for group in groups:
+        if group:
+            shapes = [shape + alternative for shape in shapes for alternative in group]
+    return [tuple(sorted(shape)) for shape in shapes]
+
+
+class SupabaseIndexAdvisor:
+    """
+    Records the filter and sort shapes each collection is queried with.
+
+    Shapes are counted in memory and persisted to ``_index_advisor`` by
+    ``flush``; ``index_report.py`` compares them with the indexes that exist.
+    """
+
+    TABLE = "_index_advisor"
+
+    def __init__(self) -> None:
+        self._counts: Counter = Counter()
+
+    def record(
+        self,
+        collection: str,
+        query: Optional[Dict[str, Any]],
+        sorts: Optional[List[Tuple[str, int]]] = None,
+    ) -> None:
+        sort_shape = tuple(
+            (field, 1 if direction >= 0 else -1) for field, direction in sorts or [] if not _is_text_score(direction)
+        )
+        for filter_shape in _filter_shapes(query):
+            if filter_shape or sort_shape:
+                self._counts[(collection, filter_shape, sort_shape)] += 1
+
+    def snapshot(self) -> List[Tuple[str, Tuple[Tuple[str, str], ...], Tuple[Tuple[str, int], ...], int]]:
+        return [(c, f, srt, n) for (c, f, srt), n in self._counts.most_common()]
+
+    async def flush(self, conn: asyncpg.Connection) -> None:
+        if not self._counts:
+            return
+        await conn.execute(
+            f'''
+            CREATE TABLE IF NOT EXISTS "{self.TABLE}" (
+                collection TEXT NOT NULL,
+                filter_shape JSONB NOT NULL,
+                sort_shape JSONB NOT NULL,
+                hits BIGINT NOT NULL DEFAULT 0,
+                last_seen TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (collection, filter_shape, sort_shape)
+            )
+            '''
+        )
+        counts, self._counts = self._counts, Counter()
+        await conn.executemany(
+            f'''
+            INSERT INTO "{self.TABLE}" (collection, filter_shape, sort_shape, hits)
+            VALUES ($1, $2::jsonb, $3::jsonb, $4)
+            ON CONFLICT (collection, filter_shape, sort_shape)
+            DO UPDATE SET hits = "{self.TABLE}".hits + EXCLUDED.hits, last_seen = now()
+            ''',
+            [
+                (collection, list(filter_shape), list(sort_shape), hits)
+                for (collection, filter_shape, sort_shape), hits in counts.items()
+            ],
+        )
+
+
+class SupabaseDuplicateKeyError(Exception):
+    """A write violated a unique index; the adapter's ``pymongo.errors.DuplicateKeyError``."""
+
+
+class SupabaseUpdateResult:
+    """Result of ``update_one``/``update_many``, shaped like pymongo's ``UpdateResult``."""
+
+    acknowledged = True
+
+    def __init__(self, matched_count: int, modified_count: int, upserted_id: Optional[int] = None):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.upserted_id = upserted_id
+
+    def __repr__(self) -> str:
+        return (
+            f"SupabaseUpdateResult(matched_count={self.matched_count}, "
+            f"modified_count={self.modified_count}, upserted_id={self.upserted_id})"
+        )
+
+
+class SupabaseDeleteResult:
+    """Result of ``delete_one``/``delete_many``, shaped like pymongo's ``DeleteResult``."""
+
+    acknowledged = True
+
+    def __init__(self, deleted_count: int):
+        self.deleted_count = deleted_count
+
+    def __repr__(self) -> str:
+        return f"SupabaseDeleteResult(deleted_count={self.deleted_count})"
+
+
+class SupabaseInsertManyResult:
+    """Result of ``insert_many``, shaped like pymongo's ``InsertManyResult``."""
+
+    acknowledged = True
+
+    def __init__(self, inserted_ids: List[int]):
+        self.inserted_ids = inserted_ids
+
+    def __repr__(self) -> str:
+        return f"SupabaseInsertManyResult(inserted_ids={self.inserted_ids})"
+
+
+class SupabaseBulkWriteResult:
+    """
+    Result of ``bulk_write``, shaped like pymongo's ``BulkWriteResult``.
+
+    ``results`` holds one entry per operation: the new pk for an insert, a
+    ``SupabaseUpdateResult`` for an update and a ``SupabaseDeleteResult``
+    for a delete.
+    """
+
+    acknowledged = True
+
+    def __init__(self, operations: List[Any], results: List[Any]):
+        self.results = results
+        self.inserted_count = 0
+        self.matched_count = 0
+        self.modified_count = 0
+        self.deleted_count = 0
+        self.upserted_ids: Dict[int, int] = {}
+        for i, (op, result) in enumerate(zip(operations, results)):
+            if isinstance(result, SupabaseUpdateResult):
+                self.matched_count += result.matched_count
+                self.modified_count += result.modified_count
+                if result.upserted_id is not None:
+                    self.upserted_ids[i] = result.upserted_id
+            elif isinstance(result, SupabaseDeleteResult):
+                self.deleted_count += result.deleted_count
+            else:
+                self.inserted_count += 1
+
+    @property
+    def upserted_count(self) -> int:
+        return len(self.upserted_ids)
+
+    def __repr__(self) -> str:
+        return (
+            f"SupabaseBulkWriteResult(inserted_count={self.inserted_count}, "
+            f"matched_count={self.matched_count}, modified_count={self.modified_count}, "
+            f"deleted_count={self.deleted_count}, upserted_ids={self.upserted_ids})"
+        )
+
+
+class InsertOne:
+    """``bulk_write`` operation; mirrors ``pymongo.InsertOne``."""
+
+    def __init__(self, document: Dict[str, Any]):
+        self._doc = document
+
+
+class UpdateOne:
+    """``bulk_write`` operation; mirrors ``pymongo.UpdateOne``."""
+
+    def __init__(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False):
+        self._filter = filter
+        self._doc = update
+        self._upsert = upsert
+
+
+class UpdateMany(UpdateOne):
+    """``bulk_write`` operation; mirrors ``pymongo.UpdateMany``."""
+
+
+class DeleteOne:
+    """``bulk_write`` operation; mirrors ``pymongo.DeleteOne``."""
+
+    def __init__(self, filter: Dict[str, Any]):
+        self._filter = filter
+
+
+class DeleteMany(DeleteOne):
+    """``bulk_write`` operation; mirrors ``pymongo.DeleteMany``."""
+
+
+def _bulk_op_types(local: type, name: str) -> Tuple[type, ...]:
+    """``local`` and, when pymongo is installed, pymongo's class of the same name."""
+    return (local,) if pymongo is None else (local, getattr(pymongo, name))
+
+
+# Checked in this order: the module's UpdateMany and DeleteMany subclass the
+# single-document operations.
+_BULK_OPS: List[Tuple[Tuple[type, ...], str, Optional[int]]] = [
+    (_bulk_op_types(InsertOne, "InsertOne"), "insert", None),
+    (_bulk_op_types(UpdateMany, "UpdateMany"), "update", None),
+    (_bulk_op_types(UpdateOne, "UpdateOne"), "update", 1),
+    (_bulk_op_types(DeleteMany, "DeleteMany"), "delete", None),
+    (_bulk_op_types(DeleteOne, "DeleteOne"), "delete", 1),
+]
+
+
+def _bulk_op_kind(op: Any) -> Tuple[str, Optional[int]]:
+    """``(kind, limit)`` of a ``bulk_write`` operation."""
+    for types, kind, limit in _BULK_OPS:
+        if isinstance(op, types):
+            return kind, limit
+    raise NotImplementedError(f"Unsupported bulk_write operation: {type(op).__name__}")
+
+
+_PLACEHOLDER_RE = re.compile(r"\$(\d+)")
+_CAST_PLACEHOLDER_RE = re.compile(r"\$(\d+)::([a-z]+(?:\[\])?)")
+# Postgres accepts at most 32767 parameters per statement.
+_MAX_STATEMENT_PARAMS = 30000
+
+
+def _filter_paths(query: Optional[Dict[str, Any]]) -> Optional[List[str]]:
+    """Field paths a filter reads, or None when it reads fields it does not name."""
+    paths: List[str] = []
+    for key, expected in (query or {}).items():
+        if key in ("$and", "$or"):
+            for sub_query in expected:
+                sub_paths = _filter_paths(sub_query)
+                if sub_paths is None:
+                    return None
+                paths.extend(sub_paths)
+        elif key.startswith("$"):
+            return None
+        else:
+            paths.append(key)
+    return paths
+
+
+def _paths_overlap(a: str, b: str) -> bool:
+    return a == b or a.startswith(b + ".") or b.startswith(a + ".")
+
+
+def _is_plain_equality(query: Optional[Dict[str, Any]]) -> bool:
+    return all(not key.startswith("$") and not _is_operator_dict(value) for key, value in (query or {}).items())
+
+
 class SupabaseAggregateCursor:
     def __init__(self, collection: "SupabaseCollection", pipeline: List[Dict[str, Any]]):
         self._collection = collection
         self._pipeline = pipeline
 
-    async def to_list(self, limit: int) -> List[Dict[str, Any]]:
-        docs = await self._collection._aggregate_docs(self._pipeline)
-        return docs[:limit]
+    async def to_list(self, limit: Optional[int]) -> List[Dict[str, Any]]:
+        return await self._collection._aggregate_docs(self._pipeline, limit)
+
+
+class _SelectPlan:
+    """A compiled SELECT plus what is needed to finish each row in Python."""
+
+    def __init__(
+        self,
+        sql: str,
+        params: List[Any],
+        query: Optional[Dict[str, Any]],
+        exact: bool,
+        projection: Optional[Dict[str, int]],
+    ):
+        self.sql = sql
+        self.params = params
+        self._matches = None if exact else _query_matcher(query)
+        self._projection = projection
+
+    def decode(self, row: asyncpg.Record) -> Optional[Tuple[int, Dict[str, Any]]]:
+        doc = row["doc"]
+        if self._matches is not None and not self._matches(doc):
+            return None
+        if self._projection:
+            doc = _apply_projection(doc, self._projection)
+        return row["pk"], doc
 
 
 class SupabaseCursor:
@@ -206,24 +1559,49 @@ class SupabaseCursor:
         self._projection = projection
         self._limit: Optional[int] = None
         self._sorts: List[Tuple[str, int]] = []
+        self._batch_size = DEFAULT_BATCH_SIZE
+
+    def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[Dict[str, Any]]:
+        rows = self._collection._iter_rows(
+            self._query,
+            limit=self._limit,
+            sorts=self._sorts,
+            projection=self._projection,
+            batch_size=self._batch_size,
+        )
+        async for _, doc in rows:
+            yield doc
+
+    def batch_size(self, n: int) -> "SupabaseCursor":
+        if n < 1:
+            raise ValueError("batch_size must be positive")
+        self._batch_size = n
+        return self
 
-    def sort(self, field: str, direction: int) -> "SupabaseCursor":
-        self._sorts.append((field, direction))
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> "SupabaseCursor":
+        # Accepts Motor's ``sort(field, direction)`` and ``sort([(field, direction), ...])``.
+        if isinstance(key_or_list, str):
+            self._sorts.append((key_or_list, 1 if direction is None else direction))
+        else:
+            self._sorts.extend((field, dir_) for field, dir_ in key_or_list)
         return self
 
     def limit(self, n: int) -> "SupabaseCursor":
         self._limit = n
         return self
 
-    async def to_list(self, limit: int) -> List[Dict[str, Any]]:
-        docs = await self._collection._find_docs(self._query)
-
-        for field, direction in reversed(self._sorts):
-            docs.sort(key=lambda d: _sort_key(_get_field(d, field)), reverse=direction < 0)
-
+    async def to_list(self, limit: Optional[int]) -> List[Dict[str, Any]]:
         final_limit = self._limit if self._limit is not None else limit
-        docs = docs[:final_limit]
-        return [_apply_projection(doc, self._projection) for doc in docs]
+        rows = await self._collection._matching_rows(
+            self._query,
+            limit=final_limit,
+            sorts=self._sorts,
+            projection=self._projection,
+        )
+        return [doc for _, doc in rows]
 
 
 class SupabaseCollection:
@@ -231,41 +1609,389 @@ class SupabaseCollection:
         self._db = database
         self._name = name
 
-    async def _all_rows(self) -> List[Tuple[int, Dict[str, Any]]]:
-        await self._db._ensure_table(self._name)
+    def _record(self, query: Optional[Dict[str, Any]], sorts: Optional[List[Tuple[str, int]]] = None) -> None:
+        if self._db.index_advisor is not None:
+            self._db.index_advisor.record(self._name, query, sorts)
+
+    def _compile_where(
+        self,
+        query: Optional[Dict[str, Any]],
+        params: _SqlParams,
+        sorts: Optional[List[Tuple[str, int]]] = None,
+        record: bool = True,
+    ) -> Tuple[str, bool]:
+        # ``record=False`` when the caller already compiled (and recorded) this
+        # query, or records it itself, so the index advisor counts each
+        # operation once.
+        if record:
+            self._record(query, sorts)
+        return _compile_filter(query, params, self._db._scalar_fields(self._name), self._db._text_search(self._name))
+
+    def _plan_select(
+        self,
+        query: Optional[Dict[str, Any]],
+        limit: Optional[int] = None,
+        sorts: Optional[List[Tuple[str, int]]] = None,
+        projection: Optional[Dict[str, int]] = None,
+        for_update: bool = False,
+        record: bool = True,
+    ) -> "_SelectPlan":
+        """
+        Build the SELECT for ``query``.
+
+        Ordering is always done by Postgres. Limit and projection are pushed
+        down too when the filter compiles exactly; otherwise rows are
+        re-checked in Python first and projected afterwards.
+        """
         table = self._db._safe_table(self._name)
+        params = _SqlParams()
+        where, exact = self._compile_where(query, params, sorts, record)
+        doc_sql = _compile_projection(projection, params) if exact else None
+        sql = f'SELECT pk, {doc_sql or "doc"} AS doc FROM "{table}" WHERE {where}'
+        if sorts:
+            text_rank = None
+            if any(_is_text_score(direction) for _, direction in sorts):
+                text_rank = _compile_text_rank((query or {}).get("$text"), self._db._text_search(self._name), params)
+            sql += f" ORDER BY {_compile_sort(sorts, text_rank)}"
+        if exact and limit is not None:
+            sql += f" LIMIT {params.add(int(limit))}"
+        if for_update:
+            sql += " FOR UPDATE"
+        return _SelectPlan(sql, params.values, query, exact, projection if doc_sql is None else None)
+
+    async def _matching_rows(
+        self,
+        query: Optional[Dict[str, Any]],
+        limit: Optional[int] = None,
+        sorts: Optional[List[Tuple[str, int]]] = None,
+        projection: Optional[Dict[str, int]] = None,
+        conn: Optional[asyncpg.Connection] = None,
+        for_update: bool = False,
+        record: bool = True,
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """Return ``(pk, doc)`` pairs matching ``query``."""
+        await self._db._ensure_table(self._name)
+        plan = self._plan_select(query, limit, sorts, projection, for_update, record)
 
-        async with self._db.pool.acquire() as conn:
-            rows = await conn.fetch(f'SELECT pk, doc FROM "{table}"')
+        async with self._db._acquire(conn) as active:
+            rows = await active.fetch(plan.sql, *plan.params)
 
         result: List[Tuple[int, Dict[str, Any]]] = []
         for row in rows:
-            doc = row["doc"]
-            if isinstance(doc, str):
-                doc = json.loads(doc)
-            result.append((row["pk"], doc))
+            if limit is not None and len(result) >= limit:
+                break
+            decoded = plan.decode(row)
+            if decoded is not None:
+                result.append(decoded)
         return result
 
+    async def _iter_rows(
+        self,
+        query: Optional[Dict[str, Any]],
+        limit: Optional[int] = None,
+        sorts: Optional[List[Tuple[str, int]]] = None,
+        projection: Optional[Dict[str, int]] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Stream matching rows through a server-side cursor.
+
+        Rows are fetched ``batch_size`` at a time and decoded, filtered and
+        projected per batch, so memory stays flat however many rows match.
+        The connection is held until the iteration finishes or is closed.
+        """
+        await self._db._ensure_table(self._name)
+        plan = self._plan_select(query, limit, sorts, projection)
+        produced = 0
+
+        async with self._db.pool.acquire() as conn:
+            async with conn.transaction():
+                cursor = await conn.cursor(plan.sql, *plan.params)
+                while limit is None or produced < limit:
+                    rows = await cursor.fetch(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        decoded = plan.decode(row)
+                        if decoded is None:
+                            continue
+                        yield decoded
+                        produced += 1
+                        if limit is not None and produced >= limit:
+                            break
+
     async def _find_docs(self, query: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        rows = await self._all_rows()
-        return [doc for _, doc in rows if _matches_query(doc, query)]
+        rows = await self._matching_rows(query)
+        return [doc for _, doc in rows]
 
-    async def _matching_rows(self, query: Optional[Dict[str, Any]]) -> List[Tuple[int, Dict[str, Any]]]:
-        rows = await self._all_rows()
-        return [(pk, doc) for pk, doc in rows if _matches_query(doc, query)]
+    async def _write_rows(self, conn: asyncpg.Connection, rows: List[Tuple[int, Dict[str, Any]]]) -> None:
+        table = self._db._safe_table(self._name)
+        for i in range(0, len(rows), _WRITE_BATCH_SIZE):
+            batch = rows[i:i + _WRITE_BATCH_SIZE]
+            await conn.execute(
+                f'UPDATE "{table}" AS t SET doc = v.new_doc '
+                "FROM unnest($1::bigint[], $2::jsonb[]) AS v(pk, new_doc) WHERE t.pk = v.pk",
+                [pk for pk, _ in batch],
+                [doc for _, doc in batch],
+            )
 
-    async def _update_row(self, pk: int, doc: Dict[str, Any]) -> None:
+    async def _update_matching(
+        self,
+        query: Dict[str, Any],
+        update: Dict[str, Any],
+        limit: Optional[int],
+        conn: Optional[asyncpg.Connection] = None,
+    ) -> Tuple[int, int]:
+        """Apply ``update`` to matching rows and return ``(matched, modified)``."""
+        await self._db._ensure_table(self._name)
         table = self._db._safe_table(self._name)
-        payload = json.dumps(doc)
-        async with self._db.pool.acquire() as conn:
-            await conn.execute(f'UPDATE "{table}" SET doc = $1::jsonb WHERE pk = $2', payload, pk)
 
-    async def _aggregate_docs(self, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        docs = await self._find_docs({})
+        params = _SqlParams()
+        where, exact = self._compile_where(query, params)
+        doc_sql = _compile_update(update, params) if exact else None
+
+        if doc_sql is not None:
+            limit_sql = f" LIMIT {params.add(int(limit))}" if limit is not None else ""
+            sql = (
+                f'WITH matched AS (SELECT pk, doc AS old_doc, {doc_sql} AS new_doc FROM "{table}" '
+                f"WHERE {where}{limit_sql} FOR UPDATE), "
+                f'modified AS (UPDATE "{table}" AS t SET doc = m.new_doc FROM matched AS m '
+                "WHERE t.pk = m.pk AND m.new_doc IS DISTINCT FROM m.old_doc RETURNING 1) "
+                "SELECT (SELECT count(*) FROM matched) AS matched, (SELECT count(*) FROM modified) AS modified"
+            )
+            async with self._db._acquire(conn) as active:
+                row = await active.fetchrow(sql, *params.values)
+            return row["matched"], row["modified"]
+
+        # Read-modify-write, with the rows locked so concurrent writers wait.
+        async with self._db._acquire(conn) as active:
+            async with active.transaction():
+                rows = await self._matching_rows(query, limit=limit, conn=active, for_update=True, record=False)
+                changed: List[Tuple[int, Dict[str, Any]]] = []
+                for pk, doc in rows:
+                    next_doc = _apply_update(doc, update)
+                    if next_doc != doc:
+                        changed.append((pk, next_doc))
+                await self._write_rows(active, changed)
+        return len(rows), len(changed)
+
+    async def _update(
+        self,
+        query: Dict[str, Any],
+        update: Dict[str, Any],
+        upsert: bool,
+        limit: Optional[int],
+        conn: Optional[asyncpg.Connection] = None,
+    ) -> "SupabaseUpdateResult":
+        matched, modified = await self._update_matching(query, update, limit, conn)
+        if matched or not upsert:
+            return SupabaseUpdateResult(matched, modified)
+
+        base = _extract_upsert_base(query)
+        new_doc = _apply_update(base, update)
+        pk = await self._insert(new_doc, conn)
+        return SupabaseUpdateResult(0, 0, upserted_id=pk)
+
+    def _plan_grouped_update(self, op: Any, limit: Optional[int]) -> Optional[Tuple[Any, List[Any]]]:
+        """
+        ``(shape, values)`` for an update ``bulk_write`` can run together with
+        others of the same shape, or None when it must run alone.
+
+        Updates share a shape when their filter and update compile to the same
+        SQL with different parameters. Grouping runs them against the rows as
+        they were before the group, so the update must not touch a field its
+        filter reads, and an upsert needs a plain equality filter so that a
+        document it inserts cannot match another update of the group.
+        """
+        filter_paths = _filter_paths(op._filter)
+        if filter_paths is None or (op._upsert and not _is_plain_equality(op._filter)):
+            return None
+        update_paths = [field for payload in (op._doc or {}).values() if isinstance(payload, dict) for field in payload]
+        if any(_paths_overlap(a, b) for a in filter_paths for b in update_paths):
+            return None
+        params = _SqlParams()
+        # Recorded by _update if this runs alone, or by bulk_write once the
+        # group statement has run.
+        where, exact = self._compile_where(op._filter, params, record=False)
+        doc_sql = _compile_update(op._doc, params) if exact else None
+        if doc_sql is None:
+            return None
+        # Every parameter is moved into a VALUES list, which needs its type.
+        casts = dict(_CAST_PLACEHOLDER_RE.findall(where + " " + doc_sql))
+        if len(_PLACEHOLDER_RE.findall(where + " " + doc_sql)) != len(casts) or len(casts) != len(params.values):
+            return None
+        return (limit, where, doc_sql, tuple(casts[str(n)] for n in range(1, len(params.values) + 1))), params.values
+
+    async def _update_group(
+        self, shape: Any, members: List[Tuple[Any, List[Any]]], conn: asyncpg.Connection
+    ) -> Optional[List[Tuple[int, int]]]:
+        """
+        Apply same-shape updates in one ``UPDATE ... FROM (VALUES ...)``
+        statement and return ``(matched, modified)`` per update. Returns None,
+        without changing anything, when two updates matched the same row; the
+        caller then runs them one by one.
+        """
+        limit, where, doc_sql, casts = shape
+        table = self._db._safe_table(self._name)
+        columns = [f"p{n}" for n in range(1, len(casts) + 1)]
+
+        def to_column(match: re.Match) -> str:
+            return f"v.p{match.group(1)}"
+
+        rows: List[str] = []
+        values: List[Any] = []
+        for ord_, (_, member_values) in enumerate(members):
+            placeholders = [f"{ord_}"]
+            for cast, value in zip(casts, member_values):
+                values.append(value)
+                placeholders.append(f"${len(values)}::{cast}")
+            rows.append(f"({', '.join(placeholders)})")
+
+        limit_sql = " LIMIT 1" if limit is not None else ""
+        sql = (
+            f"WITH v({', '.join(['ord'] + columns)}) AS (VALUES {', '.join(rows)}), "
+            f"matched AS (SELECT v.ord, m.pk, m.doc AS old_doc, {_PLACEHOLDER_RE.sub(to_column, doc_sql)} AS new_doc "
+            f'FROM v CROSS JOIN LATERAL (SELECT pk, doc FROM "{table}" '
+            f"WHERE {_PLACEHOLDER_RE.sub(to_column, where)}{limit_sql} FOR UPDATE) AS m), "
+            "disjoint AS (SELECT count(DISTINCT pk) = count(*) AS ok FROM matched), "
+            f'modified AS (UPDATE "{table}" AS t SET doc = m.new_doc FROM matched AS m, disjoint AS d '
+            "WHERE d.ok AND t.pk = m.pk AND m.new_doc IS DISTINCT FROM m.old_doc RETURNING m.ord) "
+            "SELECT (SELECT ok FROM disjoint) AS disjoint, "
+            "(SELECT array_agg(ord) FROM matched) AS matched, (SELECT array_agg(ord) FROM modified) AS modified"
+        )
+        row = await conn.fetchrow(sql, *values)
+        if not row["disjoint"]:
+            return None
+        matched, modified = Counter(row["matched"] or []), Counter(row["modified"] or [])
+        return [(matched[ord_], modified[ord_]) for ord_ in range(len(members))]
+
+    async def _delete_matching(
+        self, query: Dict[str, Any], limit: Optional[int], conn: Optional[asyncpg.Connection] = None
+    ) -> "SupabaseDeleteResult":
+        await self._db._ensure_table(self._name)
+        table = self._db._safe_table(self._name)
+
+        params = _SqlParams()
+        where, exact = self._compile_where(query, params)
+        if exact:
+            if limit is not None:
+                where = f'pk IN (SELECT pk FROM "{table}" WHERE {where} LIMIT {params.add(int(limit))} FOR UPDATE)'
+            async with self._db._acquire(conn) as active:
+                status = await active.execute(f'DELETE FROM "{table}" WHERE {where}', *params.values)
+            return SupabaseDeleteResult(int(status.split()[-1]))
+
+        async with self._db._acquire(conn) as active:
+            async with active.transaction():
+                rows = await self._matching_rows(query, limit=limit, conn=active, for_update=True, record=False)
+                pks = [pk for pk, _ in rows]
+                for i in range(0, len(pks), _WRITE_BATCH_SIZE):
+                    await active.execute(
+                        f'DELETE FROM "{table}" WHERE pk = ANY($1::bigint[])',
+                        pks[i:i + _WRITE_BATCH_SIZE],
+                    )
+        return SupabaseDeleteResult(len(pks))
+
+    def _compile_aggregate(
+        self, pipeline: List[Dict[str, Any]], limit: Optional[int]
+    ) -> Optional[Tuple[str, List[Any], List[str]]]:
+        """
+        Compile ``$match`` -> ``$sort`` -> ``$group`` pipelines into one statement.
+
+        ``$group`` with ``$first`` accumulators becomes ``DISTINCT ON`` over the
+        computed key, keeping the first row of each group in sort order.
+        Returns None for pipeline shapes that have to run in Python.
+        """
+        table = self._db._safe_table(self._name)
+        params = _SqlParams()
+        matches: List[str] = []
+        sort_spec: Optional[Dict[str, int]] = None
+        group_spec: Optional[Dict[str, Any]] = None
 
         for stage in pipeline:
             if "$match" in stage:
-                docs = [doc for doc in docs if _matches_query(doc, stage["$match"])]
+                if sort_spec is not None or group_spec is not None:
+                    return None
+                # Recorded by _aggregate_docs once the pipeline is known to compile.
+                where, exact = self._compile_where(stage["$match"], params, record=False)
+                if not exact:
+                    return None
+                matches.append(f"({where})")
+            elif "$sort" in stage:
+                if sort_spec is not None or group_spec is not None:
+                    return None
+                sort_spec = stage["$sort"]
+            elif group_spec is None:
+                group_spec = stage["$group"]
+            else:
+                return None
+
+        where = " AND ".join(matches) or "TRUE"
+        sorts = list((sort_spec or {}).items())
+        limit_sql = f" LIMIT {params.add(int(limit))}" if limit is not None else ""
+
+        if group_spec is None:
+            sql = f'SELECT doc FROM "{table}" WHERE {where} ORDER BY {_compile_sort(sorts)}{limit_sql}'
+            return sql, params.values, []
+
+        key_sql = _compile_expr(group_spec["_id"], params)
+        if key_sql is None:
+            return None
+        out_fields: List[str] = []
+        columns = [f"{key_sql} AS g_key", "pk"]
+        for out_field, accumulator in group_spec.items():
+            if out_field == "_id":
+                continue
+            value_sql = _compile_expr(accumulator["$first"], params)
+            if value_sql is None:
+                return None
+            columns.append(f"{value_sql} AS a_{len(out_fields)}")
+            out_fields.append(out_field)
+
+        # Groups come out in the order their first document was seen.
+        outer_sorts: List[Tuple[str, int]] = []
+        for i, (field, direction) in enumerate(sorts):
+            columns.append(f"{_sort_expr(field)} AS s_{i}")
+            outer_sorts.append((f"s_{i}", direction))
+        outer_order = ", ".join(
+            f"g.{name} DESC NULLS FIRST" if direction < 0 else f"g.{name} ASC NULLS LAST"
+            for name, direction in outer_sorts
+        )
+        outer_order = f"{outer_order}, g.pk" if outer_order else "g.pk"
+        accumulators = "".join(f", g.a_{i}" for i in range(len(out_fields)))
+
+        sql = (
+            f"SELECT g.g_key{accumulators} FROM ("
+            f"SELECT DISTINCT ON ({key_sql}) {', '.join(columns)} "
+            f'FROM "{table}" WHERE {where} '
+            f"ORDER BY {key_sql}, {_compile_sort(sorts)}"
+            f") AS g ORDER BY {outer_order}{limit_sql}"
+        )
+        return sql, params.values, out_fields
+
+    async def _aggregate_docs(self, pipeline: List[Dict[str, Any]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        _validate_pipeline(pipeline)
+        await self._db._ensure_table(self._name)
+
+        compiled = self._compile_aggregate(pipeline, limit)
+        if compiled is not None:
+            for stage in pipeline:
+                if "$match" in stage:
+                    self._record(stage["$match"])
+            sql, values, out_fields = compiled
+            async with self._db.pool.acquire() as conn:
+                rows = await conn.fetch(sql, *values)
+            return [self._aggregate_row(row, out_fields) for row in rows]
+
+        stages = list(pipeline)
+        if stages and "$match" in stages[0]:
+            docs = await self._find_docs(stages.pop(0)["$match"])
+        else:
+            docs = await self._find_docs({})
+
+        for stage in stages:
+            if "$match" in stage:
+                matches = _query_matcher(stage["$match"])
+                docs = [doc for doc in docs if matches(doc)]
                 continue
 
             if "$sort" in stage:
@@ -289,73 +2015,326 @@ class SupabaseCollection:
                     for out_field, accumulator in group_spec.items():
                         if out_field == "_id":
                             continue
-                        if isinstance(accumulator, dict) and "$first" in accumulator:
-                            entry[out_field] = _eval_expr(accumulator["$first"], doc)
+                        entry[out_field] = _eval_expr(accumulator["$first"], doc)
                     grouped[key_hash] = entry
 
                 docs = list(grouped.values())
                 continue
 
-            raise NotImplementedError(f"Unsupported aggregation stage: {list(stage.keys())}")
+        return docs[:limit] if limit is not None else docs
+
+    @staticmethod
+    def _aggregate_row(row: asyncpg.Record, out_fields: List[str]) -> Dict[str, Any]:
+        values = list(row.values())
+        if not out_fields:
+            return values[0]
+        entry: Dict[str, Any] = {"_id": values[0]}
+        for out_field, value in zip(out_fields, values[1:]):
+            entry[out_field] = value
+        return entry
+
+    async def _insert(self, doc: Dict[str, Any], conn: Optional[asyncpg.Connection] = None) -> int:
+        await self._db._ensure_table(self._name)
+        table = self._db._safe_table(self._name)
+        async with self._db._acquire(conn) as active:
+            try:
+                return await active.fetchval(f'INSERT INTO "{table}" (doc) VALUES ($1::jsonb) RETURNING pk', doc)
+            except asyncpg.UniqueViolationError as exc:
+                raise SupabaseDuplicateKeyError(str(exc)) from exc
+
+    async def _insert_docs(self, docs: List[Dict[str, Any]], conn: asyncpg.Connection) -> List[int]:
+        """
+        Insert ``docs`` in one round trip per batch and return their pks.
 
-        return docs
+        Keys are drawn from the table's sequence up front so that both the
+        COPY path (large batches) and the executemany path (small ones) can
+        report which row each document became.
+        """
+        if not docs:
+            return []
+        table = self._db._safe_table(self._name)
+        pks = await conn.fetchval(
+            "SELECT array_agg(nextval(pg_get_serial_sequence($1, 'pk'))) FROM generate_series(1, $2)",
+            f'"{table}"',
+            len(docs),
+        )
+        records = list(zip(pks, docs))
+        try:
+            if len(records) >= _COPY_THRESHOLD:
+                await conn.copy_records_to_table(table, records=records, columns=["pk", "doc"])
+            else:
+                await conn.executemany(f'INSERT INTO "{table}" (pk, doc) VALUES ($1, $2::jsonb)', records)
+        except asyncpg.UniqueViolationError as exc:
+            raise SupabaseDuplicateKeyError(str(exc)) from exc
+        return list(pks)
 
     async def insert_one(self, doc: Dict[str, Any]) -> None:
+        await self._insert(doc)
+
+    async def insert_many(self, docs: Sequence[Dict[str, Any]]) -> "SupabaseInsertManyResult":
+        docs = list(docs)
+        if not docs:
+            raise ValueError("insert_many requires at least one document")
         await self._db._ensure_table(self._name)
-        table = self._db._safe_table(self._name)
-        payload = json.dumps(doc)
         async with self._db.pool.acquire() as conn:
-            await conn.execute(f'INSERT INTO "{table}" (doc) VALUES ($1::jsonb)', payload)
+            async with conn.transaction():
+                pks = await self._insert_docs(docs, conn)
+        return SupabaseInsertManyResult(pks)
+
+    async def bulk_write(self, operations: Sequence[Any]) -> "SupabaseBulkWriteResult":
+        """
+        Run inserts, updates and deletes in a single transaction.
+
+        Operations are ``InsertOne``/``UpdateOne``/``UpdateMany``/``DeleteOne``/
+        ``DeleteMany`` from this module or from pymongo, applied in order.
+        Consecutive inserts are sent as one batch, and consecutive updates of
+        the same shape (see ``_plan_grouped_update``) as one statement per
+        batch. Any failure rolls back the whole batch.
+        """
+        operations = list(operations)
+        if not operations:
+            raise ValueError("bulk_write requires at least one operation")
+        kinds = [_bulk_op_kind(op) for op in operations]
+        await self._db._ensure_table(self._name)
+
+        results: List[Any] = [None] * len(operations)
+        pending: List[int] = []
+        group: List[Tuple[int, List[Any]]] = []
+        group_shape: Any = None
+        group_filters: set = set()
+
+        async def flush_inserts(conn: asyncpg.Connection) -> None:
+            pks = await self._insert_docs([operations[i]._doc for i in pending], conn)
+            for i, pk in zip(pending, pks):
+                results[i] = pk
+            pending.clear()
+
+        async def run_update(i: int, conn: asyncpg.Connection) -> None:
+            op = operations[i]
+            results[i] = await self._update(op._filter, op._doc, bool(op._upsert), kinds[i][1], conn)
+
+        async def flush_updates(conn: asyncpg.Connection) -> None:
+            nonlocal group_shape
+            if not group:
+                return
+            per_statement = min(_WRITE_BATCH_SIZE, _MAX_STATEMENT_PARAMS // (len(group_shape[3]) + 1))
+            for start in range(0, len(group), per_statement):
+                batch = group[start:start + per_statement]
+                counts = None
+                if len(batch) > 1:
+                    counts = await self._update_group(group_shape, [(operations[i], values) for i, values in batch], conn)
+                if counts is None:
+                    for i, _ in batch:
+                        await run_update(i, conn)
+                    continue
+                for i, _ in batch:
+                    self._record(operations[i]._filter)
+                upserts: List[Tuple[int, Dict[str, Any]]] = []
+                for (i, _), (matched, modified) in zip(batch, counts):
+                    op = operations[i]
+                    if matched or not op._upsert:
+                        results[i] = SupabaseUpdateResult(matched, modified)
+                    else:
+                        upserts.append((i, _apply_update(_extract_upsert_base(op._filter), op._doc)))
+                pks = await self._insert_docs([doc for _, doc in upserts], conn)
+                for (i, _), pk in zip(upserts, pks):
+                    results[i] = SupabaseUpdateResult(0, 0, upserted_id=pk)
+            group.clear()
+            group_filters.clear()
+            group_shape = None
+
+        async with self._db.pool.acquire() as conn:
+            async with conn.transaction():
+                for i, op in enumerate(operations):
+                    kind, limit = kinds[i]
+                    if kind == "insert":
+                        await flush_updates(conn)
+                        pending.append(i)
+                        continue
+                    await flush_inserts(conn)
+                    if kind == "delete":
+                        await flush_updates(conn)
+                        results[i] = await self._delete_matching(op._filter, limit, conn)
+                        continue
+                    plan = self._plan_grouped_update(op, limit)
+                    if plan is None:
+                        await flush_updates(conn)
+                        await run_update(i, conn)
+                        continue
+                    shape, values = plan
+                    # A repeated filter must see the earlier update's effect.
+                    filter_key = json.dumps(op._filter, sort_keys=True, default=str)
+                    if shape != group_shape or filter_key in group_filters:
+                        await flush_updates(conn)
+                        group_shape = shape
+                    group.append((i, values))
+                    group_filters.add(filter_key)
+                await flush_inserts(conn)
+                await flush_updates(conn)
+
+        return SupabaseBulkWriteResult(operations, results)
 
     async def find_one(self, query: Dict[str, Any], projection: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
-        rows = await self._matching_rows(query)
+        rows = await self._matching_rows(query, limit=1, projection=projection)
         if not rows:
             return None
         _, doc = rows[0]
-        return _apply_projection(doc, projection)
+        return doc
 
     def find(self, query: Dict[str, Any], projection: Optional[Dict[str, int]] = None) -> SupabaseCursor:
         return SupabaseCursor(self, query, projection)
 
-    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> None:
-        rows = await self._matching_rows(query)
-        if rows:
-            pk, doc = rows[0]
-            await self._update_row(pk, _apply_update(doc, update))
-            return
+    async def update_one(
+        self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False
+    ) -> "SupabaseUpdateResult":
+        return await self._update(query, update, upsert, limit=1)
 
-        if upsert:
-            base = _extract_upsert_base(query)
-            new_doc = _apply_update(base, update)
-            await self.insert_one(new_doc)
+    async def update_many(
+        self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False
+    ) -> "SupabaseUpdateResult":
+        return await self._update(query, update, upsert, limit=None)
 
-    async def update_many(self, query: Dict[str, Any], update: Dict[str, Any]) -> None:
-        rows = await self._matching_rows(query)
-        for pk, doc in rows:
-            await self._update_row(pk, _apply_update(doc, update))
+    async def delete_one(self, query: Dict[str, Any]) -> "SupabaseDeleteResult":
+        return await self._delete_matching(query, limit=1)
 
-    async def delete_one(self, query: Dict[str, Any]) -> None:
-        rows = await self._matching_rows(query)
-        if not rows:
-            return
-        pk, _ = rows[0]
-        table = self._db._safe_table(self._name)
-        async with self._db.pool.acquire() as conn:
-            await conn.execute(f'DELETE FROM "{table}" WHERE pk = $1', pk)
+    async def delete_many(self, query: Dict[str, Any]) -> "SupabaseDeleteResult":
+        return await self._delete_matching(query, limit=None)
 
     async def count_documents(self, query: Dict[str, Any]) -> int:
-        rows = await self._matching_rows(query)
-        return len(rows)
+        await self._db._ensure_table(self._name)
+        table = self._db._safe_table(self._name)
+        # Compiled (and seen by the index advisor) once for either path.
+        params = _SqlParams()
+        where, exact = self._compile_where(query, params)
+        async with self._db.pool.acquire() as conn:
+            if exact:
+                return await conn.fetchval(f'SELECT count(*) FROM "{table}" WHERE {where}', *params.values)
+            rows = await conn.fetch(f'SELECT doc FROM "{table}" WHERE {where}', *params.values)
+        matches = _query_matcher(query)
+        return sum(1 for row in rows if matches(row["doc"]))
 
     def aggregate(self, pipeline: List[Dict[str, Any]]) -> SupabaseAggregateCursor:
         return SupabaseAggregateCursor(self, pipeline)
 
+    async def create_index(
+        self,
+        keys: Sequence[Tuple[str, int]],
+        unique: bool = False,
+        multikey: bool = False,
+        name: Optional[str] = None,
+    ) -> str:
+        index = SupabaseIndex(keys, unique=unique, multikey=multikey, name=name)
+        await self._db.register_index(self._name, index)
+        return index.index_name(self._name)
+
+
+def _env_number(environ: Dict[str, str], name: str, cast: Any, default: Any) -> Any:
+    raw = environ.get(name, "").strip()
+    if not raw:
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {raw!r}") from None
+
+
+class SupabasePoolConfig:
+    """
+    Connection pool settings for ``SupabaseDocumentDB``.
+
+    Statements are compiled so that their text depends only on the table and
+    the query shape (values, limits included, are always bind parameters),
+    which lets asyncpg's per-connection statement cache reuse one prepared
+    statement per shape. ``pooler_mode="transaction"`` turns that cache off
+    for PgBouncer/Supavisor transaction pooling, where a prepared statement
+    cannot outlive the transaction that created it.
+    """
+
+    POOLER_MODES = ("session", "transaction")
+
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 10,
+        command_timeout: Optional[float] = None,
+        max_inactive_connection_lifetime: float = 300.0,
+        statement_cache_size: int = 512,
+        max_cached_statement_lifetime: int = 0,
+        pooler_mode: str = "session",
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        if pooler_mode not in self.POOLER_MODES:
+            raise ValueError(f"pooler_mode must be one of {self.POOLER_MODES}, got {pooler_mode!r}")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.command_timeout = command_timeout
+        self.max_inactive_connection_lifetime = max_inactive_connection_lifetime
+        self.statement_cache_size = 0 if pooler_mode == "transaction" else statement_cache_size
+        self.max_cached_statement_lifetime = max_cached_statement_lifetime
+        self.pooler_mode = pooler_mode
+
+    @classmethod
+    def from_env(cls, environ: Optional[Dict[str, str]] = None) -> "SupabasePoolConfig":
+        """
+        Read settings from ``SUPABASE_POOL_*`` environment variables.
+
+        Unset variables keep the defaults above.
+        """
+        env = dict(os.environ if environ is None else environ)
+        defaults = cls()
+        return cls(
+            min_size=_env_number(env, "SUPABASE_POOL_MIN_SIZE", int, defaults.min_size),
+            max_size=_env_number(env, "SUPABASE_POOL_MAX_SIZE", int, defaults.max_size),
+            command_timeout=_env_number(env, "SUPABASE_COMMAND_TIMEOUT", float, defaults.command_timeout),
+            max_inactive_connection_lifetime=_env_number(
+                env,
+                "SUPABASE_POOL_MAX_INACTIVE_LIFETIME",
+                float,
+                defaults.max_inactive_connection_lifetime,
+            ),
+            statement_cache_size=_env_number(
+                env, "SUPABASE_STATEMENT_CACHE_SIZE", int, defaults.statement_cache_size
+            ),
+            pooler_mode=env.get("SUPABASE_POOLER_MODE", "").strip().lower() or defaults.pooler_mode,
+        )
+
+    def create_pool_kwargs(self) -> Dict[str, Any]:
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "command_timeout": self.command_timeout,
+            "max_inactive_connection_lifetime": self.max_inactive_connection_lifetime,
+            "statement_cache_size": self.statement_cache_size,
+            "max_cached_statement_lifetime": self.max_cached_statement_lifetime,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"SupabasePoolConfig(min_size={self.min_size}, max_size={self.max_size}, "
+            f"command_timeout={self.command_timeout}, pooler_mode={self.pooler_mode!r}, "
+            f"statement_cache_size={self.statement_cache_size})"
+        )
+
 
 class SupabaseDocumentDB:
-    def __init__(self, dsn: str):
+    def __init__(
+        self,
+        dsn: str,
+        indexes: Optional[Dict[str, Sequence[SupabaseIndex]]] = None,
+        index_advisor: bool = False,
+        pool_config: Optional["SupabasePoolConfig"] = None,
+    ):
         self._dsn = dsn
+        self.pool_config = pool_config or SupabasePoolConfig()
         self._pool: Optional[asyncpg.Pool] = None
         self._ensured_tables: set[str] = set()
+        self._trigram_tables: set[str] = set()
+        self._indexes: Dict[str, List[SupabaseIndex]] = {
+            name: list(specs) for name, specs in (indexes or {}).items()
+        }
+        self._scalar_field_cache: Dict[str, FrozenSet[str]] = {}
+        self.index_advisor: Optional[SupabaseIndexAdvisor] = SupabaseIndexAdvisor() if index_advisor else None
 
     @property
     def pool(self) -> asyncpg.Pool:
@@ -363,6 +2342,14 @@ class SupabaseDocumentDB:
             raise RuntimeError("Supabase pool not initialized")
         return self._pool
 
+    @asynccontextmanager
+    async def _acquire(self, conn: Optional[asyncpg.Connection] = None) -> AsyncIterator[asyncpg.Connection]:
+        if conn is not None:
+            yield conn
+            return
+        async with self.pool.acquire() as acquired:
+            yield acquired
+
     def _safe_table(self, name: str) -> str:
         if not _TABLE_NAME_RE.match(name):
             raise ValueError(f"Invalid table name: {name}")
@@ -377,7 +2364,9 @@ class SupabaseDocumentDB:
                 "If your password contains '#', quote the full URL in .env."
             )
         dsn = self._sanitize_dsn(self._dsn)
-        self._pool = await asyncpg.create_pool(dsn=dsn, min_size=1, max_size=10)
+        self._pool = await asyncpg.create_pool(
+            dsn=dsn, init=_init_connection, **self.pool_config.create_pool_kwargs()
+        )
 
     @staticmethod
     def _sanitize_dsn(dsn: str) -> str:
@@ -420,30 +2409,75 @@ class SupabaseDocumentDB:
                 )
                 '''
             )
-            await conn.execute(
-                f'''
-                CREATE UNIQUE INDEX IF NOT EXISTS "uq_{table}_id"
-                ON "{table}" ((doc->>'id'))
-                WHERE doc ? 'id'
-                '''
-            )
-            await conn.execute(
-                f'''
-                CREATE INDEX IF NOT EXISTS "idx_{table}_created_at"
-                ON "{table}" ((doc->>'created_at'))
-                '''
-            )
+            for index in self._table_indexes(table):
+                await self._create_index(conn, table, index)
+            for legacy in _LEGACY_INDEXES:
+                await conn.execute(f'DROP INDEX IF EXISTS "{legacy.format(table=table)}"')
 
         self._ensured_tables.add(table)
 
+    def _table_indexes(self, table: str) -> List[SupabaseIndex]:
+        builtin = [
+            SupabaseIndex(index.keys, unique=index.unique, name=index.name.format(table=table))
+            for index in _BUILTIN_INDEXES
+        ]
+        return builtin + self._indexes.get(table, [])
+
+    async def _create_index(self, conn: asyncpg.Connection, table: str, index: SupabaseIndex) -> None:
+        await conn.execute(index.create_sql(table))
+        for statement in index.optional_sql(table):
+            try:
+                await conn.execute(statement)
+            except asyncpg.PostgresError as exc:
+                logger.warning("Skipping optional index statement on %s (%s): %s", table, exc, statement)
+                return
+        if index.text:
+            self._trigram_tables.add(table)
+
+    def _text_search(self, table: str) -> Optional[_TextSearch]:
+        index = next((index for index in self._indexes.get(table, []) if index.text), None)
+        if index is None:
+            return None
+        return _TextSearch(index.text_fields, table in self._trigram_tables)
+
+    def _scalar_fields(self, table: str) -> FrozenSet[str]:
+        fields = self._scalar_field_cache.get(table)
+        if fields is None:
+            fields = frozenset().union(*(index.scalar_fields for index in self._table_indexes(table)))
+            self._scalar_field_cache[table] = fields
+        return fields
+
+    async def register_index(self, table_name: str, index: SupabaseIndex) -> None:
+        table = self._safe_table(table_name)
+        self._indexes.setdefault(table, []).append(index)
+        self._scalar_field_cache.pop(table, None)
+        if table in self._ensured_tables:
+            async with self.pool.acquire() as conn:
+                await self._create_index(conn, table, index)
+        else:
+            await self._ensure_table(table)
+
+    async def flush_index_advisor(self) -> None:
+        if self.index_advisor is None or self._pool is None:
+            return
+        async with self.pool.acquire() as conn:
+            await self.index_advisor.flush(conn)
+
     async def connect(self) -> None:
         await self._ensure_pool()
+        for table in self._indexes:
+            await self._ensure_table(table)
 
     async def close(self) -> None:
         if self._pool is not None:
+            await self.flush_index_advisor()
             await self._pool.close()
             self._pool = None
             self._ensured_tables.clear()
+            self._trigram_tables.clear()
 
     def __getattr__(self, item: str) -> SupabaseCollection:
         return SupabaseCollection(self, item)
+
+    def __getitem__(self, item: str) -> SupabaseCollection:
+        return SupabaseCollection(self, item)
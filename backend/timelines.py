@@ -0,0 +1,265 @@
+"""
+Materialized home timelines, filled on write.
+
+Each entry is one document in ``timeline_entries``: ``{"owner_id", "post_id",
+"agent_id", "created_at"}``, indexed on (owner_id, created_at, post_id), so a
+page of a timeline is one index range scan of ``limit + 1`` entries.
+
+``publish`` queues a new post and returns; a worker task fans it out to its
+author and everyone in the author's audience (followers and connections, read
+from storage) with a single ``insert_many``. Timelines are bounded twice in
+the background: entries older than ``retention_days`` are pruned, and every
+timeline the worker wrote to since the last run is trimmed to its newest
+``max_entries``. ``audience_left`` drops an author's entries from a timeline
+once its owner neither follows nor is connected to the author any more.
+
+Authors with more than ``fanout_follower_limit`` followers are not fanned out
+to (one post would mean that many entries). ``read_page`` pulls their recent
+posts at read time instead, for the ones the owner follows or is connected to
+according to the social graph, and merges them with the stored entries. The
+set of such authors is reloaded every ``refresh_interval_seconds``. Agents
+without stored entries are served entirely in pull mode.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from social_graph import SocialGraph
+
+logger = logging.getLogger(__name__)
+
+Entry = Dict[str, Any]
+
+
+def _older_than(after: Tuple[str, str], id_field: str) -> Dict[str, Any]:
+    created_at, item_id = after
+    return {
+        "created_at": {"$lte": created_at},
+        "$or": [{"created_at": {"$lt": created_at}}, {id_field: {"$lt": item_id}}],
+    }
+
+
+class TimelineStore:
+    def __init__(
+        self,
+        db: Any,
+        graph: SocialGraph,
+        retention_days: float = 30.0,
+        max_entries: int = 500,
+        fanout_follower_limit: int = 1000,
+        max_queue_size: int = 10000,
+        refresh_interval_seconds: float = 300.0,
+    ):
+        if retention_days <= 0 or refresh_interval_seconds <= 0:
+            raise ValueError("retention_days and refresh_interval_seconds must be positive")
+        if max_entries < 1 or max_queue_size < 1:
+            raise ValueError("max_entries and max_queue_size must be at least 1")
+        if fanout_follower_limit < 0:
+            raise ValueError("fanout_follower_limit must not be negative")
+        self.db = db
+        self.collection = db.timeline_entries
+        self.graph = graph
+        self.retention = timedelta(days=retention_days)
+        self.max_entries = max_entries
+        self.fanout_follower_limit = fanout_follower_limit
+        self.max_queue_size = max_queue_size
+        self.refresh_interval_seconds = refresh_interval_seconds
+        # Authors above the fan-out limit, as of the last refresh.
+        self._popular: Set[str] = set()
+        # Timelines written to since the last trim.
+        self._touched: Set[str] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._maintenance: Optional[asyncio.Task] = None
+
+    async def _follower_ids(self, agent_id: str) -> Set[str]:
+        follows = await self.db.follows.find(
+            {"following_id": agent_id}, {"_id": 0, "follower_id": 1}
+        ).to_list(None)
+        return {follow["follower_id"] for follow in follows}
+
+    async def _connected_ids(self, agent_id: str) -> Set[str]:
+        connections = await self.db.connections.find(
+            {"$or": [
+                {"requester_id": agent_id, "status": "accepted"},
+                {"target_id": agent_id, "status": "accepted"},
+            ]},
+            {"_id": 0, "requester_id": 1, "target_id": 1},
+        ).to_list(None)
+        return {
+            conn["target_id"] if conn["requester_id"] == agent_id else conn["requester_id"]
+            for conn in connections
+        }
+
+    async def publish(self, post: Dict[str, Any], follower_count: int) -> None:
+        """Queue ``post`` for fan-out; fans out inline when the worker is not running or is behind."""
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait((post, follower_count))
+                return
+            except asyncio.QueueFull:
+                pass
+        await self.fan_out(post, follower_count)
+
+    async def fan_out(self, post: Dict[str, Any], follower_count: int) -> int:
+        """Add ``post`` to its audience's timelines; return how many were written."""
+        author_id = post["agent_id"]
+        owners = {author_id}
+        if follower_count > self.fanout_follower_limit:
+            self._popular.add(author_id)
+        else:
+            owners |= await self._follower_ids(author_id)
+            owners |= await self._connected_ids(author_id)
+        await self.collection.insert_many([
+            {"owner_id": owner_id, "post_id": post["id"], "agent_id": author_id, "created_at": post["created_at"]}
+            for owner_id in sorted(owners)
+        ])
+        self._touched |= owners
+        return len(owners)
+
+    async def audience_left(self, owner_id: str, author_id: str) -> int:
+        """
+        Drop ``author_id``'s posts from ``owner_id``'s timeline unless the
+        owner still follows or is connected to the author; return how many.
+        Call after the unfollow or disconnect is written.
+        """
+        still_following = await self.db.follows.find_one(
+            {"follower_id": owner_id, "following_id": author_id}, {"_id": 0, "id": 1}
+        )
+        still_connected = await self.db.connections.find_one({"$or": [
+            {"requester_id": owner_id, "target_id": author_id, "status": "accepted"},
+            {"requester_id": author_id, "target_id": owner_id, "status": "accepted"},
+        ]}, {"_id": 0, "id": 1})
+        if still_following is not None or still_connected is not None:
+            return 0
+        result = await self.collection.delete_many({"owner_id": owner_id, "agent_id": author_id})
+        return result.deleted_count
+
+    async def read_page(
+        self, owner_id: str, limit: int, after: Optional[Tuple[str, str]] = None
+    ) -> Tuple[List[Entry], bool]:
+        """
+        Return up to ``limit`` entries older than ``after``, newest first, and
+        whether more follow. Entries sort on (created_at, id) like every
+        other listing, so the last one can be turned into a page cursor.
+        """
+        query: Dict[str, Any] = {"owner_id": owner_id}
+        if after:
+            query = {"$and": [query, _older_than(after, "post_id")]}
+        stored = await self.collection.find(query, {"_id": 0, "post_id": 1, "created_at": 1}).sort(
+            [("created_at", -1), ("post_id", -1)]
+        ).limit(limit + 1).to_list(limit + 1)
+        entries = [{"id": entry["post_id"], "created_at": entry["created_at"]} for entry in stored]
+
+        if not entries and (
+            after is None or await self.collection.find_one({"owner_id": owner_id}, {"_id": 0, "post_id": 1}) is None
+        ):
+            pull_ids = set(self.graph.following_ids(owner_id)) | set(self.graph.connected_ids(owner_id)) | {owner_id}
+        else:
+            pull_ids = {
+                author_id for author_id in self._popular
+                if self.graph.is_following(owner_id, author_id) or self.graph.are_connected(owner_id, author_id)
+            }
+
+        if pull_ids:
+            query = {"agent_id": {"$in": sorted(pull_ids)}}
+            if after:
+                query = {"$and": [query, _older_than(after, "id")]}
+            pulled = await self.db.posts.find(query, {"_id": 0, "id": 1, "created_at": 1}).sort(
+                [("created_at", -1), ("id", -1)]
+            ).limit(limit + 1).to_list(limit + 1)
+            entries = entries + pulled
+
+        # An author who crossed the fan-out limit has entries both ways.
+        unique = {entry["id"]: entry for entry in entries}.values()
+        ordered = sorted(unique, key=lambda entry: (entry["created_at"], entry["id"]), reverse=True)
+        return ordered[:limit], len(ordered) > limit
+
+    async def refresh_popular(self) -> None:
+        agents = await self.db.agents.find(
+            {"follower_count": {"$gt": self.fanout_follower_limit}}, {"_id": 0, "id": 1}
+        ).to_list(None)
+        self._popular = {agent["id"] for agent in agents}
+
+    async def prune(self, now: Optional[datetime] = None) -> int:
+        """Delete entries older than the retention period and return how many went."""
+        cutoff = (now or datetime.now(timezone.utc)) - self.retention
+        result = await self.collection.delete_many({"created_at": {"$lt": cutoff.isoformat()}})
+        return result.deleted_count
+
+    async def trim(self) -> int:
+        """Cut every timeline written to since the last trim to its newest ``max_entries``; return how many went."""
+        owners, self._touched = sorted(self._touched), set()
+        deleted = 0
+        for i, owner_id in enumerate(owners):
+            try:
+                deleted += await self._trim_owner(owner_id)
+            except Exception:
+                # The rest are retried on the next run.
+                self._touched.update(owners[i:])
+                raise
+        return deleted
+
+    async def _trim_owner(self, owner_id: str) -> int:
+        if await self.collection.count_documents({"owner_id": owner_id}) <= self.max_entries:
+            return 0
+        kept = await self.collection.find({"owner_id": owner_id}, {"_id": 0, "post_id": 1, "created_at": 1}).sort(
+            [("created_at", -1), ("post_id", -1)]
+        ).limit(self.max_entries).to_list(self.max_entries)
+        oldest_kept = kept[-1]
+        result = await self.collection.delete_many(
+            {"$and": [{"owner_id": owner_id}, _older_than((oldest_kept["created_at"], oldest_kept["post_id"]), "post_id")]}
+        )
+        return result.deleted_count
+
+    async def start(self) -> None:
+        if self._worker is not None:
+            return
+        await self.refresh_popular()
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._worker = asyncio.create_task(self._run())
+        self._maintenance = asyncio.create_task(self._maintain())
+
+    async def stop(self) -> None:
+        """Fan out everything still queued, then stop the background tasks."""
+        if self._worker is None:
+            return
+        queue, self._queue = self._queue, None
+        await queue.join()
+        for task in (self._worker, self._maintenance):
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._worker = self._maintenance = None
+
+    async def _run(self) -> None:
+        # Reads the queue stop() detaches, until stop() has seen it drained.
+        queue = self._queue
+        while True:
+            post, follower_count = await queue.get()
+            await self._fan_out_logged(post, follower_count)
+            queue.task_done()
+
+    async def _fan_out_logged(self, post: Dict[str, Any], follower_count: int) -> None:
+        try:
+            await self.fan_out(post, follower_count)
+        except Exception:
+            # Its audience misses the post at home; the author's profile still lists it.
+            logger.exception("Fanning out post %s failed", post.get("id"))
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval_seconds)
+            try:
+                await self.refresh_popular()
+                deleted = await self.prune()
+                if deleted:
+                    logger.info("Pruned %d expired timeline entries", deleted)
+                trimmed = await self.trim()
+                if trimmed:
+                    logger.info("Trimmed %d timeline entries beyond the %d newest", trimmed, self.max_entries)
+            except Exception:
+                logger.exception("Refreshing timelines failed; retrying next interval")
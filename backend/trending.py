@@ -0,0 +1,143 @@
+"""
+In-memory trending hashtags over a sliding window.
+
+``create_post`` used to upsert an all-time ``count`` per hashtag before
+returning, and trending sorted that count, so old tags never dropped out.
+``record`` now only bumps in-memory counters for the current time bucket.
+Every ``flush_interval_seconds`` the background task writes the increments to
+``hashtag_buckets`` (one document per tag and bucket) in a single bulk write,
+reloads the window from storage so counts from other server processes are
+included, drops buckets that left the window and recomputes the top tags.
+
+A tag's score sums its counts over the last ``window_buckets`` buckets, each
+halved for every ``half_life_buckets`` it is old. ``top`` returns the
+precomputed ranking, so reads cost O(k).
+"""
+import asyncio
+import heapq
+import logging
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class TrendingHashtags:
+    def __init__(
+        self,
+        collection: Any,
+        bucket_seconds: int = 3600,
+        window_buckets: int = 24,
+        half_life_buckets: float = 6.0,
+        top_k: int = 50,
+        flush_interval_seconds: float = 30.0,
+    ):
+        if bucket_seconds < 1 or window_buckets < 1 or top_k < 1:
+            raise ValueError("bucket_seconds, window_buckets and top_k must be at least 1")
+        if half_life_buckets <= 0 or flush_interval_seconds <= 0:
+            raise ValueError("half_life_buckets and flush_interval_seconds must be positive")
+        self.collection = collection
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self.decay = 0.5 ** (1 / half_life_buckets)
+        self.top_k = top_k
+        self.flush_interval_seconds = flush_interval_seconds
+        # bucket -> tag -> count, for the buckets in the window.
+        self._buckets: Dict[int, Counter] = defaultdict(Counter)
+        # (tag, bucket) -> increments not yet written.
+        self._pending: Counter = Counter()
+        self._top: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def bucket(self, now: Optional[float] = None) -> int:
+        return int((time.time() if now is None else now) // self.bucket_seconds)
+
+    def record(self, tags: Iterable[str], now: Optional[float] = None) -> None:
+        """Count one use of each tag in ``tags``; tags are case-insensitive."""
+        bucket = self.bucket(now)
+        for tag in {tag.lower() for tag in tags}:
+            self._buckets[bucket][tag] += 1
+            self._pending[(tag, bucket)] += 1
+
+    def top(self, k: int = 10) -> List[Dict[str, Any]]:
+        """The ``k`` highest-scoring tags as of the last refresh."""
+        return self._top[:k]
+
+    def refresh(self, now: Optional[float] = None) -> None:
+        """Drop buckets that left the window and recompute the ranking."""
+        current = self.bucket(now)
+        oldest = current - self.window_buckets + 1
+        for bucket in [bucket for bucket in self._buckets if bucket < oldest]:
+            del self._buckets[bucket]
+
+        scores: Dict[str, float] = defaultdict(float)
+        counts: Counter = Counter()
+        for bucket, tags in self._buckets.items():
+            weight = self.decay ** max(current - bucket, 0)
+            for tag, count in tags.items():
+                scores[tag] += count * weight
+                counts[tag] += count
+        best: List[Tuple[float, str]] = heapq.nlargest(self.top_k, ((score, tag) for tag, score in scores.items()))
+        self._top = [{"tag": tag, "count": counts[tag], "score": round(score, 3)} for score, tag in best]
+
+    async def load(self, now: Optional[float] = None) -> None:
+        """Replace the in-memory window with what storage holds plus unwritten increments."""
+        oldest = self.bucket(now) - self.window_buckets + 1
+        stored = await self.collection.find(
+            {"bucket": {"$gte": oldest}}, {"_id": 0, "tag": 1, "bucket": 1, "count": 1}
+        ).to_list(None)
+        buckets: Dict[int, Counter] = defaultdict(Counter)
+        for doc in stored:
+            buckets[doc["bucket"]][doc["tag"]] += doc["count"]
+        for (tag, bucket), count in self._pending.items():
+            buckets[bucket][tag] += count
+        self._buckets = buckets
+        self.refresh(now)
+
+    async def flush(self, now: Optional[float] = None) -> int:
+        """Write pending increments, reload the window and prune old buckets; return tags written."""
+        pending, self._pending = self._pending, Counter()
+        if pending:
+            try:
+                await self.collection.bulk_write([
+                    UpdateOne({"tag": tag, "bucket": bucket}, {"$inc": {"count": count}}, upsert=True)
+                    for (tag, bucket), count in sorted(pending.items())
+                ])
+            except Exception:
+                self._pending.update(pending)
+                raise
+        await self.load(now)
+        oldest = self.bucket(now) - self.window_buckets + 1
+        await self.collection.delete_many({"bucket": {"$lt": oldest}})
+        return len(pending)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        await self.load()
+        self._task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Flushing trending hashtags on shutdown failed")
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Flushing trending hashtags failed; retrying next interval")
@@ -48,6 +48,7 @@ export const apiService = {
     getPost: (id) => api.get(`/posts/${id}`),
     getAgentPosts: (agentId) => api.get(`/posts/agent/${agentId}`),
     reactToPost: (postId, reactionType) => api.post(`/posts/${postId}/react`, null, { params: { reaction_type: reactionType } }),
+    getComments: (postId, params) => api.get(`/posts/${postId}/comments`, { params }),
     commentOnPost: (postId, content) => api.post(`/posts/${postId}/comment`, null, { params: { content } }),
     replyToComment: (postId, commentId, content) => api.post(`/posts/${postId}/comments/${commentId}/reply`, null, { params: { content } }),
     sharePost: (postId, content) => api.post(`/posts/${postId}/share`, null, { params: { content } }),
@@ -57,6 +58,7 @@ export const apiService = {
     followAgent: (agentId) => api.post(`/agents/${agentId}/follow`),
     getFollowers: (agentId) => api.get(`/agents/${agentId}/followers`),
     getFollowing: (agentId) => api.get(`/agents/${agentId}/following`),
+    getMutualConnections: (agentId) => api.get(`/agents/${agentId}/mutual-connections`),
 
     // Connections
     requestConnection: (targetId, message) => api.post('/connections', { target_agent_id: targetId, message }),
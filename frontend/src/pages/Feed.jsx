@@ -52,11 +52,10 @@ const REACTION_ICONS = {
     love: { icon: Heart, color: 'text-red-500', label: 'Love' },
 };
 
-const ReactionButton = ({ reactions, postId, currentAgentId, onReact }) => {
+const ReactionButton = ({ reactionCounts, myReaction, postId, onReact }) => {
     const [isOpen, setIsOpen] = useState(false);
     
-    const totalReactions = Object.values(reactions || {}).flat().length;
-    const myReaction = Object.entries(reactions || {}).find(([type, ids]) => ids.includes(currentAgentId))?.[0];
+    const totalReactions = Object.values(reactionCounts || {}).reduce((sum, count) => sum + count, 0);
     
     const handleReact = async (type) => {
         await onReact(postId, type);
@@ -101,21 +100,53 @@ const ReactionButton = ({ reactions, postId, currentAgentId, onReact }) => {
     );
 };
 
-const CommentSection = ({ postId, comments, onComment, currentAgentId }) => {
+const COMMENTS_PAGE_SIZE = 20;
+
+const CommentSection = ({ postId, comments, commentCount, onComment, currentAgentId }) => {
     const [showComments, setShowComments] = useState(false);
     const [newComment, setNewComment] = useState('');
     const [isCommenting, setIsCommenting] = useState(false);
+    // Posts only carry a preview of the latest comments; the full thread is paged in on demand.
+    const [loadedComments, setLoadedComments] = useState(null);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [isLoading, setIsLoading] = useState(false);
+
+    const loadComments = async (after) => {
+        setIsLoading(true);
+        try {
+            const response = await apiService.getComments(postId, { limit: COMMENTS_PAGE_SIZE, after });
+            setLoadedComments((loaded) => [...(after ? loaded || [] : []), ...response.data]);
+            setNextCursor(response.headers['x-next-cursor'] || null);
+        } catch (error) {
+            toast.error('Failed to load comments');
+        } finally {
+            setIsLoading(false);
+        }
+    };
+
+    const toggleComments = () => {
+        if (!showComments && loadedComments === null) {
+            loadComments(null);
+        }
+        setShowComments(!showComments);
+    };
 
     const handleSubmit = async (e) => {
         e.preventDefault();
         if (!newComment.trim()) return;
         setIsCommenting(true);
-        await onComment(postId, newComment);
+        const comment = await onComment(postId, newComment);
+        // Only append once the last page is loaded; otherwise paging will reach it.
+        if (comment && loadedComments !== null && !nextCursor) {
+            setLoadedComments([...loadedComments, comment]);
+        }
         setNewComment('');
         setIsCommenting(false);
         setShowComments(true);
     };
 
+    const visibleComments = loadedComments ?? comments ?? [];
+
     return (
         <div className="border-t border-[#27272a] mt-3 pt-3">
             <form onSubmit={handleSubmit} className="flex gap-2 mb-3">
@@ -136,18 +167,18 @@ const CommentSection = ({ postId, comments, onComment, currentAgentId }) => {
                 </Button>
             </form>
             
-            {comments?.length > 0 && (
+            {commentCount > 0 && (
                 <>
                     <button 
-                        onClick={() => setShowComments(!showComments)}
+                        onClick={toggleComments}
                         className="text-xs text-[#a1a1aa] hover:text-white mb-2"
                     >
-                        {showComments ? 'Hide' : 'View'} {comments.length} comment{comments.length > 1 ? 's' : ''}
+                        {showComments ? 'Hide' : 'View'} {commentCount} comment{commentCount > 1 ? 's' : ''}
                     </button>
                     
                     {showComments && (
                         <div className="space-y-3">
-                            {comments.map((comment) => (
+                            {visibleComments.map((comment) => (
                                 <div key={comment.id} className="flex gap-2">
                                     <Avatar className="w-8 h-8 border border-[#27272a]">
                                         <AvatarImage src={comment.agent_avatar} />
@@ -168,6 +199,15 @@ const CommentSection = ({ postId, comments, onComment, currentAgentId }) => {
                                     </div>
                                 </div>
                             ))}
+                            {isLoading && <Loader2 className="w-4 h-4 animate-spin text-[#52525b]" />}
+                            {!isLoading && nextCursor && (
+                                <button
+                                    onClick={() => loadComments(nextCursor)}
+                                    className="text-xs text-[#a1a1aa] hover:text-white"
+                                >
+                                    Load more comments
+                                </button>
+                            )}
                         </div>
                     )}
                 </>
@@ -178,7 +218,7 @@ const CommentSection = ({ postId, comments, onComment, currentAgentId }) => {
 
 const TerminalPost = ({ post, onReact, onComment, onShare, currentAgentId }) => {
     const createdAt = typeof post.created_at === 'string' ? new Date(post.created_at) : post.created_at;
-    const totalReactions = Object.values(post.reactions || {}).flat().length;
+    const totalReactions = Object.values(post.reaction_counts || {}).reduce((sum, count) => sum + count, 0);
 
     return (
         <Card className="bg-[#111111] border-[#27272a] hover:border-[#3f3f46] transition-colors" data-testid={`post-${post.id}`}>
@@ -262,7 +302,7 @@ const TerminalPost = ({ post, onReact, onComment, onShare, currentAgentId }) =>
                 </div>
 
                 {/* Stats */}
-                {(totalReactions > 0 || post.comments?.length > 0 || post.share_count > 0) && (
+                {(totalReactions > 0 || post.comment_count > 0 || post.share_count > 0) && (
                     <div className="flex items-center justify-between text-xs text-[#52525b] pb-2 border-b border-[#27272a]">
                         <div className="flex items-center gap-1">
                             {totalReactions > 0 && (
@@ -270,8 +310,8 @@ const TerminalPost = ({ post, onReact, onComment, onShare, currentAgentId }) =>
                             )}
                         </div>
                         <div className="flex items-center gap-3">
-                            {post.comments?.length > 0 && (
-                                <span>{post.comments.length} comment{post.comments.length > 1 ? 's' : ''}</span>
+                            {post.comment_count > 0 && (
+                                <span>{post.comment_count} comment{post.comment_count > 1 ? 's' : ''}</span>
                             )}
                             {post.share_count > 0 && (
                                 <span>{post.share_count} repost{post.share_count > 1 ? 's' : ''}</span>
@@ -283,9 +323,9 @@ const TerminalPost = ({ post, onReact, onComment, onShare, currentAgentId }) =>
                 {/* Actions */}
                 <div className="flex items-center justify-between pt-2">
                     <ReactionButton 
-                        reactions={post.reactions}
+                        reactionCounts={post.reaction_counts}
+                        myReaction={post.my_reaction}
                         postId={post.id}
-                        currentAgentId={currentAgentId}
                         onReact={onReact}
                     />
                     <Button
@@ -321,6 +361,7 @@ const TerminalPost = ({ post, onReact, onComment, onShare, currentAgentId }) =>
                 <CommentSection 
                     postId={post.id}
                     comments={post.comments}
+                    commentCount={post.comment_count}
                     onComment={onComment}
                     currentAgentId={currentAgentId}
                 />
@@ -520,7 +561,9 @@ export const Feed = () => {
         try {
             const response = await apiService.reactToPost(postId, reactionType);
             setPosts(posts.map(post => 
-                post.id === postId ? { ...post, reactions: response.data.reactions } : post
+                post.id === postId
+                    ? { ...post, reaction_counts: response.data.reaction_counts, my_reaction: response.data.my_reaction }
+                    : post
             ));
         } catch (error) {
             toast.error('Failed to react');
@@ -532,11 +575,16 @@ export const Feed = () => {
             const response = await apiService.commentOnPost(postId, content);
             setPosts(posts.map(post => {
                 if (post.id === postId) {
-                    return { ...post, comments: [...(post.comments || []), response.data] };
+                    return {
+                        ...post,
+                        comments: [...(post.comments || []), response.data].slice(-3),
+                        comment_count: (post.comment_count || 0) + 1,
+                    };
                 }
                 return post;
             }));
             toast.success('Comment added!');
+            return response.data;
         } catch (error) {
             toast.error('Failed to comment');
         }
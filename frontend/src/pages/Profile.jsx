@@ -480,7 +480,7 @@ export const Profile = () => {
                                     <div className="space-y-4">
                                         {posts.slice(0, 5).map(post => {
                                             const postDate = typeof post.created_at === 'string' ? new Date(post.created_at) : post.created_at;
-                                            const totalReactions = Object.values(post.reactions || {}).flat().length;
+                                            const totalReactions = Object.values(post.reaction_counts || {}).reduce((sum, count) => sum + count, 0);
                                             return (
                                                 <div key={post.id} className="p-4 bg-[#0a0a0a] border border-[#27272a] rounded-lg">
                                                     <p className="text-[#ededed] mb-3">{post.content}</p>
@@ -492,7 +492,7 @@ export const Profile = () => {
                                                         </div>
                                                         <div className="flex items-center gap-1">
                                                             <MessageCircle className="w-3 h-3" />
-                                                            <span>{post.comments?.length || 0}</span>
+                                                            <span>{post.comment_count || 0}</span>
                                                         </div>
                                                     </div>
                                                 </div>
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# server.py picks its backend at import time; the tests never connect to it.
+os.environ.setdefault("SUPABASE_DB_URL", "postgresql://postgres@localhost:5432/postgres")
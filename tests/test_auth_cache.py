@@ -0,0 +1,113 @@
+import pytest
+
+import auth_cache
+from auth_cache import AgentAuthCache, hash_api_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(auth_cache.time, "monotonic", fake)
+    return fake
+
+
+def test_hit_returns_a_copy(clock):
+    cache = AgentAuthCache()
+    agent = {"id": "a1", "name": "Ada"}
+    cache.put("key-1", agent)
+    agent["name"] = "changed by caller"
+
+    cached = cache.get("key-1")
+    assert cached == {"id": "a1", "name": "Ada"}
+    cached["name"] = "changed by handler"
+    assert cache.get("key-1")["name"] == "Ada"
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_miss_and_unknown_key(clock):
+    cache = AgentAuthCache()
+    assert cache.get("missing") is None
+    assert cache.misses == 1
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = AgentAuthCache(ttl_seconds=60)
+    cache.put("key-1", {"id": "a1"})
+    clock.now += 59
+    assert cache.get("key-1") is not None
+    clock.now += 1
+    assert cache.get("key-1") is None
+    assert cache.expirations == 1
+    assert cache.metrics()["size"] == 0
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = AgentAuthCache(max_size=2)
+    cache.put("key-1", {"id": "a1"})
+    cache.put("key-2", {"id": "a2"})
+    cache.get("key-1")
+    cache.put("key-3", {"id": "a3"})
+    assert cache.get("key-2") is None
+    assert cache.get("key-1") is not None
+    assert cache.get("key-3") is not None
+    assert cache.evictions == 1
+
+
+def test_invalidate_by_agent_id(clock):
+    cache = AgentAuthCache()
+    cache.put("key-1", {"id": "a1"})
+    cache.invalidate("a1")
+    cache.invalidate("unknown")
+    assert cache.get("key-1") is None
+    assert cache.invalidations == 1
+
+
+def test_evicting_a_rotated_key_keeps_the_new_one_invalidatable(clock):
+    cache = AgentAuthCache(max_size=2)
+    cache.put("old-key", {"id": "a1"})
+    cache.put("new-key", {"id": "a1"})
+    cache.put("key-2", {"id": "a2"})  # evicts old-key
+    cache.invalidate("a1")
+    assert cache.get("new-key") is None
+    assert cache.get("key-2") is not None
+
+
+@pytest.mark.parametrize("ttl_seconds, max_size", [(0, 10), (60, 0)])
+def test_disabled_cache_stores_nothing(clock, ttl_seconds, max_size):
+    cache = AgentAuthCache(ttl_seconds=ttl_seconds, max_size=max_size)
+    cache.put("key-1", {"id": "a1"})
+    assert not cache.enabled
+    assert cache.get("key-1") is None
+    assert cache.metrics()["size"] == 0
+
+
+def test_metrics_hit_rate(clock):
+    cache = AgentAuthCache()
+    cache.put("key-1", {"id": "a1"})
+    cache.get("key-1")
+    cache.get("key-2")
+    metrics = cache.metrics()
+    assert metrics["hits"] == 1 and metrics["misses"] == 1
+    assert metrics["hit_rate"] == 0.5
+
+
+def test_negative_settings_are_rejected():
+    with pytest.raises(ValueError):
+        AgentAuthCache(ttl_seconds=-1)
+    with pytest.raises(ValueError):
+        AgentAuthCache(max_size=-1)
+
+
+def test_keys_are_stored_hashed(clock):
+    cache = AgentAuthCache()
+    cache.put("secret-key", {"id": "a1"})
+    assert "secret-key" not in cache._entries
+    assert hash_api_key("secret-key") in cache._entries
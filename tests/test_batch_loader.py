@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from batch_loader import BatchLoader
+from supabase_document_db import _apply_projection, _matches_query
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeCollection:
+    """Answers ``find`` from a list and records every query it was sent."""
+
+    def __init__(self, docs, fail=False):
+        self.docs = docs
+        self.fail = fail
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        if self.fail:
+            raise ConnectionError("database unavailable")
+        return FakeCursor([_apply_projection(doc, projection) for doc in self.docs if _matches_query(doc, query)])
+
+
+AGENTS = [{"id": f"a{n}", "name": f"agent {n}", "api_key": f"key-{n}"} for n in range(10)]
+
+
+def test_loads_in_one_query_and_keeps_order():
+    async def main():
+        collection = FakeCollection(AGENTS)
+        loader = BatchLoader(collection, projection={"_id": 0, "api_key": 0})
+        docs = await loader.load_many(["a3", "missing", "a1", "a3"])
+        return collection, loader, docs
+
+    collection, loader, docs = asyncio.run(main())
+    assert [doc and doc["id"] for doc in docs] == ["a3", None, "a1", "a3"]
+    assert all("api_key" not in doc for doc in docs if doc)
+    assert collection.queries == [{"id": {"$in": ["a3", "missing", "a1"]}}]
+    assert loader.queries == 1
+
+
+def test_separate_loads_before_yielding_share_a_query():
+    async def main():
+        collection = FakeCollection(AGENTS)
+        loader = BatchLoader(collection)
+        first, second = loader.load("a1"), loader.load("a2")
+        return collection, await asyncio.gather(first, second)
+
+    collection, docs = asyncio.run(main())
+    assert [doc["id"] for doc in docs] == ["a1", "a2"]
+    assert len(collection.queries) == 1
+
+
+def test_repeated_keys_are_cached():
+    async def main():
+        collection = FakeCollection(AGENTS)
+        loader = BatchLoader(collection)
+        await loader.load("a1")
+        await loader.load("a1")
+        return collection
+
+    assert len(asyncio.run(main()).queries) == 1
+
+
+def test_batches_are_split_at_max_batch_size():
+    async def main():
+        collection = FakeCollection(AGENTS)
+        loader = BatchLoader(collection, max_batch_size=4)
+        docs = await loader.load_many([agent["id"] for agent in AGENTS])
+        return collection, docs
+
+    collection, docs = asyncio.run(main())
+    assert [doc["id"] for doc in docs] == [agent["id"] for agent in AGENTS]
+    assert [len(query["id"]["$in"]) for query in collection.queries] == [4, 4, 2]
+
+
+def test_custom_key_field():
+    async def main():
+        loader = BatchLoader(FakeCollection(AGENTS), key="name")
+        return await loader.load("agent 4")
+
+    assert asyncio.run(main())["id"] == "a4"
+
+
+def test_failed_keys_raise_and_are_retried():
+    async def main():
+        collection = FakeCollection(AGENTS, fail=True)
+        loader = BatchLoader(collection)
+        with pytest.raises(ConnectionError):
+            await loader.load_many(["a1", "a2"])
+        collection.fail = False
+        return collection, await loader.load("a1")
+
+    collection, doc = asyncio.run(main())
+    assert doc["id"] == "a1"
+    assert len(collection.queries) == 2
+
+
+def test_max_batch_size_must_be_positive():
+    with pytest.raises(ValueError):
+        BatchLoader(FakeCollection([]), max_batch_size=0)
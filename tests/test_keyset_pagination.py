@@ -0,0 +1,81 @@
+import pytest
+from fastapi import HTTPException
+
+from server import decode_cursor, encode_cursor, keyset_query
+from supabase_document_db import _matches_query
+
+
+DOCS = [
+    {"id": item_id, "created_at": created_at, "agent_id": "a1" if n % 2 else "a2"}
+    for n, (created_at, item_id) in enumerate([
+        ("2024-01-01T00:00:00", "p1"),
+        ("2024-01-02T00:00:00", "p2"),
+        ("2024-01-02T00:00:00", "p3"),
+        ("2024-01-02T00:00:00", "p4"),
+        ("2024-01-03T00:00:00", "p5"),
+    ])
+]
+
+
+def page_through(query, direction, limit):
+    """Collect every page the way fetch_page walks a collection."""
+    ordered = sorted(DOCS, key=lambda doc: (doc["created_at"], doc["id"]), reverse=direction < 0)
+    seen, after = [], None
+    while True:
+        matching = [doc for doc in ordered if _matches_query(doc, keyset_query(query, after, direction))]
+        page = matching[:limit]
+        seen.extend(doc["id"] for doc in page)
+        if len(matching) <= limit:
+            return seen
+        after = encode_cursor(page[-1])
+
+
+def test_without_cursor_returns_query_unchanged():
+    query = {"agent_id": "a1"}
+    assert keyset_query(query, None) is query
+
+
+def test_newest_first_bounds():
+    after = encode_cursor({"created_at": "2024-01-02T00:00:00", "id": "p3"})
+    assert keyset_query({}, after) == {
+        "created_at": {"$lte": "2024-01-02T00:00:00"},
+        "$or": [{"created_at": {"$lt": "2024-01-02T00:00:00"}}, {"id": {"$lt": "p3"}}],
+    }
+
+
+def test_oldest_first_bounds_wrap_the_query():
+    after = encode_cursor({"created_at": "2024-01-02T00:00:00", "id": "p3"})
+    assert keyset_query({"agent_id": "a1"}, after, direction=1) == {
+        "$and": [
+            {"agent_id": "a1"},
+            {
+                "created_at": {"$gte": "2024-01-02T00:00:00"},
+                "$or": [{"created_at": {"$gt": "2024-01-02T00:00:00"}}, {"id": {"$gt": "p3"}}],
+            },
+        ]
+    }
+
+
+@pytest.mark.parametrize("direction", [-1, 1])
+@pytest.mark.parametrize("limit", [1, 2, 4])
+def test_pages_cover_every_document_once_across_ties(direction, limit):
+    expected = sorted(DOCS, key=lambda doc: (doc["created_at"], doc["id"]), reverse=direction < 0)
+    assert page_through({}, direction, limit) == [doc["id"] for doc in expected]
+
+
+def test_pages_respect_the_query():
+    assert page_through({"agent_id": "a1"}, -1, 1) == ["p4", "p2"]
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor({"created_at": "2024-01-02T00:00:00", "id": "p3"})) == (
+        "2024-01-02T00:00:00",
+        "p3",
+    )
+
+
+@pytest.mark.parametrize("token", ["not base64!", "bm90IGpzb24", encode_cursor({"created_at": None, "id": "p1"})])
+def test_invalid_cursor_is_a_bad_request(token):
+    with pytest.raises(HTTPException) as excinfo:
+        keyset_query({}, token)
+    assert excinfo.value.status_code == 400
@@ -0,0 +1,232 @@
+import asyncio
+import random
+
+import numpy as np
+import pytest
+
+from social_graph import Adjacency, SocialGraph
+
+
+def random_edges(rng, n_rows, n_edges):
+    return [(rng.randrange(n_rows), rng.randrange(n_rows)) for _ in range(n_edges)]
+
+
+def build(edges, n_rows):
+    rows = np.array([i for i, _ in edges], dtype=np.int64)
+    cols = np.array([j for _, j in edges], dtype=np.int64)
+    return Adjacency.from_edges(rows, cols, n_rows)
+
+
+class TestAdjacency:
+    def test_from_edges_sorts_rows_and_drops_repeats(self):
+        adjacency = build([(0, 2), (0, 1), (0, 2), (2, 0)], 3)
+        assert adjacency.row(0).tolist() == [1, 2]
+        assert adjacency.row(1).tolist() == []
+        assert adjacency.row(2).tolist() == [0]
+        assert adjacency.n_rows == 3
+
+    def test_empty(self):
+        adjacency = Adjacency()
+        assert adjacency.n_rows == 0
+        assert not adjacency.contains(0, 0)
+        assert adjacency.degree(5) == 0
+        assert adjacency.gather(np.array([0, 3])).tolist() == []
+
+    def test_add_and_remove_report_changes(self):
+        adjacency = build([(0, 1)], 2)
+        assert not adjacency.add(0, 1)
+        assert adjacency.add(0, 0)
+        assert adjacency.add(4, 2)
+        assert adjacency.row(0).tolist() == [0, 1]
+        assert adjacency.n_rows == 5
+        assert adjacency.remove(0, 1)
+        assert not adjacency.remove(0, 1)
+        assert not adjacency.remove(3, 0)
+        assert adjacency.row(0).tolist() == [0]
+
+    def test_matches_a_set_of_pairs_under_random_changes(self):
+        rng = random.Random(7)
+        n_rows = 30
+        edges = set(random_edges(rng, n_rows, 120))
+        adjacency = build(sorted(edges), n_rows)
+        for _ in range(300):
+            i, j = rng.randrange(n_rows + 5), rng.randrange(n_rows)
+            if rng.random() < 0.5:
+                assert adjacency.add(i, j) == ((i, j) not in edges)
+                edges.add((i, j))
+            else:
+                assert adjacency.remove(i, j) == ((i, j) in edges)
+                edges.discard((i, j))
+
+        for i in range(adjacency.n_rows):
+            expected = sorted(j for row, j in edges if row == i)
+            assert adjacency.row(i).tolist() == expected
+            assert adjacency.degree(i) == len(expected)
+        rows = np.array([rng.randrange(n_rows + 5) for _ in range(40)])
+        expected_gather = [j for i in rows.tolist() for j in sorted(j for row, j in edges if row == i)]
+        assert adjacency.gather(rows).tolist() == expected_gather
+
+        compacted = adjacency.compacted(n_rows + 10)
+        assert compacted.n_rows == n_rows + 10
+        assert not compacted._changed
+        for i in range(compacted.n_rows):
+            assert compacted.row(i).tolist() == adjacency.row(i).tolist()
+        assert compacted.gather(rows).tolist() == expected_gather
+
+
+class FakeCursor:
+    def __init__(self, docs, before_return=None):
+        self.docs = docs
+        self.before_return = before_return
+
+    async def to_list(self, length):
+        if self.before_return is not None:
+            self.before_return()
+        return list(self.docs)
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.before_return = None
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(self.docs, self.before_return)
+
+
+class FakeDB:
+    def __init__(self, connections=(), follows=()):
+        self.connections = FakeCollection(list(connections))
+        self.follows = FakeCollection(list(follows))
+
+
+def connection(requester_id, target_id, status):
+    return {"requester_id": requester_id, "target_id": target_id, "status": status}
+
+
+def follow(follower_id, following_id):
+    return {"follower_id": follower_id, "following_id": following_id}
+
+
+class TestSocialGraph:
+    def test_load_builds_every_relation(self):
+        db = FakeDB(
+            connections=[connection("a", "b", "accepted"), connection("a", "c", "pending")],
+            follows=[follow("a", "b"), follow("c", "b")],
+        )
+        graph = SocialGraph(db)
+        asyncio.run(graph.load())
+
+        assert graph.loaded
+        assert graph.are_connected("a", "b") and graph.are_connected("b", "a")
+        assert not graph.are_connected("a", "c")
+        assert graph.has_connection("c", "a")
+        assert graph.is_following("a", "b") and not graph.is_following("b", "a")
+        assert sorted(graph.follower_ids("b")) == ["a", "c"]
+        assert graph.follower_count("b") == 2
+        assert graph.following_ids("a") == ["b"]
+        assert graph.connection_count("a") == 1
+
+    def test_unknown_agents_have_no_edges_and_are_not_interned(self):
+        graph = SocialGraph(FakeDB())
+        assert not graph.are_connected("x", "y")
+        assert graph.connected_ids("x") == []
+        assert graph.follower_count("x") == 0
+        assert graph.size == 0
+
+    def test_write_hooks(self):
+        graph = SocialGraph(FakeDB())
+        graph.connection_requested("a", "b")
+        assert graph.has_connection("b", "a") and not graph.are_connected("a", "b")
+        graph.connection_accepted("a", "b")
+        assert graph.are_connected("b", "a")
+        graph.follow_added("a", "b")
+        graph.follow_removed("a", "b")
+        assert not graph.is_following("a", "b")
+        assert graph.followers.degree(graph.index_of("b")) == 0
+
+    def test_connection_removed_keeps_the_request(self):
+        graph = SocialGraph(FakeDB())
+        graph.connection_accepted("a", "b")
+        graph.connection_removed("b", "a")
+        assert not graph.are_connected("a", "b")
+        assert not graph.are_connected("b", "a")
+        assert graph.has_connection("a", "b")
+        assert graph.connected_ids("a") == []
+
+    def test_mutual_connections_and_degrees(self):
+        db = FakeDB(connections=[
+            connection("a", "m1", "accepted"),
+            connection("b", "m1", "accepted"),
+            connection("m2", "a", "accepted"),
+            connection("b", "m2", "accepted"),
+            connection("a", "m3", "accepted"),
+            connection("b", "m3", "pending"),
+        ])
+        graph = SocialGraph(db)
+        asyncio.run(graph.load())
+        graph.connection_accepted("m4", "a")
+        graph.connection_accepted("m4", "b")
+        graph.connection_removed("b", "m2")
+
+        assert sorted(graph.mutual_connection_ids("a", "b")) == ["m1", "m4"]
+        assert sorted(graph.mutual_connection_ids("b", "a")) == ["m1", "m4"]
+        assert graph.mutual_connection_ids("a", "unknown") == []
+        assert graph.connection_count("a") == 4
+        assert graph.connection_count("b") == 2
+
+    def test_writes_during_load_are_replayed(self):
+        db = FakeDB(connections=[connection("a", "b", "accepted")], follows=[follow("a", "b")])
+        graph = SocialGraph(db)
+
+        def concurrent_writes():
+            # Written to storage after its rows were read.
+            graph.follow_removed("a", "b")
+            graph.connection_removed("a", "b")
+            graph.follow_added("c", "a")
+
+        db.follows.before_return = concurrent_writes
+        asyncio.run(graph.load())
+        assert not graph.is_following("a", "b")
+        assert not graph.are_connected("a", "b")
+        assert graph.is_following("c", "a")
+
+    def test_failed_load_stops_journaling(self):
+        db = FakeDB()
+
+        def fail():
+            raise ConnectionError("database unavailable")
+
+        db.connections.before_return = fail
+        graph = SocialGraph(db)
+        with pytest.raises(ConnectionError):
+            asyncio.run(graph.load())
+        assert graph._journal is None
+        assert not graph.loaded
+
+    def test_interned_ids_survive_reload(self):
+        graph = SocialGraph(FakeDB(follows=[follow("a", "b")]))
+        graph.follow_added("z", "a")
+        index = graph.index_of("z")
+        asyncio.run(graph.load())
+        assert graph.index_of("z") == index
+        assert not graph.is_following("z", "a")
+
+    def test_snapshot_is_reused_until_the_graph_changes(self):
+        graph = SocialGraph(FakeDB())
+        graph.connection_accepted("a", "b")
+        first = graph.snapshot()
+        assert graph.snapshot() is first
+        connections, follows, followers = first
+        assert connections.n_rows == graph.size
+        assert connections.row(graph.index_of("a")).tolist() == [graph.index_of("b")]
+
+        graph.follow_added("a", "c")
+        second = graph.snapshot()
+        assert second is not first
+        assert second[1].row(graph.index_of("a")).tolist() == [graph.index_of("c")]
+        assert first[1].row(graph.index_of("a")).tolist() == []
+
+    def test_reload_interval_must_be_positive(self):
+        with pytest.raises(ValueError):
+            SocialGraph(FakeDB(), reload_interval_seconds=0)
@@ -0,0 +1,243 @@
+import pytest
+
+from supabase_document_db import (
+    _SqlParams,
+    _apply_update,
+    _compile_filter,
+    _compile_update,
+    _compile_expr,
+    _like_regex_pattern,
+    _matches_query,
+    _validate_pipeline,
+)
+
+
+def compile_filter(query, scalar_fields=frozenset()):
+    params = _SqlParams()
+    where, exact = _compile_filter(query, params, frozenset(scalar_fields))
+    return where, exact, params.values
+
+
+class TestCompileFilter:
+    def test_empty_filter_matches_everything(self):
+        assert compile_filter({}) == ("TRUE", True, [])
+        assert compile_filter(None) == ("TRUE", True, [])
+
+    def test_equality_uses_containment(self):
+        assert compile_filter({"agent_id": "a1"}) == ("((doc -> 'agent_id') @> $1::jsonb)", True, ["a1"])
+
+    def test_equality_on_scalar_field_uses_indexed_expression(self):
+        where, exact, values = compile_filter({"agent_id": "a1"}, {"agent_id"})
+        assert where == "(NULLIF((doc -> 'agent_id'), 'null'::jsonb) = $1::jsonb)"
+        assert exact and values == ["a1"]
+
+    def test_dotted_path(self):
+        where, _, _ = compile_filter({"profile.city": "Paris"})
+        assert where == "((doc -> 'profile' -> 'city') @> $1::jsonb)"
+
+    def test_null_equality_matches_missing_fields(self):
+        where, exact, values = compile_filter({"parent_id": None})
+        assert where == "(((doc -> 'parent_id') IS NULL OR (doc -> 'parent_id') @> 'null'::jsonb))"
+        assert exact and values == []
+
+    def test_in_compiles_to_jsonpath(self):
+        where, exact, values = compile_filter({"id": {"$in": ["a", "b"]}})
+        assert where == "((doc -> 'id') @? $1::jsonpath)"
+        assert exact and values == ['$ ? (@ == "a" || @ == "b")']
+
+    def test_empty_in_matches_nothing(self):
+        assert compile_filter({"id": {"$in": []}}) == ("(FALSE)", True, [])
+
+    def test_nin_is_the_complement_of_in(self):
+        where, exact, values = compile_filter({"id": {"$nin": ["a", None]}})
+        assert where == "((((doc -> 'id') IS NULL OR (doc -> 'id') @? $1::jsonpath)) IS NOT TRUE)"
+        assert exact and values == ['$ ? (@ == "a" || @ == null)']
+
+    def test_range_on_scalar_field_checks_type(self):
+        where, exact, values = compile_filter({"created_at": {"$lt": "2024"}}, {"created_at"})
+        expr = "NULLIF((doc -> 'created_at'), 'null'::jsonb)"
+        assert where == f"(jsonb_typeof({expr}) = 'string' AND {expr} < $1::jsonb)"
+        assert exact and values == ["2024"]
+
+    def test_or_of_exact_branches(self):
+        where, exact, values = compile_filter({"$or": [{"a": 1}, {"b": 2}]})
+        assert where == "((((doc -> 'a') @> $1::jsonb)) OR (((doc -> 'b') @> $2::jsonb)))"
+        assert exact and values == [1, 2]
+
+    def test_unknown_operator_falls_back_and_drops_its_params(self):
+        where, exact, values = compile_filter({"a": 1, "b": {"$size": 2}})
+        assert where == "((doc -> 'a') @> $1::jsonb)"
+        assert not exact and values == [1]
+
+    def test_inexact_or_branch_is_left_out(self):
+        where, exact, values = compile_filter({"$or": [{"a": 1}, {"b": {"$size": 2}}]})
+        assert (where, exact, values) == ("TRUE", False, [])
+
+    def test_inexact_and_branch_still_narrows(self):
+        where, exact, values = compile_filter({"$and": [{"a": 1}, {"b": {"$size": 2}}]})
+        assert where == "((((doc -> 'a') @> $1::jsonb)) AND (TRUE))"
+        assert not exact and values == [1]
+
+
+class TestRegex:
+    def test_plain_pattern_compiles(self):
+        where, exact, values = compile_filter({"name": {"$regex": "^ab.c", "$options": "i"}})
+        assert where == "((doc -> 'name') @? $1::jsonpath)"
+        assert exact and values == ['$ ? (@ like_regex "^ab.c" flag "i")']
+
+    def test_trailing_dollar_allows_final_newline(self):
+        assert _like_regex_pattern("abc$") == "abc\\n?$"
+
+    @pytest.mark.parametrize("pattern", ["a+?", "[a-z0-9]{2,5}", "(ab|cd)*", "\\.com"])
+    def test_shared_subset_is_kept(self, pattern):
+        assert _like_regex_pattern(pattern) == pattern
+
+    @pytest.mark.parametrize(
+        "pattern",
+        ["(?i)abc", "(?=a)", "(?:ab)", "\\d+", "\\bword", "[^a]", "[0-z]", "a$b", "a{300}", "a++", "(a)\\1"],
+    )
+    def test_syntax_outside_the_subset_falls_back(self, pattern):
+        assert _like_regex_pattern(pattern) is None
+        where, exact, values = compile_filter({"name": {"$regex": pattern}})
+        assert (where, exact, values) == ("TRUE", False, [])
+
+    def test_unsupported_options_fall_back(self):
+        assert compile_filter({"name": {"$regex": "a", "$options": "m"}}) == ("TRUE", False, [])
+
+    @pytest.mark.parametrize("pattern", ["(", "*a", "[a-Z]"])
+    def test_invalid_pattern_matches_nothing(self, pattern):
+        assert compile_filter({"name": {"$regex": pattern}}) == ("(FALSE)", True, [])
+
+
+class TestMatchesQuery:
+    """The Python matcher decides whatever the SQL compiler leaves out."""
+
+    def test_null_equality_matches_missing_and_null(self):
+        assert _matches_query({}, {"parent_id": None})
+        assert _matches_query({"parent_id": None}, {"parent_id": None})
+        assert not _matches_query({"parent_id": "c1"}, {"parent_id": None})
+
+    def test_nin_matches_missing_fields(self):
+        assert _matches_query({}, {"id": {"$nin": ["a"]}})
+        assert not _matches_query({"id": "a"}, {"id": {"$nin": ["a"]}})
+        assert not _matches_query({}, {"id": {"$nin": ["a", None]}})
+
+    def test_equality_matches_array_members(self):
+        assert _matches_query({"tags": ["x", "y"]}, {"tags": "y"})
+
+    @pytest.mark.parametrize(
+        "doc, query, expected",
+        [
+            ({"n": True}, {"n": 1}, False),
+            ({"n": 1}, {"n": True}, False),
+            ({"n": 0}, {"n": False}, False),
+            ({"n": 1.0}, {"n": 1}, True),
+            ({"n": [1, "x"]}, {"n": True}, False),
+            ({"n": [True]}, {"n": True}, True),
+            ({"n": True}, {"n": {"$in": [1, "x"]}}, False),
+            ({"n": 1}, {"n": {"$in": [True]}}, False),
+            ({"n": False}, {"n": {"$in": [False, None]}}, True),
+            ({"n": True}, {"n": {"$nin": [1]}}, True),
+            ({"n": [1]}, {"n": {"$in": [[True]]}}, False),
+        ],
+    )
+    def test_booleans_only_equal_booleans(self, doc, query, expected):
+        # JSONB keeps true and 1 apart, so the compiled SQL does too.
+        assert _matches_query(doc, query) is expected
+
+    def test_regex_with_inline_flag(self):
+        assert _matches_query({"name": "ABC"}, {"name": {"$regex": "(?i)abc"}})
+        assert not _matches_query({"name": "xyz"}, {"name": {"$regex": "(?i)abc"}})
+
+
+class TestCompileUpdate:
+    def test_set_and_inc(self):
+        params = _SqlParams()
+        sql = _compile_update({"$set": {"title": "t"}, "$inc": {"likes": 1}}, params)
+        assert sql == (
+            "(doc || jsonb_build_object('title', $1::jsonb, 'likes', "
+            "to_jsonb(COALESCE(NULLIF((doc -> 'likes'), 'null'::jsonb)::numeric, 0) + $2::numeric)))"
+        )
+        assert params.values == ["t", 1]
+
+    def test_dotted_set_merges_into_parent(self):
+        params = _SqlParams()
+        sql = _compile_update({"$set": {"reaction_counts.like": 2}}, params)
+        assert "jsonb_typeof((doc -> 'reaction_counts')) = 'object'" in sql
+        assert params.values == [2]
+
+    def test_empty_update_keeps_doc(self):
+        assert _compile_update({}, _SqlParams()) == "doc"
+
+    @pytest.mark.parametrize(
+        "update",
+        [
+            {"$set": {"a": 1}, "$inc": {"a": 1}},
+            {"$set": {"a": {"b": 1}, "a.b": 2}},
+            {"$unset": {"a": ""}},
+            {"$inc": {"a": "1"}},
+            {"$pull": {"tags": {"$in": ["x"]}}},
+        ],
+    )
+    def test_uncompilable_updates_return_none(self, update):
+        assert _compile_update(update, _SqlParams()) is None
+
+
+class TestApplyUpdate:
+    def test_does_not_modify_the_original(self):
+        doc = {"id": "p1", "stats": {"likes": 1}, "comments": [{"id": "c1"}]}
+        updated = _apply_update(doc, {"$inc": {"stats.likes": 1}, "$push": {"comments": {"id": "c2"}}})
+        assert doc == {"id": "p1", "stats": {"likes": 1}, "comments": [{"id": "c1"}]}
+        assert updated == {"id": "p1", "stats": {"likes": 2}, "comments": [{"id": "c1"}, {"id": "c2"}]}
+
+    def test_copies_only_the_touched_path(self):
+        doc = {"stats": {"likes": 1}, "comments": [{"id": "c1"}], "profile": {"city": "Paris"}}
+        updated = _apply_update(doc, {"$inc": {"stats.likes": 1}})
+        assert updated["stats"] is not doc["stats"]
+        assert updated["comments"] is doc["comments"]
+        assert updated["profile"] is doc["profile"]
+
+    def test_set_creates_missing_parents(self):
+        assert _apply_update({}, {"$set": {"a.b.c": 1}}) == {"a": {"b": {"c": 1}}}
+
+    def test_push_each_with_slice(self):
+        doc = {"recent": [1, 2, 3]}
+        assert _apply_update(doc, {"$push": {"recent": {"$each": [4, 5], "$slice": -3}}}) == {"recent": [3, 4, 5]}
+
+    def test_pull_keeps_booleans_apart_from_numbers(self):
+        assert _apply_update({"flags": [1, True, 0, False]}, {"$pull": {"flags": True}}) == {"flags": [1, 0, False]}
+
+    def test_pull_by_document_condition(self):
+        doc = {"items": [{"id": "a", "n": 1}, {"id": "b", "n": 2}, "a"]}
+        assert _apply_update(doc, {"$pull": {"items": {"id": "a"}}}) == {"items": [{"id": "b", "n": 2}, "a"]}
+
+
+class TestAggregate:
+    def test_compile_expr(self):
+        params = _SqlParams()
+        sql = _compile_expr({"$cond": [{"$eq": ["$requester_id", "a1"]}, "$target_id", "$requester_id"]}, params)
+        assert sql == (
+            "(CASE WHEN (NULLIF((doc -> 'requester_id'), 'null'::jsonb) IS NOT DISTINCT FROM $1::jsonb) "
+            "THEN NULLIF((doc -> 'target_id'), 'null'::jsonb) "
+            "ELSE NULLIF((doc -> 'requester_id'), 'null'::jsonb) END)"
+        )
+        assert params.values == ["a1"]
+
+    def test_root_and_literals(self):
+        assert _compile_expr("$$ROOT", _SqlParams()) == "doc"
+        assert _compile_expr(None, _SqlParams()) == "NULL::jsonb"
+
+    def test_unknown_operator_does_not_compile(self):
+        assert _compile_expr({"$size": "$tags"}, _SqlParams()) is None
+
+    @pytest.mark.parametrize(
+        "pipeline",
+        [
+            [{"$limit": 5}],
+            [{"$group": {"count": {"$first": "$x"}}}],
+            [{"$group": {"_id": "$a", "total": {"$sum": 1}}}],
+        ],
+    )
+    def test_unsupported_pipelines_are_rejected(self, pipeline):
+        with pytest.raises(NotImplementedError):
+            _validate_pipeline(pipeline)
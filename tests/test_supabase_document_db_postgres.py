@@ -0,0 +1,108 @@
+"""
+Runs the adapter against a real Postgres database. Set
+``SUPABASE_TEST_DB_URL`` to a scratch database to run it; a table named
+``test_adapter`` is created there and dropped.
+"""
+import asyncio
+import os
+import random
+
+import pytest
+
+pytest.importorskip("asyncpg")
+
+from pymongo import UpdateOne  # noqa: E402
+
+from supabase_document_db import SupabaseDocumentDB, SupabaseIndexAdvisor, _matches_query  # noqa: E402
+
+DSN = os.environ.get("SUPABASE_TEST_DB_URL")
+TABLE = "test_adapter"
+
+pytestmark = pytest.mark.skipif(not DSN, reason="SUPABASE_TEST_DB_URL is not set")
+
+VALUES = [0, 1, 2, 1.0, 0.0, True, False, None, "1", "x", "true", [1], [True], [1, "x"], [False, 0]]
+QUERIES = [
+    {"n": 1},
+    {"n": True},
+    {"n": False},
+    {"n": 0},
+    {"n": 1.0},
+    {"n": None},
+    {"n": {"$in": [1, "x"]}},
+    {"n": {"$in": [True]}},
+    {"n": {"$in": [False, None]}},
+    {"n": {"$nin": [1, None]}},
+    {"n": {"$nin": [True]}},
+]
+# Not in the subset the SQL compiler translates, so the clause makes the
+# whole filter fall back to the Python matcher; it matches every id.
+FALLBACK_CLAUSE = {"id": {"$regex": "(?s)."}}
+
+
+def with_collection(docs, test):
+    """Run ``test(db, collection)`` against a fresh table holding ``docs``."""
+
+    async def main():
+        db = SupabaseDocumentDB(DSN)
+        await db.connect()
+        try:
+            async with db.pool.acquire() as conn:
+                await conn.execute(f'DROP TABLE IF EXISTS "{TABLE}"')
+            collection = db[TABLE]
+            await collection.insert_many([dict(doc) for doc in docs])
+            try:
+                return await test(db, collection)
+            finally:
+                async with db.pool.acquire() as conn:
+                    await conn.execute(f'DROP TABLE IF EXISTS "{TABLE}"')
+        finally:
+            await db.close()
+
+    return asyncio.run(main())
+
+
+def test_compiled_and_fallback_queries_agree_with_the_matcher():
+    rng = random.Random(3)
+    docs = [{"id": str(i), "n": rng.choice(VALUES)} for i in range(300)]
+
+    async def run(db, collection):
+        results = []
+        for query in QUERIES:
+            compiled = await collection.find(query, {"_id": 0, "id": 1}).to_list(None)
+            fallback = await collection.find({"$and": [query, FALLBACK_CLAUSE]}, {"_id": 0, "id": 1}).to_list(None)
+            results.append((query, compiled, fallback))
+        return results
+
+    for query, compiled, fallback in with_collection(docs, run):
+        expected = sorted(doc["id"] for doc in docs if _matches_query(doc, query))
+        assert sorted(doc["id"] for doc in compiled) == expected, query
+        assert sorted(doc["id"] for doc in fallback) == expected, query
+
+
+def test_index_advisor_records_each_operation_once():
+    docs = [{"id": str(i), "n": i % 3, "name": f"x{i}"} for i in range(20)]
+    inexact = {"name": {"$regex": "(?i)X1"}}
+    pipeline = [{"$match": inexact}, {"$sort": {"id": 1}}, {"$group": {"_id": "$n", "first": {"$first": "$$ROOT"}}}]
+    operations = [
+        lambda collection: collection.count_documents({"n": 1}),
+        lambda collection: collection.count_documents(inexact),
+        lambda collection: collection.update_many(inexact, {"$set": {"seen": True}}),
+        lambda collection: collection.delete_many({"name": {"$regex": "(?i)none"}}),
+        lambda collection: collection.bulk_write([UpdateOne({"id": "1"}, {"$inc": {"n": 3}})]),
+        lambda collection: collection.aggregate(pipeline).to_list(None),
+        lambda collection: collection.aggregate([{"$match": {"n": 1}}] + pipeline[1:]).to_list(None),
+    ]
+
+    async def run(db, collection):
+        db.index_advisor = SupabaseIndexAdvisor()
+        recorded = []
+        for operation in operations:
+            db.index_advisor._counts.clear()
+            await operation(collection)
+            recorded.append(sum(count for *_, count in db.index_advisor.snapshot()))
+        inexact_count = await collection.count_documents(inexact)
+        return recorded, inexact_count
+
+    recorded, inexact_count = with_collection(docs, run)
+    assert recorded == [1] * len(operations)
+    assert inexact_count == 11
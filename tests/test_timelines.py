@@ -0,0 +1,178 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from social_graph import SocialGraph
+from supabase_document_db import _apply_projection, _matches_query
+from timelines import TimelineStore
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs = sorted(self.docs, key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length):
+        return self.docs if length is None else self.docs[:length]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = []
+
+    def find(self, query, projection=None):
+        return FakeCursor([_apply_projection(doc, projection) for doc in self.docs if _matches_query(doc, query)])
+
+    async def find_one(self, query, projection=None):
+        docs = await self.find(query, projection).to_list(1)
+        return docs[0] if docs else None
+
+    async def count_documents(self, query):
+        return sum(1 for doc in self.docs if _matches_query(doc, query))
+
+    async def insert_many(self, docs):
+        self.docs.extend(dict(doc) for doc in docs)
+
+    async def delete_many(self, query):
+        kept = [doc for doc in self.docs if not _matches_query(doc, query)]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+        return SimpleNamespace(deleted_count=deleted)
+
+
+class FakeDB:
+    def __init__(self):
+        for name in ("timeline_entries", "follows", "connections", "agents", "posts"):
+            setattr(self, name, FakeCollection())
+
+
+def post(post_id, agent_id, age):
+    return {"id": post_id, "agent_id": agent_id, "created_at": (NOW - age).isoformat()}
+
+
+def make_store(db, **kwargs):
+    return TimelineStore(db, SocialGraph(db), **kwargs)
+
+
+def timeline(db, owner_id):
+    return sorted(
+        (entry["post_id"] for entry in db.timeline_entries.docs if entry["owner_id"] == owner_id),
+        reverse=True,
+    )
+
+
+def test_fan_out_reaches_followers_and_connections():
+    db = FakeDB()
+    db.follows.docs.append({"follower_id": "f1", "following_id": "author"})
+    db.connections.docs.append({"requester_id": "c1", "target_id": "author", "status": "accepted"})
+    db.connections.docs.append({"requester_id": "author", "target_id": "p1", "status": "pending"})
+    store = make_store(db)
+
+    written = asyncio.run(store.fan_out(post("p01", "author", timedelta(0)), follower_count=1))
+    assert written == 3
+    assert {entry["owner_id"] for entry in db.timeline_entries.docs} == {"author", "f1", "c1"}
+
+
+def test_popular_authors_are_not_fanned_out():
+    db = FakeDB()
+    db.follows.docs.append({"follower_id": "f1", "following_id": "author"})
+    store = make_store(db, fanout_follower_limit=0)
+
+    asyncio.run(store.fan_out(post("p01", "author", timedelta(0)), follower_count=1))
+    assert timeline(db, "f1") == []
+    assert "author" in store._popular
+
+
+def test_prune_drops_entries_past_retention():
+    db = FakeDB()
+    store = make_store(db, retention_days=7)
+
+    async def main():
+        await store.fan_out(post("p01", "author", timedelta(days=8)), 0)
+        await store.fan_out(post("p02", "author", timedelta(days=6)), 0)
+        return await store.prune(now=NOW)
+
+    assert asyncio.run(main()) == 1
+    assert timeline(db, "author") == ["p02"]
+
+
+def test_trim_keeps_the_newest_entries_of_timelines_written_to():
+    db = FakeDB()
+    db.follows.docs.append({"follower_id": "reader", "following_id": "author"})
+    # Written before this process started, so never trimmed here.
+    db.timeline_entries.docs.extend(
+        {"owner_id": "idle", "post_id": f"old{n}", "agent_id": "x", "created_at": NOW.isoformat()} for n in range(5)
+    )
+    store = make_store(db, max_entries=3)
+
+    async def main():
+        # Two posts share a timestamp, so the cut falls on the post_id tie-break.
+        for n, age in enumerate([5, 4, 3, 3, 2, 1]):
+            await store.fan_out(post(f"p{n:02d}", "author", timedelta(hours=age)), 1)
+        return await store.trim()
+
+    assert asyncio.run(main()) == 6
+    assert timeline(db, "reader") == ["p05", "p04", "p03"]
+    assert timeline(db, "author") == ["p05", "p04", "p03"]
+    assert len(timeline(db, "idle")) == 5
+    assert asyncio.run(store.trim()) == 0
+
+
+def test_failed_trim_is_retried():
+    db = FakeDB()
+    store = make_store(db, max_entries=1)
+
+    async def main():
+        await store.fan_out(post("p01", "a", timedelta(hours=2)), 0)
+        await store.fan_out(post("p02", "a", timedelta(hours=1)), 0)
+        await store.fan_out(post("p03", "b", timedelta(hours=1)), 0)
+        count_documents = db.timeline_entries.count_documents
+
+        async def failing(query):
+            raise ConnectionError("database unavailable")
+
+        db.timeline_entries.count_documents = failing
+        with pytest.raises(ConnectionError):
+            await store.trim()
+        db.timeline_entries.count_documents = count_documents
+        return await store.trim()
+
+    assert asyncio.run(main()) == 1
+    assert timeline(db, "a") == ["p02"]
+
+
+def test_read_page_pages_stored_entries():
+    db = FakeDB()
+    store = make_store(db)
+
+    async def main():
+        for n in range(5):
+            await store.fan_out(post(f"p{n:02d}", "author", timedelta(hours=5 - n)), 0)
+        first, more = await store.read_page("author", 3)
+        last = first[-1]
+        second, more_after = await store.read_page("author", 3, (last["created_at"], last["id"]))
+        return first, more, second, more_after
+
+    first, more, second, more_after = asyncio.run(main())
+    assert [entry["id"] for entry in first] == ["p04", "p03", "p02"] and more
+    assert [entry["id"] for entry in second] == ["p01", "p00"] and not more_after
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"retention_days": 0}, {"max_entries": 0}, {"fanout_follower_limit": -1}, {"max_queue_size": 0}],
+)
+def test_invalid_settings_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        make_store(FakeDB(), **kwargs)
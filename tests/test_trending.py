@@ -0,0 +1,149 @@
+import asyncio
+
+import pytest
+
+from supabase_document_db import _apply_projection, _apply_update, _extract_upsert_base, _matches_query
+from trending import TrendingHashtags
+
+HOUR = 3600
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs if length is None else self.docs[:length]
+
+
+class FakeCollection:
+    """Enough of a collection for ``hashtag_buckets``: find, upserting bulk writes and deletes."""
+
+    def __init__(self):
+        self.docs = []
+        self.fail_writes = False
+
+    def find(self, query, projection=None):
+        return FakeCursor([_apply_projection(doc, projection) for doc in self.docs if _matches_query(doc, query)])
+
+    async def bulk_write(self, ops):
+        if self.fail_writes:
+            raise ConnectionError("database unavailable")
+        for op in ops:
+            for i, doc in enumerate(self.docs):
+                if _matches_query(doc, op._filter):
+                    self.docs[i] = _apply_update(doc, op._doc)
+                    break
+            else:
+                if op._upsert:
+                    self.docs.append(_apply_update(_extract_upsert_base(op._filter), op._doc))
+
+    async def delete_many(self, query):
+        self.docs = [doc for doc in self.docs if not _matches_query(doc, query)]
+
+
+def make_trending(collection=None, **kwargs):
+    kwargs = {"bucket_seconds": HOUR, "window_buckets": 24, "half_life_buckets": 6.0, **kwargs}
+    return TrendingHashtags(collection if collection is not None else FakeCollection(), **kwargs)
+
+
+def test_ranks_by_count_and_ignores_case():
+    trending = make_trending()
+    now = 100 * HOUR
+    trending.record(["AI", "python"], now)
+    trending.record(["ai", "Ai"], now)
+    trending.record(["ai"], now)
+    trending.refresh(now)
+    assert trending.top() == [
+        {"tag": "ai", "count": 3, "score": 3.0},
+        {"tag": "python", "count": 1, "score": 1.0},
+    ]
+    assert trending.top(1) == [{"tag": "ai", "count": 3, "score": 3.0}]
+
+
+def test_older_buckets_decay_by_half_life():
+    trending = make_trending()
+    now = 100 * HOUR
+    trending.record(["old"], now - 6 * HOUR)
+    trending.record(["old"], now - 6 * HOUR)
+    trending.record(["new"], now)
+    trending.refresh(now)
+    assert trending.top() == [
+        {"tag": "new", "count": 1, "score": 1.0},
+        {"tag": "old", "count": 2, "score": 1.0},
+    ]
+
+
+def test_buckets_leave_the_window():
+    trending = make_trending(window_buckets=3)
+    now = 100 * HOUR
+    trending.record(["stale"], now - 3 * HOUR)
+    trending.record(["fresh"], now - 2 * HOUR)
+    trending.refresh(now)
+    assert [entry["tag"] for entry in trending.top()] == ["fresh"]
+
+
+def test_top_k_bounds_the_ranking():
+    trending = make_trending(top_k=2)
+    trending.record(["a", "b", "c"], 0)
+    trending.refresh(0)
+    assert len(trending.top(10)) == 2
+
+
+def test_flush_writes_increments_and_prunes_old_buckets():
+    async def main():
+        collection = FakeCollection()
+        collection.docs.append({"tag": "gone", "bucket": 0, "count": 9})
+        collection.docs.append({"tag": "ai", "bucket": 100, "count": 2})
+        trending = make_trending(collection)
+        now = 100 * HOUR
+        trending.record(["ai", "python"], now)
+        written = await trending.flush(now)
+        return collection, trending, written
+
+    collection, trending, written = asyncio.run(main())
+    assert written == 2
+    assert sorted((doc["tag"], doc["bucket"], doc["count"]) for doc in collection.docs) == [
+        ("ai", 100, 3),
+        ("python", 100, 1),
+    ]
+    assert [entry["tag"] for entry in trending.top()] == ["ai", "python"]
+
+
+def test_load_includes_other_processes_and_unwritten_counts():
+    async def main():
+        collection = FakeCollection()
+        collection.docs.append({"tag": "elsewhere", "bucket": 100, "count": 5})
+        trending = make_trending(collection)
+        trending.record(["local"], 100 * HOUR)
+        await trending.load(100 * HOUR)
+        return trending
+
+    assert [(entry["tag"], entry["count"]) for entry in asyncio.run(main()).top()] == [
+        ("elsewhere", 5),
+        ("local", 1),
+    ]
+
+
+def test_failed_flush_keeps_increments_for_the_next_one():
+    async def main():
+        collection = FakeCollection()
+        collection.fail_writes = True
+        trending = make_trending(collection)
+        trending.record(["ai"], 100 * HOUR)
+        with pytest.raises(ConnectionError):
+            await trending.flush(100 * HOUR)
+        collection.fail_writes = False
+        await trending.flush(100 * HOUR)
+        return collection
+
+    assert asyncio.run(main()).docs == [{"tag": "ai", "bucket": 100, "count": 1}]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"bucket_seconds": 0}, {"window_buckets": 0}, {"top_k": 0}, {"half_life_buckets": 0}, {"flush_interval_seconds": 0}],
+)
+def test_invalid_settings_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        make_trending(**kwargs)